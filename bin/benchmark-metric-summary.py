@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the metric summary pipeline over synthetic test suites.
+
+Compares the previous implementation of TtestMethod.run_metric_summary
+(dzmetrics.fdr.rejector and a copy of every row) and of the summary value
+lookup in get_data_for_summary_storage (rebuilt for every result) with the
+current TtestMethod code.  The legacy summary storage runs the current
+get_data_for_summary_storage one result at a time with the legacy lookup.
+
+The legacy lookup stops at the first row of every key and the synthetic
+suites hold all of the keys in their first page, so the storage gain comes
+from building the lookup once rather than from the length of the scans.
+
+Usage: bin/benchmark-metric-summary.py [pages] [repeat]
+
+Results on Python 2.7.18, NumPy 1.16.6, SciPy 1.2.3, x86_64 Linux:
+
+    500 pages, best of 20 runs
+      run_metric_summary   legacy    0.0011s  current    0.0008s      1.4x
+      summary lookups      legacy    0.0006s  current    0.0003s      2.0x
+      summary storage      legacy    0.0022s  current    0.0017s      1.3x
+
+    5000 pages, best of 10 runs
+      run_metric_summary   legacy    0.0151s  current    0.0114s      1.3x
+      summary lookups      legacy    0.0057s  current    0.0030s      1.9x
+      summary storage      legacy    0.0236s  current    0.0182s      1.3x
+
+"""
+import copy
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datazilla.vendor import add_vendor_lib
+
+
+
+METRIC_VALUE_NAMES = [
+    'stddev', 'mean', 'p', 'h0_rejected', 'n_replicates', 'fdr',
+    'trend_stddev', 'trend_mean', 'test_evaluation'
+    ]
+
+
+def get_metric_collection():
+    """Return metric collection rows for TtestMethod."""
+    return [
+        { 'metric_id': 1,
+          'metric_name': 'welch_ttest',
+          'metric_value_id': index,
+          'metric_value_name': name }
+        for index, name in enumerate(METRIC_VALUE_NAMES, 1)
+        ]
+
+
+def get_suite_metrics_data(pages):
+    """Return get_metrics_data style values for a suite of ``pages``."""
+    random.seed(pages)
+
+    data = []
+    for page_id in range(1, pages + 1):
+        for name in METRIC_VALUE_NAMES:
+            value = random.random()
+            if name in ('mean', 'trend_mean'):
+                value = 100 + value
+            data.append({
+                'value': value,
+                'page_id': page_id,
+                'metric_value_id': METRIC_VALUE_NAMES.index(name) + 1,
+                'metric_value_name': name,
+                })
+
+    return data
+
+
+def legacy_run_metric_summary(tm, data):
+    """TtestMethod.run_metric_summary before the array implementation."""
+    from dzmetrics.fdr import rejector
+
+    filtered_data = tm.filter_by_metric_value_name(data)
+    rejector_data = rejector(filtered_data['values'])
+
+    results = []
+    for s, d in zip( rejector_data['status'], filtered_data['list'] ):
+
+        rd = copy.copy(d)
+        rd['metric_value_name'] = tm.SUMMARY_NAME
+        rd['metric_value_id'] = tm.metric_values[tm.SUMMARY_NAME]
+        rd['value'] = s
+
+        results.append(rd)
+
+    return results
+
+
+def legacy_summary_lookup(data):
+    """The summary value lookup, one scan of ``data`` per key."""
+    lookup = {}
+    required_keys = set(
+        ['trend_mean', 'trend_stddev', 'stddev', 'mean']
+        )
+    for key in required_keys:
+        for d in data:
+            if key == d['metric_value_name']:
+               lookup[key] = d['value']
+               break
+    return lookup
+
+
+def legacy_summary_lookups(results, data):
+    """get_data_for_summary_storage built the lookup for every result."""
+    for d in results:
+        legacy_summary_lookup(data)
+
+
+def legacy_summary_storage(tm, ref_data, results, data, threshold_test_run_id):
+    """
+    get_data_for_summary_storage with the legacy lookup built for every
+    result, the current code is run one result at a time.
+    """
+    placeholders = []
+
+    tm._get_summary_data_lookup = legacy_summary_lookup
+    try:
+        for d in results:
+            placeholders.extend(
+                tm.get_data_for_summary_storage(
+                    ref_data, [d], data, threshold_test_run_id)
+                )
+    finally:
+        del tm._get_summary_data_lookup
+
+    return placeholders
+
+
+def run(pages, repeat):
+
+    from datazilla.model.metrics import TtestMethod
+
+    tm = TtestMethod(get_metric_collection())
+
+    data = get_suite_metrics_data(pages)
+    results = tm.run_metric_summary(data)
+
+    assert [ d['value'] for d in results ] == \
+        [ d['value'] for d in legacy_run_metric_summary(tm, data) ]
+
+    ref_data = { 'test_run_id': 1, 'page_id': 1, 'n_replicates': 5 }
+
+    assert tm.get_data_for_summary_storage(ref_data, results, data, 1) == \
+        legacy_summary_storage(tm, ref_data, results, data, 1)
+
+    benchmarks = [
+        ( "run_metric_summary",
+          lambda: legacy_run_metric_summary(tm, data),
+          lambda: tm.run_metric_summary(data) ),
+
+        ( "summary lookups",
+          lambda: legacy_summary_lookups(results, data),
+          lambda: tm._get_summary_data_lookup(data) ),
+
+        ( "summary storage",
+          lambda: legacy_summary_storage(tm, ref_data, results, data, 1),
+          lambda: tm.get_data_for_summary_storage(
+              ref_data, results, data, 1) ),
+        ]
+
+    print "{0} pages, best of {1} runs".format(pages, repeat)
+
+    for name, legacy, current in benchmarks:
+
+        current_time = min(timeit.repeat(current, number=1, repeat=repeat))
+        legacy_time = min(timeit.repeat(legacy, number=1, repeat=repeat))
+
+        print (
+            "  {0:<20} legacy {1:9.4f}s  current {2:9.4f}s  {3:7.1f}x"
+            ).format(name, legacy_time, current_time, legacy_time/current_time)
+
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "datazilla.settings.base")
+
+    add_vendor_lib()
+
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    run(pages, repeat)
@@ -52,17 +52,13 @@ class Command(ProjectBatchCommand):
 
             if revisions_without_push_data:
 
-                revision_nodes = {}
-
-                for revision in revisions_without_push_data:
-
-                    node = plm.get_node_from_revision(
-                        revision, revisions_without_push_data[revision])
-
-                    revision_nodes[revision] = node
+                revision_nodes = plm.get_nodes_from_revisions(
+                    revisions_without_push_data.items())
 
                 mtm.set_push_data_all_dimensions(revision_nodes)
 
+            mtm.set_test_data_rollups(ids)
+
         plm.disconnect()
         mtm.disconnect()
 
@@ -0,0 +1,56 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from datazilla.model import PushLogModel
+
+
+class Command(BaseCommand):
+    """
+    Management command to fill the indexed revision column of changesets
+    stored before the column was added.  Apply
+    hgmozilla_revision_alterations.sql to the pushlog database first.
+
+    """
+
+    help = "Backfill the revision column of the pushlog changesets."
+
+    option_list = BaseCommand.option_list + (
+
+        make_option("--chunk_size",
+                    action="store",
+                    dest="chunk_size",
+                    default=PushLogModel.REVISION_CHUNK_SIZE,
+                    help="Number of changesets to update per statement"),
+
+        make_option("--project",
+                    action="store",
+                    dest="project",
+                    default=None,
+                    help=("The project name for the the pushlog database " +
+                          "storage (default to 'pushlog')")),
+        )
+
+
+    def println(self, val):
+        self.stdout.write("{0}\n".format(str(val)))
+
+    def handle(self, *args, **options):
+        """ Fill the changeset revisions in chunks until none are left. """
+
+        try:
+            chunk_size = int(options.get("chunk_size"))
+        except ValueError:
+            raise CommandError("chunk_size must be an integer.")
+
+        plm = PushLogModel(project=options.get("project"))
+
+        total_count = 0
+        while True:
+            count = plm.set_changeset_revisions(chunk_size)
+            total_count += count
+
+            if count < chunk_size:
+                break
+
+        self.println("Changeset revisions stored: {0}".format(total_count))
+
+        plm.disconnect()
@@ -0,0 +1,55 @@
+import time
+
+from optparse import make_option
+
+from datazilla.model import MetricsTestModel
+from base import ProjectBatchCommand
+
+class Command(ProjectBatchCommand):
+    LOCK_FILE = "backfill_rollups"
+
+    help = (
+            "Recompute the daily and push rollups of the "
+            "test_data_all_dimensions table, one day at a time."
+            )
+
+    option_list = ProjectBatchCommand.option_list + (
+
+        make_option(
+            '--numdays',
+            action='store',
+            dest='numdays',
+            default=1,
+            help='Number of days ago to start the backfill from'),
+
+        make_option(
+            '--daysago',
+            action='store',
+            dest='daysago',
+            default=0,
+            help='Number of days ago to end the backfill, the current '
+                 'day is included by default'),
+            )
+
+
+    def handle_project(self, project, **options):
+
+        numdays = int(options.get("numdays", 1))
+        daysago = int(options.get("daysago", 0))
+
+        now = int(time.time())
+        today = now - (now % 86400)
+
+        mtm = MetricsTestModel(project)
+
+        for day in range(numdays + daysago, daysago, -1):
+
+            date_begin = today - (day - 1) * 86400
+
+            self.stdout.write(
+                "Processing day {0}\n".format(
+                    time.strftime('%Y-%m-%d', time.gmtime(date_begin))))
+
+            mtm.repair_test_data_rollups(date_begin, date_begin + 86400)
+
+        mtm.disconnect()
@@ -56,7 +56,8 @@ class ProjectBatchCommand(ProjectCommand):
 
     Concurrency locking:
     To set a custom lock-file for a command, subclasses should assign a value
-    to LOCK_FILE.
+    to LOCK_FILE.  Commands that are safe to run concurrently against the
+    same project can set LOCK_FILE to None to skip locking.
     """
 
     LOCK_FILE = "cron_batch"
@@ -126,20 +127,17 @@ class ProjectBatchCommand(ProjectCommand):
         else:
             projects = [project]
 
+        if not self.LOCK_FILE:
+            self.handle_projects(projects, **options)
+            return
+
         lock = FileLock(self.LOCK_FILE + '_' + str(project))
 
         timeout_sec = 10
         try:
             lock.acquire(timeout=timeout_sec)
             try:
-                self.stdout.write(
-                    "Starting for projects: {0}\n".format(", ".join(projects)))
-
-                for p in projects:
-                    self.handle_project(p, **options)
-
-                self.stdout.write(
-                    "Completed for {0} project(s).\n".format(len(projects)))
+                self.handle_projects(projects, **options)
             finally:
                 lock.release()
 
@@ -152,5 +150,17 @@ class ProjectBatchCommand(ProjectCommand):
                 "Please try again later.\n".format(str(timeout_sec)) )
 
 
+    def handle_projects(self, projects, **options):
+        """Run ``handle_project`` for each of ``projects`` in turn."""
+        self.stdout.write(
+            "Starting for projects: {0}\n".format(", ".join(projects)))
+
+        for p in projects:
+            self.handle_project(p, **options)
+
+        self.stdout.write(
+            "Completed for {0} project(s).\n".format(len(projects)))
+
+
     @abstractmethod
     def handle_project(self, project, **options): pass
@@ -0,0 +1,66 @@
+from optparse import make_option
+
+from datazilla.model import PerformanceTestModel
+from base import ProjectBatchCommand
+
+
+class Command(ProjectBatchCommand):
+    LOCK_FILE = "compress_objectstore"
+
+    help = (
+            "Compress the existing json blobs in the objectstore of a "
+            "project.  New blobs are only stored compressed if the project "
+            "is listed in DATAZILLA_COMPRESSED_OBJECTSTORE_PROJECTS."
+            )
+
+    option_list = ProjectBatchCommand.option_list + (
+
+        make_option(
+            '--chunk_size',
+            action='store',
+            dest='chunk_size',
+            default=500,
+            help='Number of json blobs to compress per iteration'),
+
+        make_option(
+            '--iterations',
+            action='store',
+            dest='iterations',
+            default=0,
+            help=('Maximum number of chunks to compress in one run, '
+                  'defaults to all of them')),
+        )
+
+    def handle_project(self, project, **options):
+
+        chunk_size = int(options.get("chunk_size", 500))
+        max_iterations = int(options.get("iterations", 0))
+
+        ptm = PerformanceTestModel(project)
+
+        if not ptm.compress_objectstore:
+            self.stdout.write(
+                "Warning: {0} is not in DATAZILLA_COMPRESSED_OBJECTSTORE_"
+                "PROJECTS, new blobs will be stored uncompressed\n".format(
+                    project))
+
+        total_count = 0
+        last_id = 0
+        iterations = 0
+
+        while True:
+
+            count, last_id = ptm.compress_objectstore_blobs(
+                last_id, chunk_size)
+
+            total_count += count
+            iterations += 1
+
+            if not count or iterations == max_iterations:
+                break
+
+        self.stdout.write(
+            "Compressed {0} json blob(s) in {1}\n".format(
+                total_count, project))
+
+        ptm.disconnect()
@@ -1,12 +1,19 @@
+import signal
+import time
+
 from optparse import make_option
 
+from django.core.management.base import CommandError
+
 from datazilla.model import PerformanceTestModel, MetricsTestModel, PushLogModel
 from base import ProjectBatchCommand
 
-from datazilla.controller.admin.metrics.perftest_metrics import compute_test_run_metrics
+from datazilla.controller.admin.push_walker import SPECIAL_HANDLING_BRANCHES
 
 class Command(ProjectBatchCommand):
-    LOCK_FILE = "process_objects"
+    # objectstore rows are claimed with a per-worker lease, so any number
+    # of process_objects workers can run against the same project
+    LOCK_FILE = None
 
     help = (
             "Transfer json blobs from the key/value store, uncompacting"
@@ -38,8 +45,38 @@ class Command(ProjectBatchCommand):
             default=None,
             help="Push log project name (defaults to pushlog)"),
 
+        make_option(
+            '--daemon',
+            action='store_true',
+            dest='daemon',
+            default=False,
+            help=("Keep running and poll the objectstore for new blobs "
+                  "instead of exiting after a single claim.  Requires "
+                  "--project.")),
+
+        make_option(
+            '--max_loadlimit',
+            action='store',
+            dest='max_loadlimit',
+            default=500,
+            help=("Daemon mode only: largest number of JSON blobs claimed "
+                  "at once when the objectstore backlog is deep "
+                  "(defaults to 500)")),
+
+        make_option(
+            '--max_sleep',
+            action='store',
+            dest='max_sleep',
+            default=30,
+            help=("Daemon mode only: longest number of seconds to sleep "
+                  "between polls of an empty objectstore (defaults to 30)")),
+
         )
 
+    # seconds slept after the first empty poll in daemon mode, doubled
+    # for every consecutive empty poll up to --max_sleep
+    MIN_SLEEP = 1
+
 
     def handle_project(self, project, **options):
 
@@ -47,43 +84,119 @@ class Command(ProjectBatchCommand):
 
         pushlog_project = options.get("pushlog_project", 'pushlog')
         loadlimit = int(options.get("loadlimit", 1))
-        debug = options.get("debug", None)
 
-        test_run_ids = []
         ptm = PerformanceTestModel(project)
-        test_run_ids = ptm.process_objects(loadlimit)
-        ptm.disconnect()
+        mtm = MetricsTestModel(project)
+        plm = PushLogModel(pushlog_project)
+
+        try:
+            if options.get("daemon"):
+                self.run_daemon(ptm, mtm, plm, loadlimit, **options)
+            else:
+                self.process_claim(ptm, mtm, plm, loadlimit)
+        finally:
+            ptm.disconnect()
+            mtm.disconnect()
+            plm.disconnect()
 
-        """
-        metrics_exclude_projects = set(['b2g', 'games', 'jetperf', 'marketapps', 'microperf', 'stoneridge', 'test', 'webpagetest'])
-        if project not in metrics_exclude_projects:
-            #minimum required number of replicates for
-            #metrics processing
-            replicate_min = 5
-            compute_test_run_metrics(
-                project, pushlog_project, debug, replicate_min, test_run_ids
+
+    def handle_noargs(self, **options):
+        """Daemon mode runs against a single project only."""
+        if options.get("daemon") and not options.get("project"):
+            raise CommandError(
+                "You must supply a project name with --daemon: "
+                "--project project"
                 )
-        """
 
-        mtm = MetricsTestModel(project)
+        super(Command, self).handle_noargs(**options)
+
+
+    def process_claim(self, ptm, mtm, plm, loadlimit):
+        """Claim and load up to ``loadlimit`` blobs, return the test_run_ids."""
+
+        test_run_ids = ptm.process_objects(loadlimit)
+
+        if ptm.lost_lease_count:
+            self.stdout.write(
+                "Lost the lease of {0} blob(s) to another worker\n".format(
+                    ptm.lost_lease_count))
+
+        #The replicates were just loaded, use them instead of reading
+        #test_value back
         revisions_without_push_data = mtm.load_test_data_all_dimensions(
-            test_run_ids)
+            test_run_ids, test_runs=ptm.get_loaded_test_runs())
 
         if revisions_without_push_data:
 
-            revision_nodes = {}
-            plm = PushLogModel(pushlog_project)
+            revision_nodes = plm.get_nodes_from_revisions(
+                revisions_without_push_data.items())
 
-            for revision in revisions_without_push_data:
+            mtm.set_push_data_all_dimensions(revision_nodes)
 
-                node = plm.get_node_from_revision(
-                    revision, revisions_without_push_data[revision])
+        mtm.set_test_data_rollups(test_run_ids)
 
-                revision_nodes[revision] = node
+        #Data can arrive after run_metrics walked its push, make sure
+        #the next walk picks up the revisions of the branches it walks
+        mtm.set_push_walker_dirty_revisions(
+            test_run_ids, SPECIAL_HANDLING_BRANCHES)
 
-            plm.disconnect()
-            mtm.set_push_data_all_dimensions(revision_nodes)
+        return test_run_ids
+
+
+    def run_daemon(self, ptm, mtm, plm, loadlimit, **options):
+        """
+        Poll the objectstore until SIGTERM or SIGINT is received.
+
+        The model connections stay open between polls.  The claim size
+        grows with the objectstore backlog, between ``loadlimit`` and
+        --max_loadlimit, and the sleep between polls backs off while the
+        objectstore is empty.  A signal lets the claim being loaded finish;
+        anything still claimed by this worker afterwards is released back
+        to the objectstore before exiting.
+
+        """
+        max_loadlimit = max(int(options.get("max_loadlimit")), loadlimit)
+        max_sleep = int(options.get("max_sleep"))
+
+        self.shutdown = False
+
+        def request_shutdown(signum, frame):
+            self.shutdown = True
+
+        signal.signal(signal.SIGTERM, request_shutdown)
+        signal.signal(signal.SIGINT, request_shutdown)
+
+        sleep_time = 0
+
+        try:
+            while not self.shutdown:
+
+                backlog = ptm.get_objectstore_backlog()
+
+                if backlog:
+                    sleep_time = 0
+                    claim_size = min(max(backlog, loadlimit), max_loadlimit)
+                    test_run_ids = self.process_claim(
+                        ptm, mtm, plm, claim_size)
+
+                    self.stdout.write(
+                        "Loaded {0} of {1} blob(s) in the backlog\n".format(
+                            len(test_run_ids), backlog))
+                else:
+                    sleep_time = min(
+                        max(sleep_time * 2, self.MIN_SLEEP), max_sleep)
+                    self.sleep(sleep_time)
 
-        mtm.disconnect()
+        finally:
+            released = ptm.release_claimed_objects()
+            self.stdout.write(
+                "Shutting down, released {0} claimed blob(s)\n".format(
+                    released))
 
 
+    def sleep(self, seconds):
+        """Sleep for ``seconds``, waking early if shutdown is requested."""
+        for i in range(seconds):
+            if self.shutdown:
+                break
+            time.sleep(1)
@@ -30,6 +30,34 @@ class Command(ProjectBatchCommand):
                     default=None,
                     help=("Number of days ago to start from, "
                           "defaults to now."),
+            ),
+
+        make_option("--parent_window",
+                    action="store",
+                    dest="parent_window",
+                    default=None,
+                    help=("Number of pushes to load per query when looking "
+                          "for the parent of a metric datum, defaults to "
+                          "DATAZILLA_PARENT_WINDOW_SIZE."),
+            ),
+
+        make_option("--workers",
+                    action="store",
+                    dest="workers",
+                    default=1,
+                    help=("Number of processes computing metrics, each "
+                          "branch and test configuration is processed by "
+                          "a single process (defaults to 1)."),
+            ),
+
+        make_option("--rewalk",
+                    action="store_true",
+                    dest="rewalk",
+                    default=False,
+                    help=("Process every push in the window instead of "
+                          "the pushes after the last run and the "
+                          "revisions with new data, use it to repair "
+                          "metrics data."),
             )
         )
 
@@ -44,11 +72,28 @@ class Command(ProjectBatchCommand):
 
         summary = options.get("summary")
 
-        push_walker.run_metrics(
-            project, pushlog_project, numdays, daysago
+        parent_window = options.get("parent_window")
+        if parent_window:
+            parent_window = int(parent_window)
+
+        workers = int(options.get("workers") or 1)
+
+        rewalk = options.get("rewalk", False)
+
+        stats = push_walker.run_metrics(
+            project, pushlog_project, numdays, daysago, parent_window,
+            workers, rewalk
             )
 
-        push_walker.summary(project, pushlog_project, numdays, daysago)
+        self.stdout.write(
+            ("Parent window of {0} pushes: {1} hits, {2} misses, "
+             "{3} queries, {4:.1%} hit rate\n").format(
+                stats['window_size'], stats['hits'], stats['misses'],
+                stats['queries'], stats['hit_rate']))
+
+        push_walker.summary(
+            project, pushlog_project, numdays, daysago, workers, rewalk
+            )
 
 
     def println(self, val):
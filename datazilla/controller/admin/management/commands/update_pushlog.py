@@ -1,8 +1,5 @@
-import signal
 import os
-import sys
 import errno
-import time
 
 from optparse import make_option
 from django.core.management.base import BaseCommand, CommandError
@@ -64,6 +61,23 @@ class Command(BaseCommand):
                     default=None,
                     help=("The project name for the the pushlog database " +
                           "storage (default to 'pushlog')")),
+
+        make_option("--incremental",
+                    action="store_true",
+                    dest="incremental",
+                    default=False,
+                    help=("Only request the pushes newer than the last " +
+                          "stored push of each branch.  numdays or hours " +
+                          "are then only used for branches without any " +
+                          "stored pushes.")),
+
+        make_option("--workers",
+                    action="store",
+                    dest="workers",
+                    default=PushLogModel.SYNC_WORKERS,
+                    help=("Incremental mode only: number of branches to " +
+                          "fetch at the same time (default to {0})".format(
+                            PushLogModel.SYNC_WORKERS))),
         )
 
 
@@ -80,12 +94,18 @@ class Command(BaseCommand):
         branch = options.get("branch")
         verbosity = options.get("verbosity")
         project = options.get("project")
+        incremental = options.get("incremental")
+
+        try:
+            workers = int(options.get("workers"))
+        except ValueError:
+            raise CommandError("workers must be an integer.")
 
         if not repo_host:
             raise CommandError("You must supply a host name for the repo pushlogs " +
                          "to store: --repo_host hostname")
 
-        if not numdays and not hours:
+        if not numdays and not hours and not incremental:
             raise CommandError("You must supply the number of days or hours of data.")
         else:
             if numdays:
@@ -103,66 +123,55 @@ class Command(BaseCommand):
 
         pidfile = "{0}.pid".format(self.LOCK_FILE)
 
+        ####
+        #Never overlap with a previous run that is still going, json-pushes
+        #requests time out so a run can not hang indefinitely.  A pid file
+        #left behind by a run that died is replaced.
+        ####
         if os.path.isfile(pidfile):
 
             pid = ""
             with open(pidfile) as f:
                 pid = f.readline().strip()
 
-            ####
-            #If we have a pid file assume the update_pushlog command is
-            #hanging on an intermitent urllib timeout from the call to the
-            #json-pushes web service method and kill the hanging program.
-            ####
-            if pid:
-
-                logfile_name = "{0}.log".format(self.LOCK_FILE)
-                time_stamp = str( time.time() ).split('.')[0]
-
-                try:
-
-                    os.kill(int(pid), signal.SIGKILL)
-
-                except OSError, err:
-
-                    log_file = open(logfile_name, 'a+')
+            if pid and self.is_running(int(pid)):
+                self.println(
+                    "update_pushlog is already running as pid {0}, "
+                    "exiting".format(pid))
+                return
 
-                    msg = ""
-                    if err.errno == errno.ESRCH:
-                        msg = "pid:{0} time:{1}, Not running\n".format(
-                            pid, time_stamp)
-                    elif err.errno == errno.EPERM:
-                        msg = "pid:{0} time:{1}, No permission to signal process\n".format(
-                            pid, time_stamp)
-                    else:
-                        msg = "pid:{0} time:{1}, Generated unknown error {2}\n".format(
-                            pid, str(err), time_stampe)
+        #Write pid file
+        pid = str(os.getpid())
+        file(pidfile, 'w').write(pid)
 
-                    log_file.write(msg)
-                    log_file.close()
+        try:
+            self.update_pushlog(project, repo_host, numdays, hours, enddate,
+                                branch, verbosity, incremental, workers)
+        finally:
+            os.unlink(pidfile)
 
-                    #make sure we get rid of any pid file on error
-                    os.unlink(pidfile)
 
-                else:
+    def is_running(self, pid):
+        """Return True if a process with ``pid`` exists."""
+        try:
+            os.kill(pid, 0)
+        except OSError, err:
+            return err.errno == errno.EPERM
+        return True
 
-                    #log the kill
-                    log_file = open(logfile_name, 'a+')
-                    log_file.write("pid:{0} time:{1}, Killed\n".format(
-                        pid, time_stamp))
-                    log_file.close()
 
-                    #remove any existing pidfile
-                    os.unlink(pidfile)
-
-        #Write pid file
-        pid = str(os.getpid())
-        file(pidfile, 'w').write(pid)
+    def update_pushlog(self, project, repo_host, numdays, hours, enddate,
+                       branch, verbosity, incremental, workers):
 
         plm = PushLogModel(project=project, out=self.stdout, verbosity=verbosity)
 
         # store the pushlogs for the branch specified, or all branches
-        summary = plm.store_pushlogs(repo_host, numdays, hours, enddate, branch)
+        if incremental:
+            summary = plm.sync_pushlogs(
+                repo_host, numdays, hours, enddate, branch, workers)
+        else:
+            summary = plm.store_pushlogs(
+                repo_host, numdays, hours, enddate, branch)
         self.println(("Branches: {0}\nPushlogs stored: {1}, skipped: {2}\n" +
                       "Changesets stored: {3}, skipped: {4}").format(
                         summary["branches"],
@@ -174,6 +183,4 @@ class Command(BaseCommand):
 
         plm.disconnect()
 
-        os.unlink(pidfile)
-
 
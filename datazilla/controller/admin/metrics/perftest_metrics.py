@@ -1,8 +1,11 @@
 import traceback
 
-from datazilla.model import PushLogModel, MetricsTestModel, MetricMethodError
+from datazilla.model import MetricsTestModel, MetricMethodError
 from datazilla.model.utils import println
 from datazilla.controller.admin.push_walker import extend_ref_data
+from datazilla.controller.admin.partitions import (
+    run_partitions, get_partition_state
+    )
 
 SAFE_TESTS = set([
     'tp5'
@@ -13,10 +16,16 @@ BRANCHES_NOT_ALLOWED = set([
     ])
 
 def compute_test_run_metrics(
-    project, pushlog_project, debug, replicate_min, test_run_ids=[]
+    project, pushlog_project, debug, replicate_min, test_run_ids=[],
+    workers=None
     ):
     """
     Runs all metric tests and associated summaries on a list of test run ids
+
+    The test runs are partitioned by branch and metric summary key, see
+    get_test_run_partitions.  With workers greater than one the partitions
+    run in a process pool, the results stored are the same as a serial
+    run.
     """
     ###
     #Insure that test_run_ids is iterable, if process objects generates
@@ -25,95 +34,165 @@ def compute_test_run_metrics(
     ###
     test_run_ids = test_run_ids or []
 
-    ##
-    #Get test data for test run ids
-    ##
-    plm = PushLogModel(pushlog_project)
+    if not test_run_ids:
+        return
+
     mtm = MetricsTestModel(project)
 
+    partitions = get_test_run_partitions(
+        mtm, test_run_ids, debug, replicate_min
+        )
+
+    mtm.disconnect()
+
+    run_partitions(
+        _compute_partition_metrics, partitions, project, pushlog_project,
+        workers
+        )
+
+def get_test_run_partitions(mtm, test_run_ids, debug, replicate_min):
+    """
+    Group test_run_ids by branch and metric summary key, a partition
+    holds the test runs sharing the thresholds of a set of metric datums
+    in test_run_ids order:
+
+        [ { 'test_run_ids':[ test_run_id, ... ],
+            'debug':debug,
+            'replicate_min':replicate_min }, ... ]
+
+    Test runs without test data share a partition.
+    """
+    summary_keys = mtm.get_metric_summary_keys_by_test_run_ids(test_run_ids)
+
+    partitions = []
+    partition_lookup = {}
+
+    for test_run_id in test_run_ids:
+
+        key = None
+
+        if test_run_id in summary_keys:
+            key = (
+                summary_keys[test_run_id]['branch'],
+                mtm.get_metrics_summary_key(summary_keys[test_run_id])
+                )
+
+        if key not in partition_lookup:
+            partition_lookup[key] = {
+                'test_run_ids':[],
+                'debug':debug,
+                'replicate_min':replicate_min
+                }
+            partitions.append(partition_lookup[key])
+
+        partition_lookup[key]['test_run_ids'].append(test_run_id)
+
+    return partitions
+
+def _compute_partition_metrics(partition):
+    """
+    Run the metric tests and summaries of the test runs in a
+    compute_test_run_metrics partition.
+    """
+    state = get_partition_state()
+
+    plm = state['plm']
+    mtm = state['mtm']
+
+    debug = partition['debug']
+    replicate_min = partition['replicate_min']
+
+    #Pushes without data are specific to the summary key of the partition
+    mtm.skip_revisions = set()
+    mtm.reset_parent_window()
+
     #####
     #We don't know if we need the pushlog, or for what branches
     #it will be required.  Make sure to only retrieve once for each
     #branch encountered and only when we need it.
     ####
-    pushlog = {}
+    pushlog = state.setdefault('pushlog', {})
 
     #####
     #This data structure is used to lookup up the index position
     #of a revision in the push log to start walking from
     #####
-    pushlog_lookup = {}
+    pushlog_lookup = state.setdefault('pushlog_lookup', {})
 
-    for test_run_id in test_run_ids:
+    #Thresholds are read and updated in memory and written in push
+    #date order once the partition is complete
+    mtm.begin_threshold_session()
 
-        child_test_data = mtm.get_test_values_by_test_run_id(test_run_id)
+    try:
+        for test_run_id in partition['test_run_ids']:
 
-        if not child_test_data:
-            msg = u"No test data available for test run id {0}".format(
-                test_run_id
-                )
-            println(msg, debug)
-            continue
+            child_test_data = mtm.get_test_values_by_test_run_id(test_run_id)
 
-        first_key = _get_first_mkey(child_test_data)
+            if not child_test_data:
+                msg = u"No test data available for test run id {0}".format(
+                    test_run_id
+                    )
+                println(msg, debug)
+                continue
 
-        rep_count = len(child_test_data[first_key]['values'])
+            first_key = _get_first_mkey(child_test_data)
 
-        test_name = child_test_data[first_key]['ref_data']['test_name']
+            rep_count = len(child_test_data[first_key]['values'])
 
-        child_revision, push_node, branch = _get_revision_and_push_node(
-            plm, child_test_data, first_key
-            )
+            test_name = child_test_data[first_key]['ref_data']['test_name']
 
-        base_message = u"{0} {1}".format(child_revision, str(test_run_id))
+            child_revision, push_node, branch = _get_revision_and_push_node(
+                plm, child_test_data, first_key
+                )
 
-        if not check_run_conditions(
-            test_name, rep_count, push_node, branch, replicate_min, debug
-            ):
-            println(u"Not able to run {0}\n".format(base_message), debug)
-            continue
+            base_message = u"{0} {1}".format(child_revision, str(test_run_id))
 
-        #The test and its replicates pass the run conditions
-        println(u"Running {0}".format(base_message), debug)
+            if not check_run_conditions(
+                test_name, rep_count, push_node, branch, replicate_min, debug
+                ):
+                println(u"Not able to run {0}\n".format(base_message), debug)
+                continue
 
-        stored_metric_keys = []
+            #The test and its replicates pass the run conditions
+            println(u"Running {0}".format(base_message), debug)
 
-        try:
+            stored_metric_keys = []
 
-            stored_metric_keys = _run_metrics(
-                test_run_id, mtm, plm, child_test_data, pushlog,
-                pushlog_lookup, child_revision, push_node, branch,
-                test_name, debug
-                )
+            try:
 
-        except Exception as e:
+                stored_metric_keys = _run_metrics(
+                    test_run_id, mtm, plm, child_test_data, pushlog,
+                    pushlog_lookup, child_revision, push_node, branch,
+                    test_name, debug
+                    )
 
-            _handle_exception(
-                mtm, e, test_name, child_revision, test_run_id,
-                compute_test_run_metrics.__name__, debug
-                )
+            except Exception as e:
 
-        try:
+                _handle_exception(
+                    mtm, e, test_name, child_revision, test_run_id,
+                    compute_test_run_metrics.__name__, debug
+                    )
 
-            _run_summary(
-                test_run_id, mtm, plm, child_revision, child_test_data,
-                stored_metric_keys, push_node, debug
-                )
+            try:
 
-        except Exception as e:
+                _run_summary(
+                    test_run_id, mtm, plm, child_revision, child_test_data,
+                    stored_metric_keys, push_node, debug
+                    )
 
-            _handle_exception(
-                mtm, e, test_name, child_revision, test_run_id,
-                compute_test_run_metrics.__name__, debug
-                )
+            except Exception as e:
 
-        println(
-            u"\tProcessing complete for {0}\n".format(base_message),
-            debug
-            )
+                _handle_exception(
+                    mtm, e, test_name, child_revision, test_run_id,
+                    compute_test_run_metrics.__name__, debug
+                    )
 
-    plm.disconnect()
-    mtm.disconnect()
+            println(
+                u"\tProcessing complete for {0}\n".format(base_message),
+                debug
+                )
+    finally:
+        mtm.commit_threshold_session()
 
 def run_test(test_name):
     """
@@ -196,6 +275,11 @@ def _run_metrics(
 
     stored_metric_keys = []
 
+    #Get the threshold data for every metric datum of the test run
+    threshold_data = mtm.get_threshold_data_bulk(
+        map( lambda k:child_test_data[k]['ref_data'], child_test_data )
+        )
+
     for mkey in child_test_data:
 
         ####
@@ -204,12 +288,7 @@ def _run_metrics(
         ###
         extend_ref_data(child_test_data, mkey, push_node)
 
-        #Get the threshold data
-        threshold_data = mtm.get_threshold_data(
-           child_test_data[mkey]['ref_data']
-           )
-
-        if threshold_data:
+        if mkey in threshold_data:
 
             if debug:
                 println(u"\tThreshold data found for metric datum", debug)
@@ -267,7 +346,8 @@ def _run_metrics(
                 child_revision,
                 child_test_data[mkey]['ref_data'],
                 test_result,
-                threshold_data[mkey]['ref_data']['test_run_id']
+                threshold_data[mkey]['ref_data']['test_run_id'],
+                child_test_data[mkey]['values']
                 )
 
             stored_metric_keys.append(mkey)
@@ -354,7 +434,8 @@ def _run_metrics(
                     child_revision,
                     child_test_data[mkey]['ref_data'],
                     test_result,
-                    parent_data['ref_data']['test_run_id']
+                    parent_data['ref_data']['test_run_id'],
+                    child_test_data[mkey]['values']
                     )
 
                 stored_metric_keys.append(mkey)
@@ -386,7 +467,8 @@ def _run_metrics(
                     parent_data['ref_data']['revision'],
                     parent_data['ref_data'],
                     parent_test_result,
-                    parent_data['ref_data']['test_run_id']
+                    parent_data['ref_data']['test_run_id'],
+                    parent_data['values']
                     )
             else:
                 println(u"\t\tNo parent found", debug)
@@ -0,0 +1,99 @@
+"""
+Functions for running metrics work partitions serially or in a
+process pool.
+
+A partition is a unit of work that is independent of every other
+partition, the metrics code partitions by branch and metric summary
+key so the threshold and trend line updates of a metric datum all
+happen, in push order, inside a single partition.  Partitions are
+run in the order given and their results are returned in that order
+whatever the number of workers, serial and parallel runs store the
+same results.
+"""
+import multiprocessing
+from multiprocessing.util import Finalize
+
+from django import db
+
+from datazilla.model import PushLogModel, MetricsTestModel
+
+#Models and caches of the process running partitions, see
+#get_partition_state
+_partition_state = {}
+
+def get_partition_state():
+    """
+    Return the state of the process running partitions:
+
+        {
+            'mtm':MetricsTestModel,
+            'plm':PushLogModel,
+            ...caches partition functions add with setdefault
+        }
+
+    Every pool worker has its own models and database connections.
+    """
+    return _partition_state
+
+def run_partitions(
+    target, partitions, project, pushlog_project, workers=None,
+    parent_window_size=None
+    ):
+    """
+    Call 'target' with each partition in 'partitions' and return the
+    list of results in partition order.
+
+    With workers greater than one the partitions are distributed to a
+    process pool, 'target' and the partitions must be picklable.
+    """
+    workers = min(int(workers or 1), len(partitions))
+
+    if workers <= 1:
+        _init_partition_state(project, pushlog_project, parent_window_size)
+        try:
+            return map(target, partitions)
+        finally:
+            _clear_partition_state()
+
+    #Forked workers must not share the django connection of the parent
+    db.close_connection()
+
+    pool = multiprocessing.Pool(
+        workers,
+        _init_partition_worker,
+        (project, pushlog_project, parent_window_size)
+        )
+
+    try:
+        results = pool.map(target, partitions, chunksize=1)
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+    return results
+
+def _init_partition_worker(project, pushlog_project, parent_window_size):
+
+    _init_partition_state(project, pushlog_project, parent_window_size)
+
+    #Disconnect the models when the worker exits
+    Finalize(None, _clear_partition_state, exitpriority=10)
+
+def _init_partition_state(project, pushlog_project, parent_window_size):
+
+    _partition_state['plm'] = PushLogModel(pushlog_project)
+    _partition_state['mtm'] = MetricsTestModel(
+        project, parent_window_size=parent_window_size
+        )
+
+def _clear_partition_state():
+
+    for key in ('plm', 'mtm'):
+        if key in _partition_state:
+            _partition_state[key].disconnect()
+
+    _partition_state.clear()
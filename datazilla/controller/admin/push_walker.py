@@ -2,12 +2,20 @@
 Functions for walking the push log and populating
 the metrics schema
 """
-from datazilla.model import PushLogModel, MetricsTestModel
+import time
+
+from datazilla.model import PushLogModel, MetricsTestModel, utils
+from datazilla.controller.admin.partitions import (
+    run_partitions, get_partition_state
+    )
 
 # Branches that require special handling
 SPECIAL_HANDLING_BRANCHES = set(['Try', 'Try-Non-PGO'])
 
-def run_metrics(project, pushlog_project, numdays, daysago):
+def run_metrics(
+    project, pushlog_project, numdays, daysago, parent_window_size=None,
+    workers=None, rewalk=False
+    ):
     """
         This function retrieves the push log for a given branch and
     iterates over each push in ascending order implementing the following
@@ -55,11 +63,96 @@ def run_metrics(project, pushlog_project, numdays, daysago):
         If the child push is from a date before the metric threshold its
     test results will not be used to update the threshold so the stored
     threshold data is always moving forward in time.
-    """
 
+        Parent test values are prefetched parent_window_size pushes at a
+    time, the hit/miss counters of the window are returned.
+
+        The walk is partitioned by branch and metric summary key, see
+    get_metric_partitions.  With workers greater than one the partitions
+    run in a process pool, the results stored are the same as a serial
+    run.
+
+        Only the pushes after the checkpoint of a branch and the revisions
+    that received data since they were walked are processed, see
+    get_branch_walks.  With rewalk every push in the window is processed.
+    Revisions left with metric datums without metrics, no threshold and
+    no parent with data yet, stay dirty so later walks retry them until
+    they are numdays old, and revisions that received metrics are marked
+    dirty for summary.
+    """
     plm = PushLogModel(pushlog_project)
+    mtm = MetricsTestModel(project, parent_window_size=parent_window_size)
 
-    mtm = MetricsTestModel(project)
+    date_started = int(time.time())
+    date_expired = get_dirty_revision_expiration(numdays)
+
+    walks = get_branch_walks(plm, mtm, 'metrics', numdays, daysago, rewalk)
+
+    partitions = get_metric_partitions(mtm, walks)
+
+    plm.disconnect()
+    mtm.disconnect()
+
+    partition_stats = run_partitions(
+        _run_metrics_partition, partitions, project, pushlog_project,
+        workers, parent_window_size
+        )
+
+    #Datums left without metrics are retried by the next walk, revisions
+    #that received metrics are summarized again
+    dirty_revisions = { 'metrics':set(), 'summary':set() }
+    for s in partition_stats:
+        dirty_revisions['metrics'].update(s['unresolved'])
+        dirty_revisions['summary'].update(s['resolved'])
+
+    #Only checkpoint once every partition of the walk has been stored
+    _set_walks_complete(
+        project, 'metrics', walks, date_started, dirty_revisions,
+        date_expired
+        )
+
+    stats = { 'hits':0, 'misses':0, 'queries':0 }
+    for s in partition_stats:
+        for key in stats:
+            stats[key] += s[key]
+
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = 0.0
+    if lookups:
+        stats['hit_rate'] = float(stats['hits'])/lookups
+
+    stats['window_size'] = mtm.parent_window_size
+
+    return stats
+
+def get_branch_walks(plm, mtm, walker, numdays, daysago, rewalk=False):
+    """
+    Return the branch pushlogs walker has to process:
+
+        [ { 'branch':branch name,
+            'branch_names':lower case name and alt_name of the branch,
+            'pushlog':branch pushlog,
+            'revisions':set of revisions to process,
+            'dirty':set of dirty revisions in revisions,
+            'push_id':checkpoint once the walk is complete }, ... ]
+
+    Only the revisions of pushes after the walker checkpoint of the
+    branch and the dirty revisions, revisions that received test data
+    since they were walked, are processed.  The cost of a walk follows
+    the number of new pushes instead of the size of the window.  The
+    whole pushlog is kept so the parents of new pushes are still found
+    in earlier pushes.
+
+    With rewalk the checkpoints are ignored and every push in the window
+    is processed, use it to repair the data of a date range.
+    """
+    checkpoints = {}
+    if not rewalk:
+        checkpoints = mtm.get_push_walker_checkpoints(walker)
+
+    dirty_revisions = mtm.get_push_walker_dirty_revisions(walker)
+
+    walks = []
 
     branches = plm.get_branch_list()
 
@@ -72,12 +165,204 @@ def run_metrics(project, pushlog_project, numdays, daysago):
             b['id'], numdays, daysago
             )
 
+        if not pushlog:
+            continue
+
+        checkpoint = checkpoints.get(b['name'], None)
+
+        revisions = set()
+        for node in pushlog:
+            revision = mtm.truncate_revision(node['node'])
+            if ( checkpoint is None or node['push_id'] > checkpoint or
+                 revision in dirty_revisions ):
+                revisions.add(revision)
+
+        if not revisions:
+            continue
+
+        #Walking an earlier window never moves the checkpoint backwards
+        push_id = max( map(lambda node: node['push_id'], pushlog) )
+        if checkpoint is not None:
+            push_id = max(push_id, checkpoint)
+
+        walks.append({
+            'branch':b['name'],
+            'branch_names':set(
+                [ name.lower() for name in (b['name'], b['alt_name'])
+                  if name ]
+                ),
+            'pushlog':pushlog,
+            'revisions':revisions,
+            'dirty':revisions.intersection(dirty_revisions),
+            'push_id':push_id
+            })
+
+    return walks
+
+def get_dirty_revision_expiration(numdays):
+    """
+    Return the date before which dirty revisions are dropped, the start
+    of a numdays walk window.  A revision receives its test data after
+    its push, the push of a revision marked dirty before the window
+    starts is never walked again.
+    """
+    if not numdays:
+        return None
+
+    return utils.get_day_range(numdays)['start']
+
+def set_branch_walks_complete(
+    mtm, walker, walks, date_started, dirty_revisions=None,
+    date_expired=None):
+    """
+    Store the checkpoints of the walks returned by get_branch_walks and
+    remove the revisions they processed from the walker dirty set.
+    date_started is the time the walks were retrieved.
+
+    dirty_revisions - Optional dict of walker:revisions marked dirty once
+        the processed revisions are removed, the revisions the walk has
+        to hand to the next walk.  A revision already dirty keeps the
+        date it was marked, a revision walker hands back to itself is
+        retried until it expires.
+
+    date_expired - Optional date, the revisions marked dirty for walker
+        before it are removed, see get_dirty_revision_expiration.
+    """
+    dirty_revisions = dirty_revisions or {}
+
+    walked_revisions = set()
+
+    for walk in walks:
+
+        mtm.set_push_walker_checkpoint(
+            walker, walk['branch'], walk['push_id']
+            )
+
+        walked_revisions.update(walk['dirty'])
+
+    #Retried revisions stay in place so their date_added is kept
+    walked_revisions.difference_update(dirty_revisions.get(walker, []))
+
+    mtm.delete_push_walker_dirty_revisions(
+        walker, sorted(walked_revisions), date_started
+        )
+
+    for dirty_walker, revisions in dirty_revisions.items():
+        mtm.add_push_walker_dirty_revisions(dirty_walker, sorted(revisions))
+
+    if date_expired:
+        mtm.delete_expired_push_walker_dirty_revisions(walker, date_expired)
+
+def _set_walks_complete(
+    project, walker, walks, date_started, dirty_revisions=None,
+    date_expired=None):
+
+    #The models of the walk were disconnected before the partitions
+    #were forked
+    mtm = MetricsTestModel(project)
+
+    try:
+        set_branch_walks_complete(
+            mtm, walker, walks, date_started, dirty_revisions, date_expired)
+    finally:
+        mtm.disconnect()
+
+def get_metric_partitions(mtm, walks):
+    """
+    Return the list of run_metrics partitions, one for every branch and
+    metric summary key with test data in the revisions of a branch walk,
+    see get_branch_walks:
+
+        [ { 'branch':branch name,
+            'pushlog':branch pushlog,
+            'revisions':set of revisions to process,
+            'data_revisions':set of revisions with test data for ref_data,
+            'ref_data':{ all MetricsTestModel.METRIC_SUMMARY_KEYS } }, ... ]
+
+    All of the metric datums sharing a branch and summary key are walked
+    together so the thresholds of a metric datum are always updated in
+    push order.  Only the test runs of a product on the walk branch are
+    included, like get_test_run_partitions.
+    """
+    partitions = []
+
+    for walk in walks:
+
+        summary_key_data = mtm.get_metric_summary_keys_by_revisions(
+            sorted(walk['revisions'])
+            )
+
+        walk_partitions = {}
+
+        for data in summary_key_data:
+
+            if not data['branch'] or \
+                data['branch'].lower() not in walk['branch_names']:
+                continue
+
+            summary_key = mtm.get_metrics_summary_key(data)
+
+            if summary_key not in walk_partitions:
+                walk_partitions[summary_key] = {
+                    'branch':walk['branch'],
+                    'pushlog':walk['pushlog'],
+                    'revisions':walk['revisions'],
+                    'data_revisions':set(),
+                    'ref_data':dict(
+                        [ (k, data[k]) for k in mtm.METRIC_SUMMARY_KEYS ]
+                        )
+                    }
+                partitions.append(walk_partitions[summary_key])
+
+            walk_partitions[summary_key]['data_revisions'].add(
+                data['revision']
+                )
+
+    return partitions
+
+def _run_metrics_partition(partition):
+    """
+    Walk the pushlog of a run_metrics partition, see run_metrics for the
+    rule set.  Returns the parent window counters of the partition along
+    with the 'unresolved' revisions, left with metric datums without
+    metrics, and the 'resolved' revisions, that received metrics.
+    """
+    mtm = get_partition_state()['mtm']
+
+    #Pushes without data are specific to the summary key of the partition
+    mtm.skip_revisions = set()
+    mtm.reset_parent_window()
+
+    pushlog = partition['pushlog']
+
+    #Thresholds are read and updated in memory and written in push
+    #date order once the partition is complete
+    mtm.begin_threshold_session()
+
+    #Revisions with metric datums left without metrics and revisions
+    #that received metrics, see run_metrics
+    unresolved_revisions = set()
+    resolved_revisions = set()
+
+    try:
         for index, node in enumerate(pushlog):
 
             revision = mtm.truncate_revision(node['node'])
 
+            #Pushes before the checkpoint are only used to find parents
+            if revision not in partition['revisions']:
+                continue
+
+            #Pushes without test data for the summary key of the partition
+            #are skipped when looking for parents
+            if revision not in partition['data_revisions']:
+                mtm.add_skip_revision(revision)
+                continue
+
             #Get the test value data for this revision
-            child_test_data = mtm.get_test_values_by_revision(revision)
+            child_test_data = mtm.get_test_values_by_revision(
+                revision, partition['ref_data']
+                )
             test_data_set = set(child_test_data.keys())
 
             ###
@@ -91,8 +376,10 @@ def run_metrics(project, pushlog_project, numdays, daysago):
                 mtm.add_skip_revision(revision)
                 continue
 
-            #Get the computed metrics for this revision
-            computed_metrics_data = mtm.get_metrics_data(revision)
+            #Get the computed metrics of the summary key for this revision
+            computed_metrics_data = mtm.get_metrics_data(
+                revision, partition['ref_data']
+                )
             computed_metrics_set = set(computed_metrics_data.keys())
 
             ###
@@ -104,34 +391,61 @@ def run_metrics(project, pushlog_project, numdays, daysago):
                 computed_metrics_set
                 )
 
-            for child_key in data_without_metrics:
+            #Get the threshold data for every metric datum at once
+            threshold_data = mtm.get_threshold_data_bulk(
+                map(
+                    lambda k:child_test_data[k]['ref_data'],
+                    data_without_metrics
+                    )
+                )
+
+            ###
+            #CASE: Threshold data exists for the metric datum.
+            #   Use it to run the test.  The metric datums of the push
+            #   are evaluated together when their metric method supports
+            #   batch evaluation.
+            ###
+            threshold_keys = sorted(
+                data_without_metrics.intersection(threshold_data.keys())
+                )
 
-                threshold_data = mtm.get_threshold_data(
-                    child_test_data[child_key]['ref_data']
+            threshold_results = dict( zip(
+                threshold_keys,
+                mtm.run_metric_methods(
+                    map(
+                        lambda k:child_test_data[k]['ref_data'],
+                        threshold_keys
+                        ),
+                    map(lambda k:child_test_data[k]['values'], threshold_keys),
+                    map(lambda k:threshold_data[k]['values'], threshold_keys),
+                    map(
+                        lambda k:threshold_data[k]['metric_values'],
+                        threshold_keys
+                        )
                     )
+                ) )
 
+            for child_key in data_without_metrics:
 
                 extend_ref_data(child_test_data, child_key, node)
 
-                if threshold_data:
+                if child_key in threshold_data:
 
-                    ###
-                    #CASE: Threshold data exists for the metric datum.
-                    #   Use it to run the test.
-                    ###
-                    test_result = mtm.run_metric_method(
-                        child_test_data[child_key]['ref_data'],
-                        child_test_data[child_key]['values'],
-                        threshold_data[child_key]['values'],
-                        threshold_data[child_key]['metric_values'],
-                        )
+                    test_result = threshold_results[child_key]
+
+                    #The metric method could not evaluate the datum
+                    if test_result is None:
+                        unresolved_revisions.add(revision)
+                        continue
 
                     mtm.store_metric_results(
                         revision,
                         child_test_data[child_key]['ref_data'],
                         test_result,
-                        threshold_data[child_key]['ref_data']['test_run_id']
+                        threshold_data[child_key]['ref_data']['test_run_id'],
+                        child_test_data[child_key]['values']
                         )
+                    resolved_revisions.add(revision)
                 else:
 
                     ###
@@ -154,13 +468,24 @@ def run_metrics(project, pushlog_project, numdays, daysago):
                             revision,
                             child_test_data[child_key]['ref_data'],
                             test_result,
-                            parent_data['ref_data']['test_run_id']
+                            parent_data['ref_data']['test_run_id'],
+                            child_test_data[child_key]['values']
                             )
+                        resolved_revisions.add(revision)
+                    else:
+                        unresolved_revisions.add(revision)
+    finally:
+        mtm.commit_threshold_session()
 
-    plm.disconnect()
-    mtm.disconnect()
+    stats = mtm.get_parent_window_stats()
+    stats['unresolved'] = sorted(unresolved_revisions)
+    stats['resolved'] = sorted(resolved_revisions)
+
+    return stats
 
-def summary(project, pushlog_project, numdays, daysago):
+def summary(
+    project, pushlog_project, numdays, daysago, workers=None, rewalk=False
+    ):
     """
         This function retrieves the push log for a given branch and
     iterates over each push in ascending order implementing the following
@@ -172,94 +497,127 @@ def summary(project, pushlog_project, numdays, daysago):
         that do not have metric method summary data associated with them.
 
     3.) Run the metric method summary and store the results.
+
+        Summaries only read the metric values stored by run_metrics, the
+    walk is partitioned by branch.  With workers greater than one the
+    branches run in a process pool.
+
+        Like run_metrics only new pushes and dirty revisions are
+    processed unless rewalk is set, see get_branch_walks.
     """
-    mtm = MetricsTestModel(project)
     plm = PushLogModel(pushlog_project)
+    mtm = MetricsTestModel(project)
 
-    branches = plm.get_branch_list()
+    date_started = int(time.time())
+    date_expired = get_dirty_revision_expiration(numdays)
 
-    for b in branches:
+    walks = get_branch_walks(plm, mtm, 'summary', numdays, daysago, rewalk)
 
-        if b['name'] in SPECIAL_HANDLING_BRANCHES:
-            continue
+    plm.disconnect()
 
-        pushlog = plm.get_branch_pushlog(
-            b['id'], numdays, daysago
-            )
+    partitions = []
 
-        for node in pushlog:
+    #A revision pushed to several branches is summarized once
+    revisions = set()
+
+    for walk in walks:
 
+        pushlog = []
+        for node in walk['pushlog']:
             revision = mtm.truncate_revision(node['node'])
+            if revision in walk['revisions'] and revision not in revisions:
+                revisions.add(revision)
+                pushlog.append(node)
 
-            #Get the metric value data for this revision
-            metrics_data = mtm.get_metrics_data(revision)
+        partitions.append({ 'branch':walk['branch'], 'pushlog':pushlog })
 
-            #If there's no metric data a summary cannot be computed
-            if not metrics_data:
-                continue
+    mtm.disconnect()
 
-            #Filter out tests that have had their summary computed
-            store_list = get_test_keys_for_storage(mtm, metrics_data)
+    run_partitions(
+        _summary_partition, partitions, project, pushlog_project, workers
+        )
 
-            cached_parent_data = {}
+    _set_walks_complete(
+        project, 'summary', walks, date_started, None, date_expired
+        )
 
-            for test_key in store_list:
+def _summary_partition(partition):
+    """
+    Compute the metric summaries of the pushes in a branch pushlog, see
+    summary for the rule set.
+    """
+    mtm = get_partition_state()['mtm']
 
-                extend_ref_data(metrics_data, test_key, node)
+    for node in partition['pushlog']:
 
-                t_test_run_id = \
-                    metrics_data[test_key]['ref_data']['threshold_test_run_id']
+        revision = mtm.truncate_revision(node['node'])
 
-                test_id = metrics_data[test_key]['ref_data']['test_id']
+        #Get the metric value data for this revision
+        metrics_data = mtm.get_metrics_data(revision)
 
-                lookup_key = '{0}-{1}'.format(
-                    str(t_test_run_id), str(test_id)
-                    )
+        #If there's no metric data a summary cannot be computed
+        if not metrics_data:
+            continue
 
-                if lookup_key in cached_parent_data:
-                    parent_metrics_data = cached_parent_data[lookup_key]
-                else:
-                    parent_metrics_data = cached_parent_data.setdefault(
-                        lookup_key,
-                        mtm.get_metrics_data_from_ref_data(
-                            metrics_data[test_key]['ref_data'],
-                            t_test_run_id
-                            )
-                        )
+        #Filter out tests that have had their summary computed
+        store_list = get_test_keys_for_storage(mtm, metrics_data)
 
-                ############
-                # ASSUMPTION: All of the metric values for each
-                # page in the test are computed.  This is currently
-                # true due to the requirements of the incoming JSON data
-                # for a given test run.
-                ###########
-                results = mtm.run_metric_summary(
-                    metrics_data[test_key]['ref_data'],
-                    metrics_data[test_key]['values']
-                    )
+        cached_parent_data = {}
 
-                if test_key in parent_metrics_data:
+        for test_key in store_list:
 
-                    mtm.store_metric_summary_results(
-                        revision,
-                        metrics_data[test_key]['ref_data'],
-                        results,
-                        metrics_data[test_key]['values'],
-                        metrics_data[test_key]['ref_data']['threshold_test_run_id'],
-                        parent_metrics_data[test_key]['values']
-                        )
+            extend_ref_data(metrics_data, test_key, node)
 
-                else:
-                    mtm.store_metric_summary_results(
-                        revision,
+            t_test_run_id = \
+                metrics_data[test_key]['ref_data']['threshold_test_run_id']
+
+            test_id = metrics_data[test_key]['ref_data']['test_id']
+
+            lookup_key = '{0}-{1}'.format(
+                str(t_test_run_id), str(test_id)
+                )
+
+            if lookup_key in cached_parent_data:
+                parent_metrics_data = cached_parent_data[lookup_key]
+            else:
+                parent_metrics_data = cached_parent_data.setdefault(
+                    lookup_key,
+                    mtm.get_metrics_data_from_ref_data(
                         metrics_data[test_key]['ref_data'],
-                        results,
-                        metrics_data[test_key]['values'],
-                        metrics_data[test_key]['ref_data']['threshold_test_run_id']
+                        t_test_run_id
                         )
+                    )
 
-    plm.disconnect()
-    mtm.disconnect()
+            ############
+            # ASSUMPTION: All of the metric values for each
+            # page in the test are computed.  This is currently
+            # true due to the requirements of the incoming JSON data
+            # for a given test run.
+            ###########
+            results = mtm.run_metric_summary(
+                metrics_data[test_key]['ref_data'],
+                metrics_data[test_key]['values']
+                )
+
+            if test_key in parent_metrics_data:
+
+                mtm.store_metric_summary_results(
+                    revision,
+                    metrics_data[test_key]['ref_data'],
+                    results,
+                    metrics_data[test_key]['values'],
+                    metrics_data[test_key]['ref_data']['threshold_test_run_id'],
+                    parent_metrics_data[test_key]['values']
+                    )
+
+            else:
+                mtm.store_metric_summary_results(
+                    revision,
+                    metrics_data[test_key]['ref_data'],
+                    results,
+                    metrics_data[test_key]['values'],
+                    metrics_data[test_key]['ref_data']['threshold_test_run_id']
+                    )
 
 def get_test_keys_for_storage(mtm, metrics_data):
     """
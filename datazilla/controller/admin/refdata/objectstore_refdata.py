@@ -11,10 +11,13 @@ def get_error_count(project, startdate, enddate):
     return err_counts
 
 
-def get_error_list(project, startdate, enddate):
-    """Return a list of all objectstore entries with errors in a date range"""
+def get_error_list(project, startdate, enddate, stream=False):
+    """
+    Return a list of all objectstore entries with errors in a date range,
+    or a generator of batches of entries with ``stream``.
+    """
     ptm = PerformanceTestRefDataModel(project)
-    err_list = ptm.get_object_error_metadata(startdate, enddate)
+    err_list = ptm.get_object_error_metadata(startdate, enddate, stream)
     ptm.disconnect()
     return err_list
 
@@ -4,14 +4,20 @@ Functions for fetching test data from a project.
 """
 import json
 
-from datazilla.model import factory
+import numpy
+
+from datazilla.model import factory, MetricsTestModel
 from datazilla.model import utils
 
 def get_testdata(
     project, branch, revision, product_name=None, os_name=None,
     os_version=None, branch_version=None, processor=None,
-    build_type=None, test_name=None, page_name=None):
-    """Return test data based on the parameters and optional filters."""
+    build_type=None, test_name=None, page_name=None, stream=False):
+    """
+    Return test data based on the parameters and optional filters.  With
+    ``stream`` a generator of batches of test data is returned instead of
+    a list.
+    """
 
     ptm = factory.get_ptm(project)
     ptrdm = factory.get_ptrdm(project)
@@ -22,15 +28,36 @@ def get_testdata(
         branch_version, processor, build_type, test_name
         )
 
-    blobs = ptrdm.get_object_json_blob_for_test_run(test_run_ids)
-
-    filtered_blobs = []
-
     #Build a page lookup to filter by
     page_names = set()
     if page_name:
         map( lambda page:page_names.add(page.strip()), page_name.split(',') )
 
+    if stream:
+        batches = ptrdm.get_object_json_blob_for_test_run(
+            test_run_ids, stream=True)
+
+        ptm.disconnect()
+        ptrdm.disconnect()
+
+        return (
+            get_filtered_blobs(blobs, page_names) for blobs in batches
+            )
+
+    blobs = ptrdm.get_object_json_blob_for_test_run(test_run_ids)
+
+    ptm.disconnect()
+    ptrdm.disconnect()
+
+    return get_filtered_blobs(blobs, page_names)
+
+def get_filtered_blobs(blobs, page_names):
+    """
+    Return the test data of objectstore blobs, keeping only the results of
+    page_names if any.
+    """
+    filtered_blobs = []
+
     for blob in blobs:
         if blob["error_flag"] == "Y":
             filtered_blobs.append({"bad_test_data": {
@@ -50,9 +77,6 @@ def get_testdata(
 
             filtered_blobs.append( filtered_blob )
 
-    ptm.disconnect()
-    ptrdm.disconnect()
-
     return filtered_blobs
 
 
@@ -127,9 +151,14 @@ def get_metrics_pushlog(
     project, branch, revision, product_name=None, os_name=None,
     os_version=None, branch_version=None, processor=None, build_type=None,
     test_name=None, page_name=None, pushes_before=None, pushes_after=None,
-    pushlog_project=None
+    pushlog_project=None, max_points=None
     ):
-    """Return a metrics summary based on the parameters and optional filters."""
+    """
+    Return a metrics summary based on the parameters and optional filters.
+
+    max_points limits the number of pushes returned, see
+    get_downsampled_pushlog.
+    """
 
     plm = factory.get_plm(pushlog_project)
     ptm = factory.get_ptm(project)
@@ -139,6 +168,8 @@ def get_metrics_pushlog(
         revision, branch, pushes_before, pushes_after
         )
 
+    target_revision = mtm.truncate_revision(revision)
+
     pushlog_id_index_map = {}
     all_revisions = []
 
@@ -209,8 +240,57 @@ def get_metrics_pushlog(
     ptm.disconnect()
     mtm.disconnect()
 
+    if max_points:
+        aggregate_pushlog = get_downsampled_pushlog(
+            aggregate_pushlog, target_revision, max_points)
+
     return aggregate_pushlog
 
+def get_downsampled_pushlog(aggregate_pushlog, revision, max_points):
+    """
+    Return at most max_points pushes of a get_metrics_pushlog pushlog.
+
+    The pushes with metrics data are selected by
+    MetricsTestModel.get_lttb_indexes from the mean of the pages of all
+    their metrics data, the push of revision is always kept.  Pushes without metrics data have
+    nothing to plot and are left out.
+    """
+    if len(aggregate_pushlog) <= max_points:
+        return aggregate_pushlog
+
+    indexes = []
+    means = []
+    revision_index = None
+
+    for index, push in enumerate(aggregate_pushlog):
+
+        if revision in map(lambda r:r['revision'], push['revisions']):
+            revision_index = index
+
+        pages = []
+        for data in push['metrics_data']:
+            pages.extend(data['pages'].values())
+
+        if not pages:
+            continue
+
+        indexes.append(index)
+        means.append( sum(map(lambda p:p['mean'], pages)) / len(pages) )
+
+    selected = set( map(
+        lambda i:indexes[i],
+        MetricsTestModel.get_lttb_indexes(
+            numpy.array(indexes, dtype=float),
+            numpy.array(means, dtype=float),
+            max_points - 1 if revision_index is not None else max_points
+            )
+        ) )
+
+    if revision_index is not None:
+        selected.add(revision_index)
+
+    return map(lambda i:aggregate_pushlog[i], sorted(selected))
+
 def get_application_log(project, revision):
 
     mtm = factory.get_mtm(project)
@@ -248,22 +328,90 @@ def get_test_value_summary(
 
 def get_test_data_all_dimensions(
     project, product, branch, os, os_version, test, page,
-    start_time, stop_time):
-
+    start_time, stop_time, data_format=None, columns=None, rollup=None,
+    max_points=None, stream=False):
+    """
+    Return the test_data_all_dimensions rows, or their rollups, matching
+    the filters, see MetricsTestModel.get_data_all_dimensions.  With
+    a data_format of 'columnar' data['data'] holds the columns of the
+    rows instead, see MetricsTestModel.get_columnar_data.  Columns the
+    rows do not have are left out.
+
+    max_points limits the number of rows of every series, see
+    MetricsTestModel.get_downsampled_data.
+
+    The time range is aligned to the cache time buckets and results are
+    cached until the project loads new test data.  With ``stream`` the
+    cache is bypassed and data['data'] is a generator of row batches read
+    with a server side cursor, it cannot be combined with data_format or
+    max_points.
+    """
     mtm = factory.get_mtm(project)
-    data = mtm.get_data_all_dimensions(
-        product, branch, os, os_version, test, page, start_time,
-        stop_time
-        )
+
+    start_time, stop_time = mtm.get_all_dimensions_time_bucket(
+        start_time, stop_time)
+
+    if stream:
+        data = mtm.get_data_all_dimensions(
+            product, branch, os, os_version, test, page, start_time,
+            stop_time, rollup, stream=True
+            )
+        mtm.disconnect()
+
+        return data
+
+    fingerprint = [
+        product, branch, os, os_version, test, page, start_time, stop_time,
+        rollup
+        ]
+
+    cache_key = mtm.get_all_dimensions_cache_key('data', fingerprint)
+
+    data = mtm.get_cached_all_dimension_data(cache_key)
+
+    if data is None:
+        data = mtm.get_data_all_dimensions(
+            product, branch, os, os_version, test, page, start_time,
+            stop_time, rollup
+            )
+        mtm.cache_all_dimension_data(cache_key, data)
+
     mtm.disconnect()
 
+    if max_points:
+        data['data'] = mtm.get_downsampled_data(
+            data['data'], max_points, data.get('rollup'))
+
+    if data_format == 'columnar':
+
+        data_columns = mtm.get_all_dimension_columns(data.get('rollup'))
+        if columns:
+            data_columns = filter(lambda c: c in columns, data_columns)
+
+        data['format'] = data_format
+        data['data'] = mtm.get_columnar_data(data['data'], data_columns)
+
     return data
 
 def get_platforms_and_tests(project, product, branch, min_timestamp, max_timestamp):
 
     mtm = factory.get_mtm(project)
-    data = mtm.get_platforms_and_tests(
-        product, branch, min_timestamp, max_timestamp)
+
+    min_timestamp, max_timestamp = mtm.get_all_dimensions_time_bucket(
+        min_timestamp, max_timestamp)
+
+    fingerprint = [product, branch, min_timestamp, max_timestamp]
+
+    cache_key = mtm.get_all_dimensions_cache_key(
+        'platforms_and_tests', fingerprint)
+
+    data = mtm.get_cached_all_dimension_data(cache_key)
+
+    if data is None:
+        data = mtm.get_platforms_and_tests(
+            product, branch, min_timestamp, max_timestamp)
+        mtm.cache_all_dimension_data(cache_key, data)
+
     mtm.disconnect()
 
     return data
@@ -271,8 +419,15 @@ def get_platforms_and_tests(project, product, branch, min_timestamp, max_timesta
 def get_all_dimension_data_range(project):
 
     mtm = factory.get_mtm(project)
-    data = mtm.get_all_dimension_data_range(None, None)
+
+    cache_key = mtm.get_all_dimensions_cache_key('data_range', [])
+
+    data = mtm.get_cached_all_dimension_data(cache_key)
+
+    if data is None:
+        data = mtm.get_all_dimension_data_range(None, None)
+        mtm.cache_all_dimension_data(cache_key, data)
+
     mtm.disconnect()
 
     return data
-
@@ -11,12 +11,18 @@ access.
 import datetime
 import time
 import json
+import os
 import urllib
+import urlparse
+import httplib
 import socket
+import threading
+import Queue
+import uuid
 import zlib
 import MySQLdb
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from warnings import filterwarnings, resetwarnings
 
@@ -61,6 +67,28 @@ class PushLogModel(DatazillaModelBase):
     CONTENT_TYPES = ["hgmozilla"]
     DEFAULT_PROJECT = "pushlog"
 
+    # Number of characters of a changeset node stored in the indexed
+    # revision column, this must match MetricsTestModel.REVISION_CHAR_COUNT
+    REVISION_CHAR_COUNT = 12
+
+    # Number of changesets updated per statement when backfilling the
+    # revision column
+    REVISION_CHUNK_SIZE = 10000
+
+    # Number of revisions resolved per query by get_nodes_from_revisions
+    REVISION_LOOKUP_CHUNK_SIZE = 1000
+
+    # Maximum number of rows written by a single multi-row insert of
+    # pushes or changesets
+    INSERT_CHUNK_SIZE = 500
+
+    # Number of branches fetched from json-pushes at the same time by
+    # sync_pushlogs, each fetching thread keeps its own connection open
+    SYNC_WORKERS = 4
+
+    # Number of seconds before a json-pushes request is abandoned
+    FETCH_TIMEOUT = 120
+
     # The "project" defaults to "pushlog" but you can pass in any
     # project name you like.
 
@@ -260,7 +288,8 @@ class PushLogModel(DatazillaModelBase):
             proc=push_id_proc,
             debug_show=self.DEBUG,
             return_type='tuple',
-            placeholders=[revision, branch_name, branch_name]
+            placeholders=self._get_revision_placeholders(
+                revision, branch_name)
             )
 
         if not push_data:
@@ -439,6 +468,98 @@ class PushLogModel(DatazillaModelBase):
                     json_data,
                     ))
 
+        return self.get_summary()
+
+    def sync_pushlogs(
+        self, repo_host, numdays=None, hours=None, enddate=None, branch=None,
+        workers=None
+        ):
+        """
+        Store the pushes made since the last stored push of each branch.
+
+        Only pushes newer than the last stored push_id of a branch are
+        requested from json-pushes.  Branches without any stored pushes
+        are started from the ``numdays`` or ``hours`` window, and skipped
+        if neither is given.  Up to ``workers`` branches are fetched at the
+        same time.
+
+        ``repo_host`` may include a scheme, e.g. http://localhost:8000,
+        https is used when it doesn't.
+        """
+
+        branch_list = self.get_branch_list(branch) or []
+
+        last_push_ids = self.get_last_push_ids()
+
+        window = {}
+        if numdays:
+            window = self.get_params(numdays, enddate)
+        if hours:
+            window = {
+                "full": 1,
+                "maxhours": hours,
+                }
+
+        requests = []
+        branch_ids = set()
+
+        for br in branch_list:
+
+            if br["id"] in branch_ids:
+                continue
+            branch_ids.add(br["id"])
+
+            if br["id"] in last_push_ids:
+                params = {
+                    "full": 1,
+                    "startID": last_push_ids[ br["id"] ],
+                    }
+            elif window:
+                params = window
+            else:
+                self.println("--Skip branch {0}: no stored pushes, use "
+                             "numdays or hours to start it".format(br["name"]))
+                continue
+
+            path = "/{0}/json-pushes?{1}".format(
+                br["uri"], urllib.urlencode(params))
+
+            requests.append( (br, path) )
+
+        for br, json_data, error in self._fetch_json_pushes(
+            repo_host, requests, workers or self.SYNC_WORKERS):
+
+            if error:
+                self.println("--Skip branch {0}: {1}".format(br["name"], error))
+                continue
+
+            try:
+                pushlog_dict = json.loads(json_data)
+            except ValueError:
+                self.println("--Skip branch {0}: push data not valid JSON: {1}".format(
+                    br["name"],
+                    json_data,
+                    ))
+                continue
+
+            self._insert_branch_pushlogs(br["id"], pushlog_dict)
+            self.branch_count += 1
+
+        return self.get_summary()
+
+    def get_last_push_ids(self):
+        """Return a dict of branch ids to their last stored push_id."""
+
+        data = self.hg_ds.dhub.execute(
+            proc='hgmozilla.selects.get_last_push_ids',
+            debug_show=self.DEBUG,
+            return_type='tuple',
+            )
+
+        return dict( (row['branch_id'], row['push_id']) for row in data )
+
+    def get_summary(self):
+        """Return the counts of the pushes stored or skipped so far."""
         return {
             "branches": self.branch_count,
             "pushlogs_stored": self.pushlog_count,
@@ -447,6 +568,72 @@ class PushLogModel(DatazillaModelBase):
             "changesets_skipped": self.changeset_skipped_count,
         }
 
+    def _fetch_json_pushes(self, repo_host, requests, workers):
+        """
+        Fetch the (branch, path) ``requests`` from ``repo_host``.
+
+        Up to ``workers`` threads share the requests, each over a single
+        persistent connection.  Yields (branch, json_data, error) as the
+        responses arrive, so the caller can store one branch while the
+        others are still downloading.
+        """
+        if not requests:
+            return
+
+        if "://" not in repo_host:
+            repo_host = "https://" + repo_host
+        url = urlparse.urlparse(repo_host)
+
+        connection_class = httplib.HTTPSConnection
+        if url.scheme == "http":
+            connection_class = httplib.HTTPConnection
+
+        request_queue = Queue.Queue()
+        for request in requests:
+            request_queue.put(request)
+
+        result_queue = Queue.Queue()
+
+        def fetch():
+            conn = connection_class(url.netloc, timeout=self.FETCH_TIMEOUT)
+            try:
+                while True:
+                    try:
+                        br, path = request_queue.get_nowait()
+                    except Queue.Empty:
+                        return
+
+                    try:
+                        conn.request("GET", url.path.rstrip("/") + path)
+                        res = conn.getresponse()
+                        json_data = res.read()
+
+                        if res.status != httplib.OK:
+                            result_queue.put( (br, None, "HTTP {0} {1}".format(
+                                res.status, res.reason)) )
+                        else:
+                            result_queue.put( (br, json_data, None) )
+
+                    except Exception as e:
+                        # the connection is reopened by the next request
+                        conn.close()
+                        result_queue.put( (br, None, repr(e)) )
+            finally:
+                conn.close()
+
+        threads = []
+        for i in range( min(workers, len(requests)) ):
+            thread = threading.Thread(target=fetch)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        for i in range(len(requests)):
+            yield result_queue.get()
+
+        for thread in threads:
+            thread.join()
+
     def get_node_from_revision(self, revision, branch):
 
         proc = 'hgmozilla.selects.get_node_from_revision'
@@ -455,7 +642,7 @@ class PushLogModel(DatazillaModelBase):
             proc=proc,
             debug_show=self.DEBUG,
             return_type='tuple',
-            placeholders=[revision, branch, branch]
+            placeholders=self._get_revision_placeholders(revision, branch)
             )
 
         node = {}
@@ -464,66 +651,202 @@ class PushLogModel(DatazillaModelBase):
 
         return node
 
-    def _insert_branch_pushlogs(self, branch_id, pushlog_dict):
-        """Loop through all the pushlogs and insert them."""
-        for pushlog_json_id, pushlog in pushlog_dict.items():
-            # make sure the pushlog_id isn't confused with a previous iteration
-            self.println("    Pushlog {0}".format(pushlog_json_id), 1)
-
-            placeholders = [
-                pushlog_json_id,
-                pushlog["date"],
-                pushlog["user"],
-                branch_id,
-                ]
-            try:
-                pushlog_id = self._insert_data_and_get_id(
-                    "set_pushlog",
-                    placeholders=placeholders,
+    def get_nodes_from_revisions(self, revision_branches):
+        """
+        Resolve a list of (revision, branch) pairs to their push data.
+
+        Returns a dict keyed by the (revision, branch) pairs found, the
+        values match the return value of get_node_from_revision.  The
+        revisions are looked up REVISION_LOOKUP_CHUNK_SIZE at a time.
+
+        Revisions and branches are compared case insensitively, like the
+        collation of the pushlog tables does in get_node_from_revision.
+        """
+        revision_branches = list(set(revision_branches))
+
+        #Map revision prefixes to the pairs they can resolve
+        prefix_lookup = defaultdict(list)
+        for revision, branch in revision_branches:
+            if revision:
+                prefix_lookup[
+                    revision[0:self.REVISION_CHAR_COUNT].lower()
+                    ].append( (revision, branch) )
+
+        prefixes = prefix_lookup.keys()
+        nodes = {}
+
+        proc = 'hgmozilla.selects.get_nodes_from_revisions'
+
+        for i in range(0, len(prefixes), self.REVISION_LOOKUP_CHUNK_SIZE):
+
+            chunk = prefixes[i:i + self.REVISION_LOOKUP_CHUNK_SIZE]
+
+            where_in_clause = ','.join( map( lambda v:'%s', chunk ) )
+
+            data = self.hg_ds.dhub.execute(
+                proc=proc,
+                debug_show=self.DEBUG,
+                return_type='tuple',
+                placeholders=chunk,
+                replace=[where_in_clause]
+                )
+
+            for row in data:
+                revision_prefix = row.pop('revision').lower()
+
+                node = row['node'].lower()
+                branch_names = set(
+                    [ name.lower() for name in (row['name'], row['alt_name'])
+                      if name ]
                     )
 
-                # process the nodes of the pushlog
-                self._insert_pushlog_changesets(pushlog_id, pushlog["changesets"])
-                self.pushlog_count += 1
+                for revision, branch in prefix_lookup[revision_prefix]:
+
+                    if (revision, branch) in nodes:
+                        continue
+
+                    if node.startswith(revision.lower()) and \
+                        branch and branch.lower() in branch_names:
+                            nodes[ (revision, branch) ] = row
+
+        return nodes
 
-            except MySQLdb.IntegrityError as e:
-                self.println(e)
-                self.println("--Skip dup- pushlog: {0}".format(
-                    pushlog_json_id,
-                ), 1)
+    def _get_revision_placeholders(self, revision, branch):
+        """
+        Placeholders for the revision lookups.
+
+        The indexed revision prefix narrows the changesets down, the node
+        comparison keeps revisions longer than the prefix exact.
+        """
+        return [
+            revision[0:self.REVISION_CHAR_COUNT] + '%',
+            revision + '%',
+            branch,
+            branch,
+            ]
+
+    def set_changeset_revisions(self, chunk_size=None):
+        """
+        Fill the revision column of up to ``chunk_size`` changesets stored
+        before the column existed, return the number of changesets updated.
+        """
+        self.hg_ds.dhub.execute(
+            proc='hgmozilla.updates.set_revisions',
+            debug_show=self.DEBUG,
+            placeholders=[
+                self.REVISION_CHAR_COUNT,
+                chunk_size or self.REVISION_CHUNK_SIZE
+                ],
+            )
+
+        return self.hg_ds.dhub.connection['master_host']['cursor'].rowcount
+
+    def _insert_branch_pushlogs(self, branch_id, pushlog_dict):
+        """
+        Insert the pushes of a branch along with their changesets.
+
+        Pushes that are already stored are skipped, and so are all of
+        their changesets.  The inserts skip rows already stored, a duplicate
+        key leaves the stored row unchanged, so concurrent updates of the
+        same branch are safe.  Other insert errors are still raised.
+        """
+        pushes = sorted(
+            [ (int(push_id), pushlog_dict[push_id]) for push_id in pushlog_dict ]
+            )
+
+        if not pushes:
+            return
+
+        stored_push_ids = self._get_pushlog_ids(
+            branch_id, [ push_id for push_id, pushlog in pushes ]
+            )
+
+        new_pushes = []
+        for push_id, pushlog in pushes:
+            if push_id in stored_push_ids:
+                self.println("--Skip dup- pushlog: {0}".format(push_id), 1)
                 self.pushlog_skipped_count += 1
                 # if a pushlog is skipped, then all its changesets are
                 # also skipped as a result.
                 self.changeset_skipped_count += len(pushlog["changesets"])
+            else:
+                self.println("    Pushlog {0}".format(push_id), 1)
+                new_pushes.append( (push_id, pushlog) )
 
+        if not new_pushes:
+            return
 
-    def _insert_pushlog_changesets(self, pushlog_id, changeset_list):
-        """Loop through all the changesets in a pushlog, and insert them."""
-
-        for cs in changeset_list:
-            self.println("        Changeset {0}".format(cs["node"]), 2)
-            placeholders = [
-                cs["node"],
-                cs["author"],
-                cs["branch"],
-                cs["desc"],
-                pushlog_id,
-                ]
+        inserted = self._insert_rows(
+            "set_pushlog",
+            [ [ push_id, pushlog["date"], pushlog["user"], branch_id ]
+              for push_id, pushlog in new_pushes ]
+            )
+        self.pushlog_count += inserted
+        self.pushlog_skipped_count += len(new_pushes) - inserted
 
-            try:
-                self._insert_data_and_get_id(
-                    "set_node",
-                    placeholders=placeholders,
-                    )
-                self.changeset_count += 1
+        pushlog_ids = self._get_pushlog_ids(
+            branch_id, [ push_id for push_id, pushlog in new_pushes ]
+            )
 
-            except MySQLdb.IntegrityError:
-                self.println("--Skip changeset dup- pushlog: {0}, node: {1}".format(
-                    pushlog_id,
+        placeholders = []
+        for push_id, pushlog in new_pushes:
+            for cs in pushlog["changesets"]:
+                self.println("        Changeset {0}".format(cs["node"]), 2)
+                placeholders.append([
                     cs["node"],
-                    ))
-                self.changeset_skipped_count += 1
+                    cs["node"][0:self.REVISION_CHAR_COUNT],
+                    cs["author"],
+                    cs["branch"],
+                    cs["desc"],
+                    pushlog_ids[push_id],
+                    ])
 
+        inserted = self._insert_rows("set_node", placeholders)
+        self.changeset_count += inserted
+        self.changeset_skipped_count += len(placeholders) - inserted
+
+
+    def _get_pushlog_ids(self, branch_id, push_ids):
+        """Return a dict of the stored ``push_ids`` to their pushlog ids."""
+        pushlog_ids = {}
+
+        for i in range(0, len(push_ids), self.INSERT_CHUNK_SIZE):
+
+            chunk = push_ids[i:i + self.INSERT_CHUNK_SIZE]
+
+            where_in_clause = ','.join( map( lambda v:'%s', chunk ) )
+
+            data = self.hg_ds.dhub.execute(
+                proc='hgmozilla.selects.get_pushlog_ids',
+                debug_show=self.DEBUG,
+                return_type='tuple',
+                placeholders=[branch_id] + chunk,
+                replace=[where_in_clause],
+                )
+
+            for row in data:
+                pushlog_ids[ int(row['push_id']) ] = row['id']
+
+        return pushlog_ids
+
+
+    def _insert_rows(self, statement, placeholders):
+        """
+        Insert ``placeholders`` with multi-row inserts of up to
+        INSERT_CHUNK_SIZE rows, return the number of rows inserted.  Rows
+        left unchanged by ON DUPLICATE KEY UPDATE are not counted.
+        """
+        inserted = 0
+
+        for i in range(0, len(placeholders), self.INSERT_CHUNK_SIZE):
+            self._insert_data(
+                statement,
+                placeholders[i:i + self.INSERT_CHUNK_SIZE],
+                executemany=True,
+                )
+            inserted += self.hg_ds.dhub.connection['master_host']['cursor'].rowcount
+
+        return inserted
 
 
     def _insert_data(self, statement, placeholders, executemany=False):
@@ -537,19 +860,6 @@ class PushLogModel(DatazillaModelBase):
             )
 
 
-    def _insert_data_and_get_id(self, statement, placeholders):
-
-        self._insert_data(statement, placeholders)
-
-        id_iter = self.hg_ds.dhub.execute(
-            proc='hgmozilla.selects.get_last_insert_id',
-            debug_show=settings.DEBUG,
-            return_type='iter',
-            )
-
-        return id_iter.get_column_data('id')
-
-
     def println(self, val, level=0):
         """Write to out (possibly stdout) if verbosity meets the level."""
         if settings.DEBUG and self.out and self.verbosity >= level:
@@ -566,6 +876,33 @@ class PerformanceTestModel(DatazillaModelBase):
     # single test suite associated with a JSON object
     REPLICATE_LIMIT = 5000
 
+    # Maximum number of rows written by a single multi-row insert when
+    # loading a batch of JSON objects
+    INSERT_CHUNK_SIZE = 5000
+
+    # Number of seconds a worker's claim on objectstore rows lasts before
+    # the rows can be reclaimed by another worker, the lease is renewed
+    # before writing the test runs of claimed rows
+    LEASE_DURATION = 600
+
+    # TODO: Need to get the build type into the json
+    BUILD_TYPE = 'opt'
+
+    def __init__(self, project):
+        super(PerformanceTestModel, self).__init__(project)
+
+        # identifies the objectstore rows claimed by this worker
+        self.worker_token = "{0}:{1}:{2}".format(
+            socket.gethostname()[:64], os.getpid(), uuid.uuid4().hex[:12])
+
+        # test runs written by the last batch load, see get_loaded_test_runs
+        self.loaded_test_runs = {}
+
+        # claimed rows whose lease expired and was taken by another worker
+        # before they were loaded or marked complete, see process_objects
+        self.lost_lease_count = 0
+
+
     @classmethod
     def create(cls, project, hosts=None, types=None, cron_batch=None):
         """
@@ -630,6 +967,17 @@ class PerformanceTestModel(DatazillaModelBase):
         return secret
 
 
+    @property
+    def ref_data_cache(self):
+        """The process-lifetime reference data id cache for this project."""
+        return RefDataCache.get_cache(self.project)
+
+
+    def get_ref_data_cache_stats(self):
+        """Return hit/miss counters for the reference data id cache."""
+        return self.ref_data_cache.get_stats()
+
+
     def get_product_test_os_map(self):
 
         proc = 'perftest.selects.get_product_test_os_map'
@@ -1119,6 +1467,13 @@ class PerformanceTestModel(DatazillaModelBase):
             placeholders=placeholders)
 
 
+    @property
+    def compress_objectstore(self):
+        """True if this project stores its objectstore blobs compressed."""
+        return self.project in getattr(
+            settings, "DATAZILLA_COMPRESSED_OBJECTSTORE_PROJECTS", [])
+
+
     def store_test_data(self, json_data, error=None):
         """Write the JSON to the objectstore to be queued for processing."""
 
@@ -1126,14 +1481,97 @@ class PerformanceTestModel(DatazillaModelBase):
         error_flag = "N" if error is None else "Y"
         error_msg = error or ""
 
+        compressed_flag = "N"
+        if self.compress_objectstore:
+            json_data = utils.compress_json_blob(json_data)
+            compressed_flag = "Y"
+
         self.sources["objectstore"].dhub.execute(
             proc='objectstore.inserts.store_json',
-            placeholders=[ date_loaded, json_data, error_flag, error_msg ],
+            placeholders=[
+                date_loaded, json_data, compressed_flag, error_flag, error_msg
+                ],
             debug_show=self.DEBUG
             )
 
         return self._get_last_insert_id(source='objectstore')
 
+
+    def store_test_data_batch(self, blobs):
+        """
+        Write several JSON blobs to the objectstore with one multi-row insert.
+
+        ``blobs`` is a list of (json_data, error) tuples, where error is None
+        for well-formed blobs.  Returns the objectstore ids of the stored
+        blobs in the same order.  Like ``load_test_data_batch``, this relies
+        on consecutive auto-increment ids for a multi-row insert.
+
+        """
+        if not blobs:
+            return []
+
+        date_loaded = utils.get_now_timestamp()
+
+        placeholders = []
+        for json_data, error in blobs:
+
+            compressed_flag = "N"
+            if self.compress_objectstore:
+                json_data = utils.compress_json_blob(json_data)
+                compressed_flag = "Y"
+
+            placeholders.append([
+                date_loaded,
+                json_data,
+                compressed_flag,
+                "N" if error is None else "Y",
+                error or "",
+                ])
+
+        self.sources["objectstore"].dhub.execute(
+            proc='objectstore.inserts.store_json',
+            placeholders=placeholders,
+            executemany=True,
+            debug_show=self.DEBUG
+            )
+
+        first_id = self._get_last_insert_id(source='objectstore')
+
+        return range(first_id, first_id + len(blobs))
+
+
+    def compress_objectstore_blobs(self, last_id=0, chunk_size=500):
+        """
+        Compress a chunk of uncompressed objectstore blobs.
+
+        Rewrites up to ``chunk_size`` rows with an id greater than
+        ``last_id``.  Returns the number of rows compressed and the id of the
+        last row examined, which should be passed back in as ``last_id`` to
+        compress the next chunk.
+
+        """
+        rows = self.sources["objectstore"].dhub.execute(
+            proc="objectstore.selects.get_uncompressed",
+            placeholders=[ last_id, chunk_size ],
+            debug_show=self.DEBUG,
+            return_type='tuple',
+            )
+
+        if not rows:
+            return 0, last_id
+
+        self.sources["objectstore"].dhub.execute(
+            proc="objectstore.updates.set_compressed_blob",
+            placeholders=[
+                (utils.compress_json_blob(row['json_blob']), row['id'])
+                for row in rows
+                ],
+            executemany=True,
+            debug_show=self.DEBUG,
+            )
+
+        return len(rows), rows[-1]['id']
+
     def pre_process_data(self, unquoted_json_data, deserialized_json):
         """Carry out project specific pre-processing of JSON objects."""
 
@@ -1177,7 +1615,7 @@ class PerformanceTestModel(DatazillaModelBase):
             return_type='tuple'
             )
 
-        return json_blobs
+        return utils.decompress_json_blobs(json_blobs)
 
     def load_test_data(self, data):
         """Load TestData instance into perftest db, return test_run_id."""
@@ -1212,39 +1650,148 @@ class PerformanceTestModel(DatazillaModelBase):
         return test_run_id
 
 
-    def process_objects(self, loadlimit):
-        """Processes JSON blobs from the objectstore into perftest schema."""
-        rows = self.claim_objects(loadlimit)
-        test_run_ids_loaded = []
+    def load_test_data_batch(self, rows):
+        """
+        Load a batch of claimed objectstore rows, return the test_run_ids.
+
+        Every blob is parsed and has its reference ids resolved first.  The
+        test_run, test_value, test_option_values and test_aux_data rows of
+        the whole batch are then written with one multi-row insert per table
+        (split into chunks of ``INSERT_CHUNK_SIZE`` rows) in a single
+        transaction.  Blobs that fail to parse or validate are marked as
+        errors without affecting the rest of the batch, as are blobs whose
+        project specific data fails to load after the insert.  If a batch
+        insert fails, it is rolled back and the remaining blobs are loaded
+        one at a time so the offending blob can be isolated.
+
+        """
+        prepared_rows = []
+        prepared_data = []
 
         for row in rows:
             row_id = int(row['id'])
             try:
                 data = TestData.from_json(row['json_blob'])
-                test_run_id = self.load_test_data(data)
+                prepared = self._prepare_test_data(data)
             except TestDataError as e:
                 self.mark_object_error(row_id, str(e))
             except Exception as e:
-                self.mark_object_error(
-                    row_id,
-                    u"Unknown error: {0}: {1}".format(
-                        e.__class__.__name__, unicode(e))
-                    )
+                self.mark_object_error(row_id, self._get_unknown_error_msg(e))
             else:
-                self.mark_object_complete(row_id, test_run_id)
-                test_run_ids_loaded.append(test_run_id)
+                prepared_rows.append(row)
+                prepared_data.append(prepared)
 
-        return test_run_ids_loaded
+        if not prepared_data:
+            return []
+
+        # Rows reclaimed by another worker while the batch was prepared are
+        # left to that worker, so they are not loaded twice
+        held_ids = self.renew_claimed_objects()
+
+        held = filter(
+            lambda p: int(p[0]['id']) in held_ids,
+            zip(prepared_rows, prepared_data)
+            )
+
+        self.lost_lease_count += len(prepared_rows) - len(held)
+
+        if not held:
+            return []
+
+        prepared_rows, prepared_data = map(list, zip(*held))
+
+        try:
+            test_run_ids = self._insert_prepared_test_data(prepared_data)
+        except Exception:
+            self.sources["perftest"].dhub.rollback('master_host')
+            return self._load_objects(prepared_rows)
+
+        completed = []
+
+        for row, prepared, test_run_id in zip(
+            prepared_rows, prepared_data, test_run_ids):
+
+            row_id = int(row['id'])
+            try:
+                self._adapt_project_specific_data(
+                    prepared['data'], test_run_id, prepared['machine_id'])
+            except TestDataError as e:
+                self.mark_object_error(row_id, str(e))
+            except Exception as e:
+                self.mark_object_error(row_id, self._get_unknown_error_msg(e))
+            else:
+                self._set_loaded_test_run(test_run_id, prepared)
+                completed.append( (test_run_id, row_id) )
+
+        if completed:
+            # Completing a row reclaimed by another worker matches nothing,
+            # the rows still held are checked first to report the loss
+            held_ids = self.renew_claimed_objects()
+
+            self.lost_lease_count += len(
+                filter(lambda c: c[1] not in held_ids, completed))
+
+            self.mark_objects_complete(completed)
+
+        return map(lambda c: c[0], completed)
+
+
+    def process_objects(self, loadlimit):
+        """
+        Processes JSON blobs from the objectstore into perftest schema.
+
+        ``lost_lease_count`` holds the number of claimed blobs this worker
+        lost to another worker because their lease expired, those blobs
+        are loaded by the other worker.
+        """
+        rows = self.claim_objects(loadlimit)
+
+        self.loaded_test_runs = {}
+        self.lost_lease_count = 0
+
+        return self.load_test_data_batch(rows)
+
+
+    def get_loaded_test_runs(self):
+        """
+        Return the test runs written by batch loads since the last
+        process_objects call, keyed by test_run_id.
+
+        Each test run holds the reference data of a
+        test_data_all_dimensions row and the replicates written to
+        test_value, so the all dimensions data can be computed without
+        reading test_value back:
+
+            test_run_id: {
+                test_run_id, product_id, operating_system_id, test_id,
+                date_run, revision, product_name, product_branch,
+                product_version, operating_system_name,
+                operating_system_version, processor, build_type,
+                machine_name, test_name,
+                pages: { page_id: page url, ... },
+                replicates: { page_id: [ (run_id, value), ... ], ... }
+            }
+
+        Test runs loaded one at a time, after a failed batch insert, are
+        not included.
 
-    def claim_objects(self, limit):
+        """
+        return self.loaded_test_runs
+
+    def claim_objects(self, limit, lease_duration=None):
         """
         Claim & return up to ``limit`` unprocessed blobs from the objectstore.
 
         Returns a tuple of dictionaries with "json_blob" and "id" keys.
 
-        May return more than ``limit`` rows if there are existing orphaned rows
-        that were claimed by an earlier connection with the same connection ID
-        but never completed.
+        Rows are claimed with this model's ``worker_token`` and a lease of
+        ``lease_duration`` seconds (defaults to ``LEASE_DURATION``).  Rows
+        whose lease has expired without being completed are claimed again
+        as if they were unprocessed, so any number of workers can consume
+        the objectstore of a project concurrently.
+
+        May return more than ``limit`` rows if this worker still holds rows
+        from an earlier claim that were never completed.
 
         """
         proc_mark = 'objectstore.updates.mark_loading'
@@ -1276,32 +1823,118 @@ class PerformanceTestModel(DatazillaModelBase):
         filterwarnings('ignore', category=MySQLdb.Warning)
 
         # Note: this claims rows for processing. Failure to call load_test_data
-        # on this data will result in some json blobs being stuck in limbo
-        # until another worker comes along with the same connection ID.
+        # on this data will leave the json blobs in limbo until their lease
+        # expires and another worker reclaims them.
         self.sources["objectstore"].dhub.execute(
             proc=proc_mark,
-            placeholders=[ limit ],
+            placeholders=[
+                self.worker_token,
+                lease_duration or self.LEASE_DURATION,
+                limit
+                ],
             debug_show=self.DEBUG,
             )
 
-        # Return all JSON blobs claimed by this connection ID (could possibly
-        # include orphaned rows from a previous run).
+        # Return all JSON blobs claimed by this worker (could possibly
+        # include rows left over from an earlier claim).
         json_blobs = self.sources["objectstore"].dhub.execute(
             proc=proc_get,
+            placeholders=[ self.worker_token ],
             debug_show=self.DEBUG,
             return_type='tuple'
             )
 
         resetwarnings()
 
-        return json_blobs
+        return utils.decompress_json_blobs(json_blobs)
+
+
+    def get_objectstore_backlog(self):
+        """Return the number of unprocessed blobs waiting in the objectstore."""
+        return self.sources["objectstore"].dhub.execute(
+            proc="objectstore.selects.get_ready_count",
+            debug_show=self.DEBUG,
+            return_type='iter',
+            ).get_column_data('ready_count')
+
+
+    def renew_claimed_objects(self, lease_duration=None):
+        """
+        Renew the lease of every blob claimed by this worker.
+
+        Returns the set of ids of the blobs still claimed, blobs whose
+        lease expired and were reclaimed by another worker are missing.
+
+        """
+        objectstore = self.sources["objectstore"]
+
+        objectstore.dhub.execute(
+            proc="objectstore.updates.renew_lease",
+            placeholders=[
+                lease_duration or self.LEASE_DURATION,
+                self.worker_token
+                ],
+            debug_show=self.DEBUG,
+            )
+
+        return objectstore.dhub.execute(
+            proc="objectstore.selects.get_claimed_ids",
+            placeholders=[ self.worker_token ],
+            debug_show=self.DEBUG,
+            return_type='set',
+            key_column='id',
+            )
+
+
+    def release_claimed_objects(self):
+        """
+        Return all blobs still claimed by this worker to the objectstore.
+
+        Used on shutdown so that claimed but unprocessed blobs are picked up
+        by the next worker.  Returns the number of blobs released.
+
+        """
+        objectstore = self.sources["objectstore"]
+
+        objectstore.dhub.execute(
+            proc="objectstore.updates.release_claimed",
+            placeholders=[ self.worker_token ],
+            debug_show=self.DEBUG,
+            )
+
+        return objectstore.dhub.connection['master_host']['cursor'].rowcount
 
 
     def mark_object_complete(self, object_id, test_run_id):
-        """ Call to database to mark the task completed """
+        """
+        Call to database to mark the task completed.  Returns 0 if the
+        object is no longer claimed by this worker.
+        """
+        objectstore = self.sources["objectstore"]
+
+        objectstore.dhub.execute(
+            proc="objectstore.updates.mark_complete",
+            placeholders=[test_run_id, object_id, self.worker_token],
+            debug_show=self.DEBUG
+            )
+
+        return objectstore.dhub.connection['master_host']['cursor'].rowcount
+
+
+    def mark_objects_complete(self, completed):
+        """
+        Mark several claimed objects completed in one call.
+
+        ``completed`` is a list of (test_run_id, object_id) tuples.
+
+        """
         self.sources["objectstore"].dhub.execute(
             proc="objectstore.updates.mark_complete",
-            placeholders=[test_run_id, object_id],
+            placeholders=[
+                (test_run_id, object_id, self.worker_token)
+                for test_run_id, object_id in completed
+                ],
+            executemany=True,
             debug_show=self.DEBUG
             )
 
@@ -1310,7 +1943,7 @@ class PerformanceTestModel(DatazillaModelBase):
         """ Call to database to mark the task completed """
         self.sources["objectstore"].dhub.execute(
             proc="objectstore.updates.mark_error",
-            placeholders=[error, object_id],
+            placeholders=[error, object_id, self.worker_token],
             debug_show=self.DEBUG
             )
 
@@ -1518,12 +2151,162 @@ class PerformanceTestModel(DatazillaModelBase):
             self._update_b2g_machine_type(data, machine_id)
 
 
-    def _set_test_aux_data(self, data, test_id, test_run_id):
-        """Insert test aux data to db for given test_id and test_run_id."""
+    def _load_objects(self, rows):
+        """Load claimed objectstore rows one at a time."""
+        test_run_ids_loaded = []
+
+        for row in rows:
+            row_id = int(row['id'])
+
+            if row_id not in self.renew_claimed_objects():
+                self.lost_lease_count += 1
+                continue
+
+            try:
+                data = TestData.from_json(row['json_blob'])
+                test_run_id = self.load_test_data(data)
+            except TestDataError as e:
+                self.mark_object_error(row_id, str(e))
+            except Exception as e:
+                self.mark_object_error(row_id, self._get_unknown_error_msg(e))
+            else:
+                if not self.mark_object_complete(row_id, test_run_id):
+                    self.lost_lease_count += 1
+                test_run_ids_loaded.append(test_run_id)
+
+        return test_run_ids_loaded
+
+
+    def _get_unknown_error_msg(self, e):
+        return u"Unknown error: {0}: {1}".format(
+            e.__class__.__name__, unicode(e))
+
+
+    def _prepare_test_data(self, data):
+        """
+        Resolve the reference ids of a TestData instance for a batch load.
+
+        Returns a dictionary holding the test_run placeholders and the
+        test value, option and aux rows of the blob, all still missing
+        their leading test_run_id.  Raises ``TestDataError`` on bad data.
+
+        """
+        self._adapt_production_data(data)
+
+        test_id = self._get_or_create_test_id(data)
+        os_id = self._get_or_create_os_id(data)
+        product_id = self._get_or_create_product_id(data)
+        machine_id = self._get_or_create_machine_id(data, os_id)
+        build_id = self._get_or_create_build_id(data, product_id)
+
+        return {
+            'data': data,
+            'test_id': test_id,
+            'os_id': os_id,
+            'product_id': product_id,
+            'machine_id': machine_id,
+            'pages': dict(
+                (self._get_or_create_page_id(page, test_id), page)
+                for page in data['results']
+                ),
+            'test_run': self._get_test_run_placeholders(
+                data, test_id, build_id, machine_id),
+            'options': self._get_option_rows(data),
+            'test_values': self._get_test_value_rows(data, test_id),
+            'aux_values': self._get_aux_value_rows(data, test_id),
+            }
+
+
+    def _insert_prepared_test_data(self, prepared_data):
+        """
+        Write a batch of prepared test data, return the new test_run_ids.
+
+        The test_run rows are written with a single multi-row insert and
+        their ids derived from LAST_INSERT_ID(), which relies on InnoDB
+        handing out consecutive auto-increment values to a multi-row insert
+        (innodb_autoinc_lock_mode of 0 or 1).  Nothing is committed until
+        every table has been written.
+
+        """
+        dhub = self.sources["perftest"].dhub
+
+        self._insert_data(
+            'set_test_run_data',
+            [ prepared['test_run'] for prepared in prepared_data ],
+            executemany=True,
+            nocommit=True,
+            )
+
+        first_id = dhub.execute(
+            proc='generic.selects.get_last_insert_id',
+            debug_show=self.DEBUG,
+            nocommit=True,
+            return_type='iter',
+            ).get_column_data('id')
+
+        test_run_ids = range(first_id, first_id + len(prepared_data))
+
+        for statement, key in [ ('set_test_option_values', 'options'),
+                                ('set_test_values', 'test_values'),
+                                ('set_aux_values', 'aux_values') ]:
+
+            placeholders = []
+            for prepared, test_run_id in zip(prepared_data, test_run_ids):
+                placeholders.extend(
+                    [ (test_run_id,) + row for row in prepared[key] ]
+                    )
+
+            for i in range(0, len(placeholders), self.INSERT_CHUNK_SIZE):
+                self._insert_data(
+                    statement,
+                    placeholders[i:i + self.INSERT_CHUNK_SIZE],
+                    executemany=True,
+                    nocommit=True,
+                    )
+
+        dhub.commit('master_host')
+
+        return test_run_ids
+
+
+    def _set_loaded_test_run(self, test_run_id, prepared):
+        """Add a batch loaded test run to ``loaded_test_runs``."""
+        data = prepared['data']
+
+        build = data['test_build']
+        machine = data['test_machine']
+
+        replicates = {}
+        for run_id, page_id, value_id, value in prepared['test_values']:
+            replicates.setdefault(page_id, []).append( (run_id, value) )
+
+        self.loaded_test_runs[test_run_id] = {
+            'test_run_id': test_run_id,
+            'product_id': prepared['product_id'],
+            'operating_system_id': prepared['os_id'],
+            'test_id': prepared['test_id'],
+            'date_run': prepared['test_run'][4],
+            'revision': build['revision'],
+            'product_name': build['name'],
+            'product_branch': build['branch'],
+            'product_version': build['version'],
+            'operating_system_name': machine['os'],
+            'operating_system_version': machine['osversion'],
+            'processor': machine['platform'],
+            'build_type': self.BUILD_TYPE,
+            'machine_name': machine['name'],
+            'test_name': data['testrun']['suite'],
+            'pages': prepared['pages'],
+            'replicates': replicates,
+            }
+
+
+    def _get_aux_value_rows(self, data, test_id):
+        """Return (run_id, aux_data_id, numeric, string) rows for TestData."""
+        rows = []
         for aux_data, aux_values in data.get('results_aux', {}).items():
             aux_data_id = self._get_or_create_aux_id(aux_data, test_id)
 
-            placeholders = []
             for index, value in enumerate(aux_values, 1):
 
                 string_data = ""
@@ -1533,58 +2316,67 @@ class PerformanceTestModel(DatazillaModelBase):
                 else:
                     string_data = value
 
-                placeholders.append(
-                    (
-                        test_run_id,
-                        index,
-                        aux_data_id,
-                        numeric_data,
-                        string_data,
-                        )
-                    )
+                rows.append( (index, aux_data_id, numeric_data, string_data) )
 
-            self._insert_data(
-                'set_aux_values', placeholders, executemany=True)
+        return rows
 
 
-    def _set_test_values(self, data, test_id, test_run_id):
-        """Insert test values to database for given test_id and test_run_id."""
-
+    def _get_test_value_rows(self, data, test_id):
+        """Return (run_id, page_id, value_id, value) rows for TestData."""
+        rows = []
         total_replicates = 0
 
         for page, values in data['results'].items():
 
             page_id = self._get_or_create_page_id(page, test_id)
 
-            placeholders = []
             for index, value in enumerate(values, 1):
 
                 total_replicates += 1
 
                 if total_replicates <= self.REPLICATE_LIMIT:
 
-                    placeholders.append(
-                        (
-                            test_run_id,
-                            index,
-                            page_id,
-                            # TODO: Need to get the value id into the json
-                            1,
-                            value,
-                            )
-                        )
+                    # TODO: Need to get the value id into the json
+                    rows.append( (index, page_id, 1, value) )
 
                 else:
                     #Replicate limit reached
                     break
 
-            if placeholders:
-                self._insert_data(
-                    'set_test_values', placeholders, executemany=True)
+        return rows
+
+
+    def _set_test_aux_data(self, data, test_id, test_run_id):
+        """Insert test aux data to db for given test_id and test_run_id."""
+        placeholders = [
+            (test_run_id,) + row
+            for row in self._get_aux_value_rows(data, test_id)
+            ]
+
+        if placeholders:
+            self._insert_data(
+                'set_aux_values', placeholders, executemany=True)
+
+
+    def _set_test_values(self, data, test_id, test_run_id):
+        """Insert test values to database for given test_id and test_run_id."""
+        placeholders = [
+            (test_run_id,) + row
+            for row in self._get_test_value_rows(data, test_id)
+            ]
+
+        if placeholders:
+            self._insert_data(
+                'set_test_values', placeholders, executemany=True)
 
 
     def _get_or_create_aux_id(self, aux_data, test_id):
         """Given aux name and test id, return aux id, creating if needed."""
+        cache_key = ('aux', aux_data, test_id)
+        aux_data_id = self.ref_data_cache.get(cache_key)
+        if aux_data_id is not None:
+            return aux_data_id
+
         # Insert the test id and aux data if it doesn't exist
         self.sources["perftest"].dhub.execute(
             proc='perftest.inserts.set_aux_ref_data',
@@ -1605,11 +2397,19 @@ class PerformanceTestModel(DatazillaModelBase):
             return_type='iter',
             )
 
-        return id_iter.get_column_data('id')
+        aux_data_id = id_iter.get_column_data('id')
+        self.ref_data_cache.set(cache_key, aux_data_id)
+
+        return aux_data_id
 
 
     def _get_or_create_page_id(self, page, test_id):
         """Given page name and test id, return page id, creating if needed."""
+        cache_key = ('page', page, test_id)
+        page_id = self.ref_data_cache.get(cache_key)
+        if page_id is not None:
+            return page_id
+
         # Insert the test id and page name if it doesn't exist
         self.sources["perftest"].dhub.execute(
             proc='perftest.inserts.set_pages_ref_data',
@@ -1630,15 +2430,28 @@ class PerformanceTestModel(DatazillaModelBase):
             return_type='iter',
             )
 
-        return id_iter.get_column_data('id')
+        page_id = id_iter.get_column_data('id')
+        self.ref_data_cache.set(cache_key, page_id)
+
+        return page_id
 
 
     def _set_option_data(self, data, test_run_id):
         """Insert option data for given test run id."""
+        placeholders = [
+            (test_run_id,) + row for row in self._get_option_rows(data)
+            ]
+
+        self._insert_data(
+            'set_test_option_values', placeholders, executemany=True)
+
+
+    def _get_option_rows(self, data):
+        """Return (option_id, value) rows for TestData."""
 
         testrun = data['testrun']
 
-        placeholders = []
+        rows = []
         for option, value in testrun.get('options', {}).items():
 
             """
@@ -1657,42 +2470,50 @@ class PerformanceTestModel(DatazillaModelBase):
 
             option_id = self._get_or_create_option_id(option)
 
-            placeholders.append([test_run_id, option_id, value])
+            rows.append( (option_id, value) )
 
-        self._insert_data(
-            'set_test_option_values', placeholders, executemany=True)
+        return rows
 
 
     def _set_test_run_data(self, data, test_id, build_id, machine_id):
         """Inserts testrun data into the db and returns test_run id."""
 
+        test_run_id = self._insert_data_and_get_id(
+            'set_test_run_data',
+            self._get_test_run_placeholders(
+                data, test_id, build_id, machine_id)
+            )
+
+        return test_run_id
+
+
+    def _get_test_run_placeholders(self, data, test_id, build_id, machine_id):
+        """Return the set_test_run_data placeholders for TestData."""
+
         try:
             run_date = int(data['testrun']['date'])
         except ValueError:
             raise TestDataError(
                 "Bad value: ['testrun']['date'] is not an integer.")
 
-        test_run_id = self._insert_data_and_get_id(
-            'set_test_run_data',
-            [
-                test_id,
-                build_id,
-                machine_id,
-                # denormalization; avoid join to build table to get revision
-                data['test_build']['revision'],
-                run_date,
-                ]
-            )
-
-        return test_run_id
+        return [
+            test_id,
+            build_id,
+            machine_id,
+            # denormalization; avoid join to build table to get revision
+            data['test_build']['revision'],
+            run_date,
+            ]
 
 
-    def _insert_data(self, statement, placeholders, executemany=False):
+    def _insert_data(
+        self, statement, placeholders, executemany=False, nocommit=False):
         self.sources["perftest"].dhub.execute(
             proc='perftest.inserts.' + statement,
             debug_show=self.DEBUG,
             placeholders=placeholders,
             executemany=executemany,
+            nocommit=nocommit,
             )
 
 
@@ -1717,14 +2538,20 @@ class PerformanceTestModel(DatazillaModelBase):
         machine = data['test_machine']
         build = data['test_build']
 
-        build_type = 'opt'
+        build_type = self.BUILD_TYPE
+
+        cache_key = (
+            'build', product_id, build['id'], machine['platform'], build_type
+            )
+        build_id = self.ref_data_cache.get(cache_key)
+        if build_id is not None:
+            return build_id
 
         placeholders=[
             product_id,
             build['id'],
             machine['platform'],
             build['revision'],
-            # TODO: Need to get the build type into the json
             build_type,
             # TODO: need to get the build date into the json
             utils.get_now_timestamp(),
@@ -1751,9 +2578,10 @@ class PerformanceTestModel(DatazillaModelBase):
                 ]
             )
 
-        id = build_iter.get_column_data('id')
+        build_id = build_iter.get_column_data('id')
+        self.ref_data_cache.set(cache_key, build_id)
 
-        return id
+        return build_id
 
 
     def _get_or_create_machine_id(self, data, os_id):
@@ -1765,6 +2593,11 @@ class PerformanceTestModel(DatazillaModelBase):
         """
         machine = data['test_machine']
 
+        cache_key = ('machine', machine['name'], os_id)
+        machine_id = self.ref_data_cache.get(cache_key)
+        if machine_id is not None:
+            return machine_id
+
         # Insert the the machine name and timestamp if it doesn't exist
         date_added = utils.get_now_timestamp()
         self.sources["perftest"].dhub.execute(
@@ -1786,7 +2619,10 @@ class PerformanceTestModel(DatazillaModelBase):
             debug_show=self.DEBUG,
             return_type='iter')
 
-        return id_iter.get_column_data('id')
+        machine_id = id_iter.get_column_data('id')
+        self.ref_data_cache.set(cache_key, machine_id)
+
+        return machine_id
 
 
     def _get_or_create_test_id(self, data):
@@ -1805,6 +2641,11 @@ class PerformanceTestModel(DatazillaModelBase):
             raise TestDataError(
                 "Bad value: ['testrun']['suite_version'] is not an integer.")
 
+        cache_key = ('test', testrun['suite'], version)
+        test_id = self.ref_data_cache.get(cache_key)
+        if test_id is not None:
+            return test_id
+
         # Insert the test name and version if it doesn't exist
         self.sources['perftest'].dhub.execute(
             proc='perftest.inserts.set_test_ref_data',
@@ -1824,7 +2665,10 @@ class PerformanceTestModel(DatazillaModelBase):
             debug_show=self.DEBUG,
             return_type='iter')
 
-        return id_iter.get_column_data('id')
+        test_id = id_iter.get_column_data('id')
+        self.ref_data_cache.set(cache_key, test_id)
+
+        return test_id
 
 
     def _get_or_create_os_id(self, data):
@@ -1838,6 +2682,11 @@ class PerformanceTestModel(DatazillaModelBase):
         os_name = machine['os']
         os_version = machine['osversion']
 
+        cache_key = ('os', os_name, os_version)
+        os_id = self.ref_data_cache.get(cache_key)
+        if os_id is not None:
+            return os_id
+
         # Insert the operating system name and version if it doesn't exist
         self.sources["perftest"].dhub.execute(
             proc='perftest.inserts.set_os_ref_data',
@@ -1856,11 +2705,19 @@ class PerformanceTestModel(DatazillaModelBase):
             debug_show=self.DEBUG,
             return_type='iter')
 
-        return id_iter.get_column_data('id')
+        os_id = id_iter.get_column_data('id')
+        self.ref_data_cache.set(cache_key, os_id)
+
+        return os_id
 
 
     def _get_or_create_option_id(self, option):
         """Return option id for given option name, creating it if needed."""
+        cache_key = ('option', option)
+        option_id = self.ref_data_cache.get(cache_key)
+        if option_id is not None:
+            return option_id
+
         # Insert the option name if it doesn't exist
         self.sources["perftest"].dhub.execute(
             proc='perftest.inserts.set_option_ref_data',
@@ -1874,7 +2731,10 @@ class PerformanceTestModel(DatazillaModelBase):
             debug_show=self.DEBUG,
             return_type='iter')
 
-        return id_iter.get_column_data('id')
+        option_id = id_iter.get_column_data('id')
+        self.ref_data_cache.set(cache_key, option_id)
+
+        return option_id
 
 
     def _get_or_create_product_id(self, data):
@@ -1885,6 +2745,11 @@ class PerformanceTestModel(DatazillaModelBase):
         branch = build['branch']
         version = build['version']
 
+        cache_key = ('product', product, branch, version)
+        product_id = self.ref_data_cache.get(cache_key)
+        if product_id is not None:
+            return product_id
+
         # Insert the product, branch, and version if it doesn't exist
         self.sources["perftest"].dhub.execute(
             proc='perftest.inserts.set_product_ref_data',
@@ -1905,7 +2770,10 @@ class PerformanceTestModel(DatazillaModelBase):
             debug_show=self.DEBUG,
             return_type='iter')
 
-        return id_iter.get_column_data('id')
+        product_id = id_iter.get_column_data('id')
+        self.ref_data_cache.set(cache_key, product_id)
+
+        return product_id
 
 
     def _get_unique_key_dict(self, data_tuple, key_strings):
@@ -2012,3 +2880,75 @@ class TestData(dict):
             value = self.__class__(value, full_context)
 
         return value
+
+
+class RefDataCache(object):
+    """
+    Bounded, process-lifetime cache of reference data ids for a project.
+
+    ``load_test_data`` resolves the same handful of test, os, product,
+    machine, build, page, option and aux ids for nearly every blob it
+    loads.  Ids are keyed on the natural key of the reference row so a hit
+    skips both the INSERT ... WHERE NOT EXISTS and the following SELECT.
+    A miss falls back to the database.  Reference rows are never updated
+    or deleted in place, so a cached id stays valid for the life of the
+    process; the least recently used entries are evicted once ``max_size``
+    is reached.
+
+    """
+    # one cache per project, shared by all models in the process
+    caches = {}
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    @classmethod
+    def get_cache(cls, project):
+        """Return the cache for ``project``, creating it if needed."""
+        if project not in cls.caches:
+            cls.caches[project] = cls(
+                getattr(settings, "DATAZILLA_REF_DATA_CACHE_SIZE", 10000)
+                )
+        return cls.caches[project]
+
+
+    @classmethod
+    def reset(cls):
+        """Discard the cached ids of all projects."""
+        cls.caches.clear()
+
+
+    def get(self, key):
+        """Return the id stored for ``key`` or None on a miss."""
+        try:
+            value = self.data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+
+        # re-insert to mark the entry as most recently used
+        self.data[key] = value
+        self.hits += 1
+        return value
+
+
+    def set(self, key, value):
+        """Store ``value`` for ``key``, evicting the oldest entry if full."""
+        self.data.pop(key, None)
+        if self.max_size and len(self.data) >= self.max_size:
+            self.data.popitem(last=False)
+        self.data[key] = value
+
+
+    def get_stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.data),
+            "max_size": self.max_size,
+            }
@@ -1,13 +1,19 @@
 import sys
-import copy
 import time
+import json
+import zlib
+import hashlib
+
+from fnmatch import fnmatch
+
+import numpy
 
 from numpy import mean, std, isnan, nan
+from scipy.stats import t
 
 from django.conf import settings
+from django.core.cache import cache
 
-from dzmetrics.ttest import welchs_ttest, welchs_ttest_internal
-from dzmetrics.fdr import rejector
 from dzmetrics.data_smoothing import exp_smooth
 
 from base import DatazillaModelBase
@@ -60,10 +66,31 @@ class MetricsTestModel(DatazillaModelBase):
 
     KEY_DELIMITER = '__'
 
+    ###
+    # Keys shared by all of the metric datums of a test run, the parent
+    # window prefetched by get_parent_test_data is loaded for these keys
+    # so it can be reused for every page of the child.
+    ###
+    PARENT_WINDOW_KEYS = [
+        'product_id',
+        'operating_system_id',
+        'processor',
+        'build_type',
+        'test_id'
+        ]
+
     #Number of characters in a node that are
     #used in the revision string
     REVISION_CHAR_COUNT = 12
 
+    #Push walkers with a checkpoint and a dirty revision set, see
+    #get_push_walker_checkpoints
+    PUSH_WALKERS = ['metrics', 'summary']
+
+    #Metric collection of every project used by the process, see
+    #_get_metric_collection
+    metric_collections = {}
+
     ALL_DIMENSION_COLUMN_KEY = {
         "ti":"test_run_id",
         "dr":"date received",
@@ -91,16 +118,106 @@ class MetricsTestModel(DatazillaModelBase):
         "te":"test evaluation"
         }
 
+    #Columns of get_test_data_all_dimensions in select order
+    ALL_DIMENSION_COLUMNS = [
+        "ti", "dr", "r", "p", "b", "bv", "osn", "osv", "pr", "bt", "mn",
+        "pi", "pd", "tn", "pu", "m", "s", "hr", "pv", "nr", "f", "tm",
+        "ts", "te"
+        ]
+
+    #String columns with few distinct values, get_columnar_data sends
+    #them dictionary encoded
+    ALL_DIMENSION_DICTIONARY_COLUMNS = set([
+        "p", "b", "bv", "osn", "osv", "pr", "bt", "mn", "tn", "pu"
+        ])
+
+    #Columns identifying the series, one graph line, of a
+    #get_data_all_dimensions row, see get_downsampled_data
+    ALL_DIMENSION_SERIES_COLUMNS = [
+        "p", "b", "bv", "osn", "osv", "pr", "bt", "tn", "pu"
+        ]
+
+    ###
+    # Rollups aggregate the test_data_all_dimensions means of a series,
+    # a metric datum, per day (test_data_daily_rollup) or per push
+    # (test_data_push_rollup).  get_data_all_dimensions serves them
+    # instead of the test runs for long time ranges.
+    ###
+    ALL_DIMENSION_ROLLUPS = ['daily', 'push']
+
+    ALL_DIMENSION_ROLLUP_COLUMN_KEY = {
+        "d":"day",
+        "pi":"pushlog_id",
+        "pd":"push date",
+        "r":"revision",
+        "p":"product",
+        "b":"branch",
+        "bv":"branch version",
+        "osn":"operating system",
+        "osv":"operating system version",
+        "pr":"processor",
+        "bt":"build type",
+        "tn":"test name",
+        "pu":"page url",
+        "n":"test runs",
+        "m":"mean",
+        "mi":"min",
+        "ma":"max",
+        "s":"std",
+        "md":"median"
+        }
+
+    #Columns of get_test_data_daily_rollups and get_test_data_push_rollups
+    #in select order
+    ALL_DIMENSION_ROLLUP_COLUMNS = {
+        'daily':[
+            "d", "p", "b", "bv", "osn", "osv", "pr", "bt", "tn", "pu", "n",
+            "m", "mi", "ma", "s", "md"
+            ],
+        'push':[
+            "pi", "pd", "r", "p", "b", "bv", "osn", "osv", "pr", "bt", "tn",
+            "pu", "n", "m", "mi", "ma", "s", "md"
+            ]
+        }
+
+    #Rollup table columns identifying the group of a series, the first
+    #one is part of the primary key
+    ROLLUP_GROUP_KEYS = {
+        'daily':['day'],
+        'push':['pushlog_id', 'push_date', 'revision']
+        }
+
+    #Rollup table columns naming a series
+    ROLLUP_NAME_KEYS = [
+        'product',
+        'branch',
+        'branch_version',
+        'operating_system_name',
+        'operating_system_version',
+        'test_name',
+        'page_url'
+        ]
+
 
-    def __init__(self, project=None, metrics=()):
+    def __init__(self, project=None, metrics=(), parent_window_size=None):
 
         super(MetricsTestModel, self).__init__(project)
 
         self.skip_revisions = set()
 
+        #Number of pushes prefetched per query by get_parent_test_data
+        self.parent_window_size = parent_window_size or getattr(
+            settings, "DATAZILLA_PARENT_WINDOW_SIZE", 20)
+
+        self.reset_parent_window()
+
+        #MetricThresholdStore of the threshold session in progress, see
+        #begin_threshold_session
+        self.threshold_store = None
+
         self.metrics = metrics or self._get_metric_collection()
 
-        self.mf = MetricsMethodFactory(self.metrics)
+        self.mf = MetricsMethodFactory(self.metrics, self.project)
 
         self.push_value_names = set(['push_date', 'pushlog_id'])
 
@@ -140,6 +257,31 @@ class MetricsTestModel(DatazillaModelBase):
         if revision:
             self.skip_revisions.add(revision)
 
+    def reset_parent_window(self):
+        """Drop the prefetched parent test values and their counters."""
+
+        #{ PARENT_WINDOW_KEYS values: { revision: test values, ... }, ... }
+        self.parent_window = {}
+
+        self.parent_window_stats = { 'hits':0, 'misses':0, 'queries':0 }
+
+    def get_parent_window_stats(self):
+        """
+        Return the hit/miss counters of the parent test value window.
+        A hit is a pushlog revision get_parent_test_data found already
+        prefetched, a miss required a query.
+        """
+        stats = dict(self.parent_window_stats)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = 0.0
+        if lookups:
+            stats['hit_rate'] = float(stats['hits'])/lookups
+
+        stats['window_size'] = self.parent_window_size
+
+        return stats
+
     def get_metric_summary_name(self, test_name):
         m = self.mf.get_metric_method(test_name)
         return m.SUMMARY_NAME
@@ -158,6 +300,198 @@ class MetricsTestModel(DatazillaModelBase):
 
         return list(test_run_ids)
 
+    def get_metric_summary_keys_by_revisions(self, revisions):
+        """
+        Retrieve the distinct METRIC_SUMMARY_KEYS, revision and branch
+        of the test runs associated with a list of revisions, in a
+        stable order.
+
+        returns a list of dictionaries, one per metric summary key and
+        revision with test data:
+
+            [ { all self.METRIC_SUMMARY_KEYS: associated id,
+                revision:revision,
+                branch:"branch name" }, ... ]
+        """
+        if not revisions:
+            return []
+
+        proc = 'perftest.selects.get_metric_summary_keys_by_revisions'
+
+        return list(
+            self.sources["perftest"].dhub.execute(
+                proc=proc,
+                debug_show=self.DEBUG,
+                placeholders=list(revisions),
+                replace=[ ','.join( map( lambda v:'%s', revisions ) ) ],
+                return_type='tuple',
+                )
+            )
+
+    def get_metric_summary_keys_by_test_run_ids(self, test_run_ids):
+        """
+        Retrieve the METRIC_SUMMARY_KEYS and branch of a list of
+        test runs.
+
+        returns the following dictionary:
+
+            test_run_id : {
+                all self.METRIC_SUMMARY_KEYS: associated id,
+                test_run_id:id,
+                branch:"branch name"
+            }
+        """
+        if not test_run_ids:
+            return {}
+
+        proc = 'perftest.selects.get_metric_summary_keys_by_test_run_ids'
+
+        return self.sources["perftest"].dhub.execute(
+            proc=proc,
+            debug_show=self.DEBUG,
+            placeholders=list(test_run_ids),
+            replace=[ ','.join( map( lambda v:'%s', test_run_ids ) ) ],
+            key_column='test_run_id',
+            return_type='dict',
+            )
+
+    def get_push_walker_checkpoints(self, walker):
+        """
+        Retrieve the push_id of the last push processed by walker in
+        every pushlog branch.
+
+        returns the following dictionary:
+
+            { branch name: push_id, ... }
+        """
+        proc = 'perftest.selects.get_push_walker_checkpoints'
+
+        checkpoint_data = self.sources["perftest"].dhub.execute(
+            proc=proc,
+            debug_show=self.DEBUG,
+            placeholders=[walker],
+            return_type='tuple',
+            )
+
+        return dict(
+            map(lambda d: (d['branch'], d['push_id']), checkpoint_data)
+            )
+
+    def set_push_walker_checkpoint(self, walker, branch, push_id):
+        """
+        Store the push_id of the last push processed by walker in
+        branch.
+        """
+        self.sources["perftest"].dhub.execute(
+            proc='perftest.inserts.set_push_walker_checkpoint',
+            debug_show=self.DEBUG,
+            placeholders=[walker, branch, push_id, int(time.time())],
+            )
+
+    def get_push_walker_dirty_revisions(self, walker):
+        """
+        Retrieve the set of revisions that received test data since
+        walker last processed them.
+        """
+        proc = 'perftest.selects.get_push_walker_dirty_revisions'
+
+        return self.sources["perftest"].dhub.execute(
+            proc=proc,
+            debug_show=self.DEBUG,
+            placeholders=[walker],
+            key_column='revision',
+            return_type='set',
+            )
+
+    def set_push_walker_dirty_revisions(
+        self, test_run_ids, exclude_branches=None):
+        """
+        Mark the revisions of a list of test runs dirty for every
+        push walker.  A dirty revision is processed by the next walk even
+        if its push is older than the walker checkpoint.
+
+        exclude_branches - Optional list of product branches the push
+            walkers never walk, their test runs are not marked.
+        """
+        if not test_run_ids:
+            return
+
+        test_run_ids = list(test_run_ids)
+        exclude_branches = sorted(exclude_branches or [])
+
+        branch_clause = ""
+        if exclude_branches:
+            branch_clause = " AND p.branch NOT IN ({0})".format(
+                ','.join( map( lambda v:'%s', exclude_branches ) )
+                )
+
+        replace = [
+            ','.join( map( lambda v:'%s', test_run_ids ) ), branch_clause
+            ]
+
+        date_added = int(time.time())
+
+        for walker in self.PUSH_WALKERS:
+            self.sources["perftest"].dhub.execute(
+                proc='perftest.inserts.set_push_walker_dirty_revisions',
+                debug_show=self.DEBUG,
+                placeholders=(
+                    [walker, date_added] + test_run_ids + exclude_branches
+                    ),
+                replace=replace,
+                )
+
+    def add_push_walker_dirty_revisions(self, walker, revisions):
+        """
+        Mark a list of revisions dirty for walker, the next walk processes
+        them again even if their push is older than the walker checkpoint.
+        Revisions already dirty for walker keep the date they were marked.
+        """
+        if not revisions:
+            return
+
+        date_added = int(time.time())
+
+        self.sources["perftest"].dhub.execute(
+            proc='perftest.inserts.add_push_walker_dirty_revisions',
+            debug_show=self.DEBUG,
+            placeholders=[
+                (walker, revision, date_added) for revision in revisions
+                ],
+            executemany=True,
+            )
+
+    def delete_push_walker_dirty_revisions(
+        self, walker, revisions, date_started):
+        """
+        Remove revisions processed by walker from its dirty set.  Only
+        rows marked up to date_started, the time the walk read the dirty
+        set, are removed so data loaded during the walk stays dirty.
+        """
+        if not revisions:
+            return
+
+        revisions = list(revisions)
+
+        self.sources["perftest"].dhub.execute(
+            proc='perftest.deletes.delete_push_walker_dirty_revisions',
+            debug_show=self.DEBUG,
+            placeholders=[walker, date_started] + revisions,
+            replace=[ ','.join( map( lambda v:'%s', revisions ) ) ],
+            )
+
+    def delete_expired_push_walker_dirty_revisions(self, walker, date_added):
+        """
+        Remove the revisions marked dirty for walker before date_added.
+        Their pushes are older than the walk window, no walk processes
+        them anymore.
+        """
+        self.sources["perftest"].dhub.execute(
+            proc='perftest.deletes.delete_expired_push_walker_dirty_revisions',
+            debug_show=self.DEBUG,
+            placeholders=[walker, date_added],
+            )
+
     def get_test_values_by_test_run_id(self, test_run_id):
         """
         Retrieve all test values associated with a given test_run_id.
@@ -283,50 +617,139 @@ class MetricsTestModel(DatazillaModelBase):
                 metric_values:{ metric_value_name: metric_value, ... }
             }
         """
-        m = self.mf.get_metric_method(ref_data['test_name'])
-        metric_id = m.get_metric_id()
+        return self.get_threshold_data_bulk([ ref_data ])
 
-        #Get the threshold test run id
-        test_run_proc = 'perftest.selects.get_metric_threshold_test_run'
+    def get_threshold_data_bulk(self, ref_data_list):
+        """
+        Retrieve the metric threshold data for every metric key in
+        ref_data_list using three queries, regardless of the number of
+        keys.
 
-        test_run_placeholders = [
-            ref_data['product_id'],
-            ref_data['operating_system_id'],
-            ref_data['processor'],
-            ref_data['build_type'],
-            metric_id,
-            ref_data['test_id'],
-            ref_data['page_id']
+        ref_data_list - List of dictionaries containing all METRIC_KEYS
+            and their associated values.
+
+        returns the get_threshold_data dictionary for all of the metric
+        keys that have a threshold.
+
+        During a threshold session the thresholds of a metric key are
+        only retrieved the first time the key is requested, the session
+        serves them from memory afterwards.
+        """
+        if self.threshold_store is None:
+            return self._select_threshold_data(ref_data_list)
+
+        store = self.threshold_store
+
+        missing = {}
+        for ref_data in ref_data_list:
+            key = self.get_metrics_key(ref_data)
+            if key not in store:
+                missing.setdefault(key, ref_data)
+
+        if missing:
+            store.load(
+                missing.keys(), self._select_threshold_data(missing.values())
+                )
+
+        return store.get(
+            map(lambda r: self.get_metrics_key(r), ref_data_list)
+            )
+
+    def begin_threshold_session(self):
+        """
+        Start a threshold session.  Until commit_threshold_session is
+        called threshold reads are loaded once per metric key and the
+        threshold updates of store_metric_results are kept in memory.
+        """
+        self.threshold_store = MetricThresholdStore()
+
+    def commit_threshold_session(self):
+        """
+        Store the thresholds updated during the threshold session with
+        a single bulk upsert, in push date order, and end the session.
+        """
+        store = self.threshold_store
+        self.threshold_store = None
+
+        if store is not None:
+            self.set_metric_thresholds( store.get_updated_thresholds() )
+
+    def _select_threshold_data(self, ref_data_list):
+
+        if not ref_data_list:
+            return {}
+
+        threshold_columns = [
+            'product_id', 'operating_system_id', 'processor',
+            'build_type', 'metric_id', 'test_id', 'page_id'
             ]
 
-        test_run_data = self.sources["perftest"].dhub.execute(
-            proc=test_run_proc,
+        #Get the threshold test run ids
+        where_clauses = []
+        threshold_placeholders = []
+
+        for ref_data in ref_data_list:
+
+            m = self.mf.get_metric_method(ref_data['test_name'])
+
+            where_clauses.append( '(' + ' AND '.join(
+                map( lambda c:'mt.' + c + ' = %s', threshold_columns )
+                ) + ')' )
+
+            threshold_placeholders.extend([
+                ref_data['product_id'],
+                ref_data['operating_system_id'],
+                ref_data['processor'],
+                ref_data['build_type'],
+                m.get_metric_id(),
+                ref_data['test_id'],
+                ref_data['page_id']
+                ])
+
+        thresholds = self.sources["perftest"].dhub.execute(
+            proc='perftest.selects.get_metric_threshold_test_runs',
             debug_show=self.DEBUG,
-            placeholders=test_run_placeholders,
-            return_type='iter',
+            placeholders=threshold_placeholders,
+            replace=[ ' OR '.join(where_clauses) ],
+            return_type='tuple',
             )
 
-        test_run_id =  test_run_data.get_column_data('test_run_id')
+        #The (test_run_id, page_id) pairs of the thresholds
+        threshold_pages = set()
+        for threshold in thresholds:
+            threshold_pages.add(
+                (threshold['test_run_id'], threshold['page_id'])
+                )
+
+        if not threshold_pages:
+            return {}
+
+        test_run_ids = list( set( map( lambda p:p[0], threshold_pages ) ) )
+        page_ids = list( set( map( lambda p:p[1], threshold_pages ) ) )
 
-        #Get the test values for the test run and page
-        test_data_proc = \
-            'perftest.selects.get_test_values_by_test_run_id_and_page_id'
+        placeholders = test_run_ids + page_ids
+        replace = [
+            ','.join( map( lambda v:'%s', test_run_ids ) ),
+            ','.join( map( lambda v:'%s', page_ids ) )
+            ]
 
+        #Get the test values for the test runs and pages, the IN
+        #lists can match pages of other thresholds so only keep
+        #the threshold pairs
         test_data = self.sources["perftest"].dhub.execute(
-            proc=test_data_proc,
+            proc='perftest.selects.get_test_values_by_test_run_ids_and_page_ids',
             debug_show=self.DEBUG,
-            placeholders=[ test_run_id, ref_data['page_id'] ],
+            placeholders=placeholders,
+            replace=replace,
             return_type='tuple',
             )
 
-        #Get the metric values for the test run and page
-        metric_data_proc = \
-            'perftest.selects.get_metrics_data_from_test_run_id_and_page_id'
-
+        #Get the metric values for the test runs and pages
         metrics_data = self.sources["perftest"].dhub.execute(
-            proc=metric_data_proc,
+            proc='perftest.selects.get_metrics_data_from_test_run_ids_and_page_ids',
             debug_show=self.DEBUG,
-            placeholders=[ test_run_id, ref_data['page_id'] ],
+            placeholders=placeholders,
+            replace=replace,
             return_type='tuple',
             )
 
@@ -334,6 +757,9 @@ class MetricsTestModel(DatazillaModelBase):
 
         #Load metrics data
         for d in metrics_data:
+            if (d['test_run_id'], d['page_id']) not in threshold_pages:
+                continue
+
             key = self.get_metrics_key(d)
             if key not in key_lookup:
                 #set reference data
@@ -352,6 +778,9 @@ class MetricsTestModel(DatazillaModelBase):
 
         #Load associated test data
         for d in test_data:
+            if (d['test_run_id'], d['page_id']) not in threshold_pages:
+                continue
+
             key = self.get_metrics_key(d)
             #The key should be defined at this point but if
             #not be sure to return any values
@@ -898,10 +1327,14 @@ class MetricsTestModel(DatazillaModelBase):
             'fail':{'value':0, 'percent':""}
             }
 
-    def get_metrics_data(self, revision):
+    def get_metrics_data(self, revision, ref_data={}):
         """
         Retrieve all metrics data associated with a given revision.
 
+        ref_data - optional dictionary containing all
+            self.METRIC_SUMMARY_KEYS.  If provided only the metrics data
+            associated with the metric summary key will be retrieved.
+
         returns the following dictionary:
 
             metric_key : {
@@ -925,10 +1358,24 @@ class MetricsTestModel(DatazillaModelBase):
 
         proc = 'perftest.selects.get_computed_metrics'
 
+        placeholders = []
+
+        if ref_data:
+
+            proc = 'perftest.selects.get_computed_metrics_by_ref_data'
+
+            placeholders.append(ref_data['product_id'])
+            placeholders.append(ref_data['operating_system_id'])
+            placeholders.append(ref_data['processor'])
+            placeholders.append(ref_data['build_type'])
+            placeholders.append(ref_data['test_id'])
+
+        placeholders.append(revision)
+
         computed_metrics = self.sources["perftest"].dhub.execute(
             proc=proc,
             debug_show=self.DEBUG,
-            placeholders=[revision],
+            placeholders=placeholders,
             return_type='tuple'
             )
 
@@ -975,6 +1422,10 @@ class MetricsTestModel(DatazillaModelBase):
             metric test results.  If it's provided a parent must pass the
             MetricMethod.evaluate_metric_result test to be considered a
             viable parent.
+
+        Test values are prefetched parent_window_size pushes at a time and
+        shared by all of the metric datums of the child's test run, see
+        get_parent_window_stats.
         """
         parent_data = {}
         test_result = {}
@@ -997,7 +1448,9 @@ class MetricsTestModel(DatazillaModelBase):
                 if revision in self.skip_revisions:
                     continue
 
-                data = self.get_test_values_by_revision(revision, ref_data)
+                data = self._get_parent_window_test_values(
+                    pushlog, parent_index, ref_data
+                    )
                 #no data for this revision, skip
                 if not data:
                     self.add_skip_revision(revision)
@@ -1032,6 +1485,61 @@ class MetricsTestModel(DatazillaModelBase):
             #parent with data found
             return parent_data, test_result
 
+    def _get_parent_window_test_values(self, pushlog, index, ref_data):
+        """
+        Return the get_test_values_by_revision data of the push at
+        'index' in 'pushlog' for the test run described by 'ref_data'.
+
+        On a miss the test values of the parent_window_size pushes ending
+        at 'index' are loaded with a single query, the walk back through
+        the pushlog continues in memory until it leaves the window.
+        """
+        window = self.parent_window.setdefault(
+            tuple( map(lambda k: ref_data[k], self.PARENT_WINDOW_KEYS) ), {}
+            )
+
+        revision = self.truncate_revision(pushlog[index]['node'])
+
+        if revision in window:
+            self.parent_window_stats['hits'] += 1
+            return window[revision]
+
+        self.parent_window_stats['misses'] += 1
+
+        start = max(0, index - self.parent_window_size + 1)
+
+        revisions = set([ revision ])
+        for node in pushlog[start:index]:
+            r = self.truncate_revision(node['node'])
+            if (r not in window) and (r not in self.skip_revisions):
+                revisions.add(r)
+
+        revisions = list(revisions)
+
+        placeholders = map(lambda k: ref_data[k], self.PARENT_WINDOW_KEYS)
+        placeholders.extend(revisions)
+
+        revision_data = self.sources["perftest"].dhub.execute(
+            proc='perftest.selects.get_test_values_by_ref_data_and_revisions',
+            debug_show=self.DEBUG,
+            placeholders=placeholders,
+            replace=[ ','.join( map( lambda v:'%s', revisions ) ) ],
+            return_type='tuple',
+            )
+
+        self.parent_window_stats['queries'] += 1
+
+        rows_by_revision = {}
+        for d in revision_data:
+            rows_by_revision.setdefault(d['revision'], []).append(d)
+
+        for r in revisions:
+            window[r] = self._adapt_test_values(
+                rows_by_revision.get(r, [])
+                )
+
+        return window[revision]
+
     def run_metric_method(
         self, ref_data, child_data, parent_data, parent_metric_data={}
         ):
@@ -1042,18 +1550,78 @@ class MetricsTestModel(DatazillaModelBase):
             )
         return results
 
-    def run_metric_summary(self, ref_data, data):
+    def run_metric_methods(
+        self, ref_data_list, child_data_list, parent_data_list,
+        parent_metric_data_list
+        ):
+        """
+        Run the metric method of every metric datum in ref_data_list,
+        element i of every list belongs to the same metric datum.
 
-        m = self.mf.get_metric_method(ref_data['test_name'])
-        results = m.run_metric_summary(data)
-        return results
+        The metric datums of a metric method registered with batch
+        support are evaluated together with run_metric_method_list, the
+        others one at a time with run_metric_method.
 
-    def store_metric_results(
-        self, revision, ref_data, results, threshold_test_run_id
-        ):
+        returns the list of run_metric_method results, None for a
+        metric datum the method could not evaluate.
+        """
+        results = [ None ] * len(ref_data_list)
 
-        m = self.mf.get_metric_method(ref_data['test_name'])
-        placeholders = m.get_data_for_metric_storage(
+        indexes_by_test = {}
+        for index, ref_data in enumerate(ref_data_list):
+            indexes_by_test.setdefault(ref_data['test_name'], []).append(
+                index
+                )
+
+        for test_name, indexes in indexes_by_test.items():
+
+            m = self.mf.get_metric_method(test_name)
+
+            if self.mf.supports_batch(test_name):
+
+                test_results = m.run_metric_method_list(
+                    map(lambda i: child_data_list[i], indexes),
+                    map(lambda i: parent_data_list[i], indexes),
+                    map(lambda i: parent_metric_data_list[i], indexes)
+                    )
+
+                for index, result in zip(indexes, test_results):
+                    results[index] = result
+
+                continue
+
+            for index in indexes:
+                try:
+                    results[index] = m.run_metric_method(
+                        child_data_list[index],
+                        parent_data_list[index],
+                        parent_metric_data_list[index]
+                        )
+                except MetricMethodError:
+                    results[index] = None
+
+        return results
+
+    def run_metric_summary(self, ref_data, data):
+
+        m = self.mf.get_metric_method(ref_data['test_name'])
+        results = m.run_metric_summary(data)
+        return results
+
+    def store_metric_results(
+        self, revision, ref_data, results, threshold_test_run_id,
+        values=None
+        ):
+        """
+        Store the metric method results of a metric datum and make it
+        the threshold of its metric key if the results pass.
+
+        values - The test values of the metric datum.  During a
+            threshold session they are required to keep the threshold
+            in memory, without them the threshold is written directly.
+        """
+        m = self.mf.get_metric_method(ref_data['test_name'])
+        placeholders = m.get_data_for_metric_storage(
             ref_data, results, threshold_test_run_id
             )
 
@@ -1069,11 +1637,28 @@ class MetricsTestModel(DatazillaModelBase):
                 )
             if m.evaluate_metric_result(results):
 
-                self.insert_or_update_metric_threshold(
-                    revision,
-                    ref_data,
-                    m.get_metric_id()
-                    )
+                store = self.threshold_store
+
+                if (store is None) or (values is None):
+
+                    self.insert_or_update_metric_threshold(
+                        revision,
+                        ref_data,
+                        m.get_metric_id()
+                        )
+
+                    if store is not None:
+                        #Read the threshold written back from the database
+                        store.discard( self.get_metrics_key(ref_data) )
+
+                else:
+                    store.update(
+                        self.get_metrics_key(ref_data),
+                        self._get_stored_threshold(
+                            m, revision, ref_data, values, placeholders,
+                            threshold_test_run_id
+                            )
+                        )
 
     def store_metric_summary_results(
         self, revision, ref_data, results, metrics_data,
@@ -1098,6 +1683,68 @@ class MetricsTestModel(DatazillaModelBase):
                 executemany=True,
                 )
 
+    def _get_stored_threshold(
+        self, m, revision, ref_data, values, placeholders,
+        threshold_test_run_id
+        ):
+        """
+        Return the get_threshold_data value of a metric datum from the
+        set_test_page_metric placeholders stored for it.
+        """
+        metric_value_names = dict(
+            map(lambda item: (item[1], item[0]), m.metric_values.items())
+            )
+
+        metric_values = {}
+        for placeholder in placeholders:
+            metric_values.setdefault(
+                metric_value_names[ placeholder[2] ], placeholder[4]
+                )
+
+        threshold_ref_data = self.extend_with_metrics_keys(
+            ref_data, ['test_run_id', 'test_name']
+            )
+        threshold_ref_data['revision'] = revision
+        threshold_ref_data['metric_id'] = m.get_metric_id()
+        threshold_ref_data['threshold_test_run_id'] = threshold_test_run_id
+
+        return {
+            'ref_data':threshold_ref_data,
+            'values':list(values),
+            'metric_values':metric_values
+            }
+
+    def set_metric_thresholds(self, thresholds):
+        """
+        Insert or update metric_threshold rows with a single bulk
+        upsert, thresholds is a list of get_threshold_data values in the
+        order to write them.
+        """
+        if not thresholds:
+            return
+
+        placeholders = []
+        for threshold in thresholds:
+            ref_data = threshold['ref_data']
+            placeholders.append([
+                ref_data['product_id'],
+                ref_data['operating_system_id'],
+                ref_data['processor'],
+                ref_data['build_type'],
+                ref_data['metric_id'],
+                ref_data['test_id'],
+                ref_data['page_id'],
+                ref_data['test_run_id'],
+                ref_data['revision']
+                ])
+
+        self.sources["perftest"].dhub.execute(
+            proc='perftest.inserts.set_metric_thresholds',
+            debug_show=self.DEBUG,
+            placeholders=placeholders,
+            executemany=True,
+            )
+
     def insert_or_update_metric_threshold(
         self, revision, ref_data, metric_id
         ):
@@ -1136,8 +1783,16 @@ class MetricsTestModel(DatazillaModelBase):
             )
 
     def load_test_data_all_dimensions(
-        self, test_run_ids, replicate_filters={}):
+        self, test_run_ids, replicate_filters={}, test_runs=None):
+        """
+        Compute and load the test_data_all_dimensions rows of a list of
+        test run ids, return the revisions without push data.
 
+        test_runs - Optional PerformanceTestModel.get_loaded_test_runs
+            dictionary.  The mean and std of the test runs it holds are
+            computed from their replicates in memory, the remaining test
+            runs are read back from test_value.
+        """
         if not test_run_ids:
             return {}
 
@@ -1176,37 +1831,55 @@ class MetricsTestModel(DatazillaModelBase):
         for c in ordered_columns:
             columns[c] = None
 
+        if not replicate_filters:
+            replicate_filters = self.get_replicate_filters()
+
+        computed_means = []
+
         ####
-        # Extract:  compute mean/std from replicates
+        # Extract:  compute mean/std from the replicates of test runs
+        # loaded in memory
         ####
-        where_in_clause = ','.join(
-            map( lambda v:'%s', test_run_ids )
-            )
+        if test_runs:
+
+            computed_means = self.get_computed_means_from_test_runs(
+                map(lambda id:test_runs[id],
+                    filter(lambda id:id in test_runs, test_run_ids)),
+                replicate_filters
+                )
+
+            test_run_ids = filter(lambda id:id not in test_runs, test_run_ids)
 
         ####
-        #Conditional replicate filtering is required for different
-        #project/test combinations. At this point we need to know the
-        #test name to test_run_id associations to determine what type
-        #of filtering is required.
+        # Extract:  compute mean/std from replicates
         ####
-        test_names = self.sources["perftest"].dhub.execute(
-            proc='perftest.selects.get_test_names_by_test_run_ids',
-            debug_show=self.DEBUG,
-            placeholders=list(test_run_ids),
-            replace=[where_in_clause],
-            key_column='id',
-            return_type='dict')
+        if test_run_ids:
 
-        if not replicate_filters:
-            replicate_filters = self.get_replicate_filters()
+            where_in_clause = ','.join(
+                map( lambda v:'%s', test_run_ids )
+                )
 
-        for id in test_run_ids:
-            try:
-                replicate_filters[ self.project ][ test_names[id]['name'] ]['ids'].append(id)
-            except KeyError:
-                replicate_filters[ "default" ]["test"]['ids'].append(id)
+            ####
+            #Conditional replicate filtering is required for different
+            #project/test combinations. At this point we need to know the
+            #test name to test_run_id associations to determine what type
+            #of filtering is required.
+            ####
+            test_names = self.sources["perftest"].dhub.execute(
+                proc='perftest.selects.get_test_names_by_test_run_ids',
+                debug_show=self.DEBUG,
+                placeholders=list(test_run_ids),
+                replace=[where_in_clause],
+                key_column='id',
+                return_type='dict')
 
-        computed_means = self.get_computed_means(replicate_filters)
+            for id in test_run_ids:
+                try:
+                    replicate_filters[ self.project ][ test_names[id]['name'] ]['ids'].append(id)
+                except KeyError:
+                    replicate_filters[ "default" ]["test"]['ids'].append(id)
+
+            computed_means += self.get_computed_means(replicate_filters)
 
         aggregate_data = {}
 
@@ -1239,6 +1912,15 @@ class MetricsTestModel(DatazillaModelBase):
 
             aggregate_data[key]['mean'] = d['mean']
             aggregate_data[key]['std'] = d['std']
+            aggregate_data[key]['n_replicates'] = d['n_replicates']
+
+            #Sample standard deviation used by the metric method
+            aggregate_data[key]['stddev'] = d['stddev']
+
+        ####
+        # Evaluate: fill the metric columns against the trend lines
+        ####
+        self.evaluate_all_dimensions(aggregate_data.values())
 
         #Build structure for the list of revisions to use to
         #retrieve associated push data
@@ -1269,8 +1951,174 @@ class MetricsTestModel(DatazillaModelBase):
             executemany=True,
             placeholders=executemany_placeholders)
 
+        self.bump_all_dimensions_generation()
+
         return revisions_without_push_data
 
+    def evaluate_all_dimensions(self, rows):
+        """
+        Fill the h0_rejected, p, fdr, trend_mean, trend_std and
+        test_evaluation columns of test_data_all_dimensions rows by
+        testing each row against the trend line of its metric datum,
+        then store the updated trend lines in test_data_trend.
+
+        rows - List of test_data_all_dimensions column dictionaries that
+            also contain processor, build_type, n_replicates and stddev,
+            the sample standard deviation of the replicates.
+
+        Only summary statistics are used, the replicates are not read.
+        The test runs in rows are folded into the trend lines in
+        date_received order.  A metric datum without a trend line starts
+        one and its metric columns are left NULL.
+        """
+        trends = self.get_test_data_trends(rows)
+
+        test_runs = {}
+        for row in rows:
+            test_runs.setdefault(row['test_run_id'], []).append(row)
+
+        test_run_ids = sorted(
+            test_runs,
+            key=lambda id: (test_runs[id][0]['date_received'], id)
+            )
+
+        updated_keys = set()
+
+        for test_run_id in test_run_ids:
+
+            test_run_rows = test_runs[test_run_id]
+
+            m = self.mf.get_metric_method(test_run_rows[0]['test_name'])
+
+            summaries = { 'n':[], 'mean':[], 'stddev':[] }
+            trend_summaries = { 'n':[], 'mean':[], 'stddev':[] }
+
+            for row in test_run_rows:
+
+                summaries['n'].append(row['n_replicates'])
+                summaries['mean'].append(row['mean'])
+                summaries['stddev'].append(row['stddev'])
+
+                trend = trends.get(self.get_metrics_key(row), {})
+
+                trend_summaries['n'].append( trend.get('trend_n', nan) )
+                trend_summaries['mean'].append( trend.get('trend_mean', nan) )
+                trend_summaries['stddev'].append(
+                    trend.get('trend_std', nan) )
+
+            results = m.run_trend_evaluation(summaries, trend_summaries)
+
+            for i, row in enumerate(test_run_rows):
+
+                if results['tested'][i]:
+                    row['p'] = float( results['p'][i] )
+                    row['h0_rejected'] = int( results['h0_rejected'][i] )
+                    row['fdr'] = int( results['fdr'][i] )
+                    row['test_evaluation'] = int(
+                        results['test_evaluation'][i] )
+
+                if isnan( results['trend_mean'][i] ):
+                    #Not enough data to start a trend line
+                    continue
+
+                row['trend_mean'] = float( results['trend_mean'][i] )
+                row['trend_std'] = float( results['trend_stddev'][i] )
+
+                if not results['trend_updated'][i]:
+                    continue
+
+                key = self.get_metrics_key(row)
+
+                trends[key] = self.extend_with_metrics_keys(row)
+                trends[key]['test_run_id'] = test_run_id
+                trends[key]['trend_mean'] = row['trend_mean']
+                trends[key]['trend_std'] = row['trend_std']
+                trends[key]['trend_n'] = float( results['trend_n'][i] )
+
+                updated_keys.add(key)
+
+        self.set_test_data_trends(
+            map( lambda k:trends[k], sorted(updated_keys) )
+            )
+
+    def get_test_data_trends(self, ref_data_list):
+        """
+        Retrieve the test_data_trend rows of every metric key in
+        ref_data_list with a single query.
+
+        ref_data_list - List of dictionaries containing all METRIC_KEYS
+            and their associated values.
+
+        returns the following dictionary:
+
+            metric_key : {
+                all self.METRIC_KEYS: associated id,
+                test_run_id:last test run folded into the trend line,
+                trend_mean:mean,
+                trend_std:standard deviation,
+                trend_n:number of replicates
+            }
+        """
+        metric_keys = {}
+        for ref_data in ref_data_list:
+            metric_keys.setdefault(self.get_metrics_key(ref_data), ref_data)
+
+        if not metric_keys:
+            return {}
+
+        where_clauses = []
+        placeholders = []
+
+        for key in sorted(metric_keys):
+
+            where_clauses.append( '(' + ' AND '.join(
+                map( lambda c:'tdt.' + c + ' = %s', self.METRIC_KEYS )
+                ) + ')' )
+
+            placeholders.extend(
+                map( lambda c:metric_keys[key][c], self.METRIC_KEYS )
+                )
+
+        trend_data = self.sources["perftest"].dhub.execute(
+            proc='perftest.selects.get_test_data_trends',
+            debug_show=self.DEBUG,
+            placeholders=placeholders,
+            replace=[ ' OR '.join(where_clauses) ],
+            return_type='tuple',
+            )
+
+        trends = {}
+        for d in trend_data:
+            trends[ self.get_metrics_key(d) ] = d
+
+        return trends
+
+    def set_test_data_trends(self, trends):
+        """
+        Insert or update test_data_trend rows, trends is a list of
+        get_test_data_trends dictionaries.
+        """
+        if not trends:
+            return
+
+        placeholders = []
+        for trend in trends:
+            placeholders.append(
+                map( lambda c:trend[c], self.METRIC_KEYS ) + [
+                    trend['test_run_id'],
+                    trend['trend_mean'],
+                    trend['trend_std'],
+                    trend['trend_n']
+                    ]
+                )
+
+        self.sources["perftest"].dhub.execute(
+            proc='perftest.inserts.set_test_data_trend',
+            debug_show=self.DEBUG,
+            placeholders=placeholders,
+            executemany=True,
+            )
+
     def get_replicate_filters(self):
 
         ####
@@ -1278,7 +2126,9 @@ class MetricsTestModel(DatazillaModelBase):
         #for what replicates can be used in the calculation of the mean.
         #This data structure maps the project/test requirements to a function
         #reference, get_computed_means, that can be used for calculating the
-        #the mean for a list of test_run_ids.
+        #the mean for a list of test_run_ids.  start_index is the number of
+        #leading replicates the same filter excludes when the mean is
+        #computed in memory by get_computed_means_from_test_runs.
         ####
         return {
 
@@ -1286,21 +2136,25 @@ class MetricsTestModel(DatazillaModelBase):
 
                 "tp5o": {
                     "get_computed_means":self.exclude_first_replicate_from_mean,
+                    "start_index":1,
                     "ids":[]
                     },
 
                 "Talos tp5r": {
                     "get_computed_means":self.exclude_first_replicate_from_mean,
+                    "start_index":1,
                     "ids":[]
                     },
 
                 "Talos tp5n": {
                     "get_computed_means":self.exclude_first_replicate_from_mean,
+                    "start_index":1,
                     "ids":[]
                     },
 
                 "tp5n": {
                     "get_computed_means":self.exclude_first_replicate_from_mean,
+                    "start_index":1,
                     "ids":[]
                     },
                 },
@@ -1308,11 +2162,73 @@ class MetricsTestModel(DatazillaModelBase):
             "default": {
                 "test":{
                     "get_computed_means":self.get_mean_from_all_replicates,
+                    "start_index":0,
                     "ids":[]
                     }
                 }
             }
 
+    def get_computed_means_from_test_runs(self, test_runs, replicate_filters):
+        """
+        Compute the get_computed_means rows of a list of
+        PerformanceTestModel.get_loaded_test_runs test runs with NumPy,
+        applying the start_index of the test run's replicate filter.
+        The aggregates match the perftest.selects queries.
+        """
+        computed_means = []
+
+        for test_run in test_runs:
+
+            try:
+                replicate_filter = replicate_filters[ self.project ][ test_run['test_name'] ]
+            except KeyError:
+                replicate_filter = replicate_filters[ "default" ]["test"]
+
+            start_index = replicate_filter['start_index']
+
+            for page_id in sorted(test_run['replicates']):
+
+                values = numpy.asarray(
+                    map(lambda r:r[1],
+                        filter(lambda r:r[0] > start_index,
+                               test_run['replicates'][page_id])),
+                    dtype=float
+                    )
+
+                #No replicates left after filtering, no row
+                if not len(values):
+                    continue
+
+                d = dict(
+                    (k, test_run[k]) for k in [
+                        'test_run_id', 'revision', 'test_id', 'date_run',
+                        'product_id', 'operating_system_id',
+                        'machine_name', 'operating_system_name',
+                        'operating_system_version', 'product_name',
+                        'product_branch', 'product_version', 'processor',
+                        'build_type', 'test_name'
+                        ]
+                    )
+
+                d['page_id'] = page_id
+                d['page_name'] = test_run['pages'][page_id]
+                d['date'] = test_run['date_run']
+
+                #ROUND( AVG(value), 2 ) and ROUND( STDDEV(value), 2 )
+                d['mean'] = round( values.mean(), 2 )
+                d['std'] = round( values.std(), 2 )
+
+                #STDDEV_SAMP(value) is NULL for a single replicate
+                d['stddev'] = None
+                if len(values) > 1:
+                    d['stddev'] = values.std(ddof=1)
+
+                d['n_replicates'] = len(values)
+
+                computed_means.append(d)
+
+        return computed_means
+
     def get_computed_means(self, replicate_filters):
 
         #aggregate ids by test name
@@ -1360,10 +2276,26 @@ class MetricsTestModel(DatazillaModelBase):
 
     def get_data_all_dimensions(
         self, product, branch, os, os_version, test, page, start_time,
-        stop_time):
-
+        stop_time, rollup=None, stream=False):
+        """
+        Return the test_data_all_dimensions rows matching the filters.
+        With ``stream`` data['data'] is a generator of row batches, see
+        SQLDataSource.execute_stream.
+
+        rollup - One of ALL_DIMENSION_ROLLUPS to return the rollups of the
+            series instead of the test runs, None (the default) for the
+            test runs.  'auto' returns the daily rollups for time ranges
+            longer than DATAZILLA_ALL_DIMENSIONS_ROLLUP_RANGE.
+            data['rollup'] holds the rollup returned, if any.
+        """
         data = self.get_all_dimension_data_range(start_time, stop_time)
 
+        if rollup == 'auto':
+            rollup = None
+            if ( int(data['stop']) - int(data['start']) >
+                 settings.DATAZILLA_ALL_DIMENSIONS_ROLLUP_RANGE ):
+                rollup = 'daily'
+
         column_value_map = [
             ['product', product],
             ['branch', branch],
@@ -1386,14 +2318,166 @@ class MetricsTestModel(DatazillaModelBase):
         placeholders.append(data['start'])
         placeholders.append(data['stop'])
 
+        proc = 'perftest.selects.get_test_data_all_dimensions'
+
+        if rollup:
+            proc = 'perftest.selects.get_test_data_{0}_rollups'.format(rollup)
+            data['rollup'] = rollup
+            data['column_key'] = MetricsTestModel.ALL_DIMENSION_ROLLUP_COLUMN_KEY
+
+        if stream:
+            data['data'] = self.sources["perftest"].execute_stream(
+                proc=proc,
+                debug_show=self.DEBUG,
+                placeholders=placeholders,
+                replace=[replace])
+
+            return data
+
         data['data'] = self.sources["perftest"].dhub.execute(
-            proc='perftest.selects.get_test_data_all_dimensions',
+            proc=proc,
             debug_show=self.DEBUG,
             placeholders=placeholders,
             replace=[replace])
 
         return data
 
+    @classmethod
+    def get_all_dimension_columns(cls, rollup=None):
+        """Return the columns of get_data_all_dimensions for a rollup."""
+        if rollup:
+            return cls.ALL_DIMENSION_ROLLUP_COLUMNS[rollup]
+        return cls.ALL_DIMENSION_COLUMNS
+
+    @classmethod
+    def get_downsampled_data(cls, rows, max_points, rollup=None):
+        """
+        Return get_data_all_dimensions rows with at most max_points rows
+        per series, ALL_DIMENSION_SERIES_COLUMNS.  The rows kept are
+        chosen by get_lttb_indexes from the means of the series ordered
+        by push date, falling back to the date received, and stay in
+        their original order.
+
+        rollup - The rollup of the rows, if any.
+        """
+        def get_x(row):
+            if rollup == 'daily':
+                return (row['d'], 0)
+            return (row.get('pd') or row['dr'], row.get('dr', 0))
+
+        series = {}
+        for index, row in enumerate(rows):
+            key = tuple( row[c] for c in cls.ALL_DIMENSION_SERIES_COLUMNS )
+            series.setdefault(key, []).append(index)
+
+        selected = []
+        for indexes in series.values():
+
+            if len(indexes) > max_points:
+
+                indexes.sort(key=lambda i:get_x(rows[i]))
+
+                x = numpy.array(
+                    map(lambda i:get_x(rows[i])[0], indexes), dtype=float )
+                y = numpy.array(
+                    map(lambda i:rows[i]['m'], indexes), dtype=float )
+
+                indexes = map(
+                    lambda i:indexes[i], cls.get_lttb_indexes(x, y, max_points)
+                    )
+
+            selected.extend(indexes)
+
+        return map(lambda i:rows[i], sorted(selected))
+
+    @staticmethod
+    def get_lttb_indexes(x, y, max_points):
+        """
+        Return the indexes of at most max_points points of the series x, y
+        selected with the largest triangle three buckets algorithm.  x must
+        be sorted, the first and last points are always selected.
+
+        The points between the first and the last are split into
+        max_points - 2 buckets, the point selected from a bucket is the one
+        forming the largest triangle with the point selected from the
+        previous bucket and the average point of the next bucket.
+        """
+        length = len(x)
+
+        if length <= max_points:
+            return range(length)
+
+        if max_points < 3:
+            return [0, length - 1][:max_points]
+
+        #Bucket boundaries, the first and last points are buckets of
+        #their own
+        edges = numpy.floor(
+            numpy.linspace(1, length - 1, max_points - 1)
+            ).astype(int)
+        edges = numpy.append(edges, length)
+
+        selected = [0]
+        for bucket in range(max_points - 2):
+
+            start, end = edges[bucket], edges[bucket + 1]
+            next_start, next_end = end, edges[bucket + 2]
+
+            average_x = x[next_start:next_end].mean()
+            average_y = y[next_start:next_end].mean()
+
+            previous = selected[-1]
+
+            areas = numpy.abs(
+                (x[previous] - average_x) * (y[start:end] - y[previous]) -
+                (x[previous] - x[start:end]) * (average_y - y[previous])
+                )
+
+            selected.append( start + int(areas.argmax()) )
+
+        selected.append(length - 1)
+
+        return selected
+
+    @classmethod
+    def get_columnar_data(cls, rows, columns=None):
+        """
+        Return get_test_data_all_dimensions rows as one list per column.
+
+        columns - List of ALL_DIMENSION_COLUMNS to return, defaults to
+            all of them.
+
+        The values of ALL_DIMENSION_DICTIONARY_COLUMNS are replaced by
+        their index in the list of distinct values of the column, in
+        order of first appearance:
+
+            {
+                'length':number of rows,
+                'columns':{ column: [ value1, value2, ... ], ... },
+                'dictionaries':{ column: [ distinct value, ... ], ... }
+            }
+        """
+        data = { 'length':len(rows), 'columns':{}, 'dictionaries':{} }
+
+        for column in columns or cls.ALL_DIMENSION_COLUMNS:
+
+            values = map(lambda row: row[column], rows)
+
+            if column in cls.ALL_DIMENSION_DICTIONARY_COLUMNS:
+
+                indexes = {}
+                values = map(
+                    lambda v: indexes.setdefault(v, len(indexes)), values
+                    )
+
+                data['dictionaries'][column] = sorted(
+                    indexes, key=indexes.get
+                    )
+
+            data['columns'][column] = values
+
+        return data
+
     def get_platforms_and_tests(self, product, branch, date_begin, date_end):
 
         data = self.get_all_dimension_data_range(date_begin, date_end)
@@ -1443,41 +2527,246 @@ class MetricsTestModel(DatazillaModelBase):
 
         return data
 
+    @staticmethod
+    def get_all_dimensions_time_bucket(start_time, stop_time):
+        """
+        Return start_time rounded down and stop_time rounded up to the
+        boundaries of DATAZILLA_ALL_DIMENSIONS_CACHE_BUCKET, a time that
+        is not supplied stays None.
+        """
+        bucket = settings.DATAZILLA_ALL_DIMENSIONS_CACHE_BUCKET
+
+        if start_time:
+            start_time = int(start_time) - (int(start_time) % bucket)
+
+        if stop_time:
+            stop_time = int(stop_time) + (-int(stop_time) % bucket)
+
+        return start_time or None, stop_time or None
+
+    def get_all_dimensions_generation(self):
+        """
+        Return the generation of the project's test_data_all_dimensions
+        rows, it is part of every result cache key.
+        """
+        cache_key = self.get_project_cache_key('all_dimensions_generation')
+
+        generation = cache.get(cache_key)
+
+        if generation is None:
+            #Start from the current time in milliseconds, the entries of
+            #an evicted counter must not become valid again
+            cache.add(cache_key, int(time.time() * 1000))
+            generation = cache.get(cache_key)
+
+        return generation
+
+    def bump_all_dimensions_generation(self):
+        """Invalidate the cached test_data_all_dimensions results."""
+        cache_key = self.get_project_cache_key('all_dimensions_generation')
+
+        try:
+            cache.incr(cache_key)
+        except ValueError:
+            #There is no counter to bump, the next
+            #get_all_dimensions_generation starts a new one
+            pass
+
+    def get_all_dimensions_cache_key(self, name, fingerprint):
+        """
+        Return the cache key of a test_data_all_dimensions result.  The key
+        holds the current generation, callers compute it once before
+        reading the data and use it for both the cache read and write, so
+        data read before a generation bump is never cached under the new
+        generation.
+
+        name - Name of the result, the data all dimensions method that
+            computed it.
+        fingerprint - List of the parameters of the query, empty strings
+            are treated like None.
+        """
+        normalized = []
+        for value in fingerprint:
+            if isinstance(value, basestring):
+                value = value.strip() or None
+            normalized.append(value)
+
+        digest = hashlib.sha1(json.dumps(normalized)).hexdigest()
+
+        return self.get_project_cache_key(
+            "all_dimensions_{0}_{1}_{2}".format(
+                self.get_all_dimensions_generation(), name, digest
+                )
+            )
+
+    def get_cached_all_dimension_data(self, cache_key):
+        """
+        Return a cached test_data_all_dimensions result or None, see
+        get_all_dimensions_cache_key.
+        """
+        compressed_json_data = cache.get(cache_key)
+
+        if not compressed_json_data:
+            return None
+
+        return json.loads( zlib.decompress( compressed_json_data ) )
+
+    def cache_all_dimension_data(self, cache_key, data):
+        """
+        Compress and cache a test_data_all_dimensions result.  Results
+        larger than the memcached item size are not stored.
+        """
+        cache.set(cache_key, zlib.compress( json.dumps(data) ))
+
     def set_push_data_all_dimensions(self, revision_nodes):
+        """
+        Apply push data to test_data_all_dimensions in one statement.
 
+        ``revision_nodes`` maps (revision, branch) pairs to the push data
+        returned by PushLogModel.get_nodes_from_revisions.  Rows are
+        matched on the branch name and alternate name of the push.
+        """
         placeholders = []
+        derived_rows = []
 
-        for revision in revision_nodes:
+        for revision, branch in revision_nodes:
 
-            if not revision_nodes[revision]:
+            node = revision_nodes[ (revision, branch) ]
+
+            if not node:
                 continue
 
-            if 'alt_name' in revision_nodes[revision]:
-                placeholders.append(
-                    [ revision_nodes[revision]['pushlog_id'],
-                      revision_nodes[revision]['date'],
-                      revision,
-                      revision_nodes[revision]['alt_name']
-                        ]
+            for branch_name in set([ node['name'], node.get('alt_name') ]):
+
+                if not branch_name:
+                    continue
+
+                placeholders.extend(
+                    [ revision, branch_name, node['pushlog_id'], node['date'] ]
                     )
 
-            placeholders.append(
-                [ revision_nodes[revision]['pushlog_id'],
-                  revision_nodes[revision]['date'],
-                  revision,
-                  revision_nodes[revision]['name']
-                    ]
-                )
+                if derived_rows:
+                    derived_rows.append('SELECT %s, %s, %s, %s')
+                else:
+                    derived_rows.append(
+                        'SELECT %s AS revision, %s AS branch, '
+                        '%s AS pushlog_id, %s AS push_date')
+
+        if not derived_rows:
+            return
 
-        proc = 'perftest.inserts.set_push_data_all_dimension'
+        proc = 'perftest.inserts.set_push_data_all_dimensions_bulk'
 
         self.sources["perftest"].dhub.execute(
             proc=proc,
             debug_show=self.DEBUG,
             placeholders=placeholders,
-            executemany=True,
+            replace=[ ' UNION ALL '.join(derived_rows) ],
+            )
+
+        self.bump_all_dimensions_generation()
+
+    def set_test_data_rollups(self, test_run_ids):
+        """
+        Recompute the daily and push rollups of the series and days, or
+        pushes, of a list of test run ids loaded in
+        test_data_all_dimensions.  Push rollups are only computed for
+        test runs with push data.
+        """
+        if not test_run_ids:
+            return
+
+        condition = '`test_run_id` IN ({0})'.format(
+            ','.join( map(lambda v:'%s', test_run_ids) )
             )
 
+        self._set_test_data_rollups(condition, test_run_ids)
+
+    def repair_test_data_rollups(self, date_begin, date_end):
+        """
+        Recompute the rollups of the test runs received between the UTC
+        days of date_begin and date_end, excluding the day of date_end.
+        The daily rollups of the days are deleted first, so rollups of
+        test runs no longer in test_data_all_dimensions are removed.
+        """
+        date_begin = date_begin - (date_begin % 86400)
+        date_end = date_end - (date_end % 86400)
+
+        self.sources["perftest"].dhub.execute(
+            proc='perftest.deletes.delete_daily_rollups',
+            debug_show=self.DEBUG,
+            placeholders=[date_begin, date_end])
+
+        self._set_test_data_rollups(
+            '`date_received` >= %s AND `date_received` < %s',
+            [date_begin, date_end]
+            )
+
+    def _set_test_data_rollups(self, condition, placeholders):
+        """
+        Recompute the rollups of the test_data_all_dimensions rows
+        selected by the SQL condition.
+        """
+        date_updated = int(time.time())
+
+        for rollup in self.ALL_DIMENSION_ROLLUPS:
+
+            rows = self.sources["perftest"].dhub.execute(
+                proc='perftest.selects.get_{0}_rollup_rows'.format(rollup),
+                debug_show=self.DEBUG,
+                placeholders=placeholders,
+                replace=[condition])
+
+            rollups = self.get_rollups(rows, rollup, date_updated)
+
+            if not rollups:
+                continue
+
+            self.sources["perftest"].dhub.execute(
+                proc='perftest.inserts.set_{0}_rollups'.format(rollup),
+                debug_show=self.DEBUG,
+                executemany=True,
+                placeholders=rollups)
+
+        self.bump_all_dimensions_generation()
+
+    def get_rollups(self, rows, rollup, date_updated):
+        """
+        Aggregate the means of get_daily_rollup_rows or get_push_rollup_rows
+        rows, return the placeholders of set_daily_rollups or
+        set_push_rollups.
+        """
+        group_keys = self.ROLLUP_GROUP_KEYS[rollup]
+
+        groups = {}
+        for row in rows:
+            key = tuple( row[k] for k in self.METRIC_KEYS + group_keys[:1] )
+            groups.setdefault(key, []).append(row)
+
+        rollups = []
+        for key in sorted(groups):
+
+            group = sorted(groups[key], key=lambda row:row['date_received'])
+
+            #The names and the push data of the last test run received
+            #describe the group
+            last = group[-1]
+
+            values = numpy.array( map(lambda row:row['mean'], group) )
+
+            std = 0
+            if len(values) > 1:
+                std = values.std(ddof=1)
+
+            rollups.append(
+                map(lambda k:last[k], self.METRIC_KEYS + group_keys) +
+                map(lambda k:last[k], self.ROLLUP_NAME_KEYS) +
+                [ len(values), values.mean(), values.min(), values.max(),
+                  std, numpy.median(values), date_updated ]
+                )
+
+        return rollups
+
     def log_msg(self, revision, test_run_id, msg_type, msg):
 
         proc = 'perftest.inserts.set_application_msg'
@@ -1550,6 +2839,13 @@ class MetricsTestModel(DatazillaModelBase):
         ##TODO: Finish this function or remove it
 
     def _get_metric_collection(self):
+        """
+        Return the metric collection of the project, it is only
+        retrieved once per process.
+        """
+        if self.project in self.metric_collections:
+            return self.metric_collections[self.project]
+
         proc = 'perftest.selects.get_metric_collection'
 
         metric_collection = self.sources["perftest"].dhub.execute(
@@ -1558,36 +2854,208 @@ class MetricsTestModel(DatazillaModelBase):
             key_column='metric_name',
             return_type='tuple',
             )
+
+        self.metric_collections[self.project] = metric_collection
+
         return metric_collection
 
+class MetricThresholdStore(object):
+    """
+    In memory metric thresholds of a threshold session, see
+    MetricsTestModel.begin_threshold_session.
+
+    Thresholds are held by metric key in the get_threshold_data format,
+    a threshold is only replaced by the results of a push with the same
+    or a later push date so thresholds never move backwards in time.
+    """
+
+    def __init__(self):
+
+        #metric key: threshold, None if the key has no threshold
+        self.thresholds = {}
+
+        #metric keys with a threshold set during the session
+        self.updated_keys = set()
+
+    def __contains__(self, key):
+        return key in self.thresholds
+
+    def load(self, keys, threshold_data):
+        """
+        Add the thresholds retrieved for keys, keys without a threshold
+        in threshold_data are remembered so they are not retrieved
+        again.
+        """
+        for key in keys:
+            self.thresholds.setdefault(key, threshold_data.get(key, None))
+
+    def get(self, keys):
+        """Return the get_threshold_data_bulk dictionary of keys."""
+        threshold_data = {}
+        for key in keys:
+            if self.thresholds.get(key, None):
+                threshold_data[key] = self.thresholds[key]
+        return threshold_data
+
+    def update(self, key, threshold):
+        """
+        Make threshold the threshold of key unless the current threshold
+        has a later push date.  Returns True if the threshold was set.
+        """
+        current = self.thresholds.get(key, None)
+
+        if current and \
+           self.get_push_date(threshold) < self.get_push_date(current):
+            return False
+
+        self.thresholds[key] = threshold
+        self.updated_keys.add(key)
+
+        return True
+
+    def discard(self, key):
+        """Forget key, the next read retrieves it again."""
+        self.thresholds.pop(key, None)
+        self.updated_keys.discard(key)
+
+    def get_updated_thresholds(self):
+        """Return the thresholds set during the session by push date."""
+        return sorted(
+            map(lambda key: self.thresholds[key], self.updated_keys),
+            key=lambda threshold: (
+                self.get_push_date(threshold),
+                threshold['ref_data']['test_run_id'],
+                threshold['ref_data']['page_id']
+                )
+            )
+
+    @staticmethod
+    def get_push_date(threshold):
+        return threshold['metric_values'].get('push_date', None) or 0
+
 class MetricsMethodFactory(object):
-    """Class instance factory for different metric methods"""
+    """
+    Class instance factory for different metric methods
+
+    Metric method classes are registered for project and test name
+    patterns with register_metric_method, TtestMethod is registered for
+    every test.
+    """
+
+    #Metric method registrations, the most recent registration first
+    registrations = []
+
+    #Metric index of every project used by the process, see
+    #get_metric_index
+    metric_indexes = {}
 
-    def __init__(self, metric_collection):
+    def __init__(self, metric_collection, project=None):
 
         self.metric_collection = metric_collection
 
+        self.project = project or ''
+
+        #Metric ids are resolved once for every metric method
+        if project and project in self.metric_indexes:
+            self.metric_index = self.metric_indexes[project]
+        else:
+            self.metric_index = self.get_metric_index(metric_collection)
+            if project:
+                self.metric_indexes[project] = self.metric_index
+
         #Holds reusable metric method instances
         self.metric_method_instances = dict()
 
+        #Registration used for every test name
+        self.test_registrations = dict()
+
+    @classmethod
+    def register_metric_method(
+        cls, method_class, test_pattern='*', project_pattern='*',
+        batch=None
+        ):
+        """
+        Use method_class for the tests with a name matching test_pattern
+        in the projects matching project_pattern, both are fnmatch
+        patterns.  A registration takes precedence over the earlier
+        ones so a method can be registered for a single suite over the
+        default.
+
+        batch - True if method_class implements run_metric_method_list,
+            defaults to method_class.SUPPORTS_BATCH.
+        """
+        if batch is None:
+            batch = method_class.SUPPORTS_BATCH
+
+        cls.registrations.insert(0, {
+            'method_class':method_class,
+            'test_pattern':test_pattern,
+            'project_pattern':project_pattern,
+            'batch':batch
+            })
+
+    @staticmethod
+    def get_metric_index(metric_collection):
+        """
+        Return the metric ids of a metric collection by metric name:
+
+            { metric_name: {
+                'metric_id':id,
+                'metric_values':{ metric_value_name: metric_value_id, ... }
+                }, ... }
+        """
+        metric_index = {}
+
+        for data in metric_collection:
+
+            metric = metric_index.setdefault(
+                data['metric_name'],
+                { 'metric_id':data['metric_id'], 'metric_values':{} }
+                )
+
+            metric['metric_values'][
+                data['metric_value_name']
+                ] = data['metric_value_id']
+
+        return metric_index
+
+    def get_registration(self, test_name):
+        """Return the metric method registration of test_name."""
+        if test_name not in self.test_registrations:
+
+            for registration in self.registrations:
+                if fnmatch(self.project, registration['project_pattern']) \
+                   and fnmatch(test_name or '', registration['test_pattern']):
+                    break
+            else:
+                msg = "No metric method registered for test, {0}".format(
+                    test_name
+                    )
+                raise MetricMethodError(msg)
+
+            self.test_registrations[test_name] = registration
+
+        return self.test_registrations[test_name]
+
+    def supports_batch(self, test_name):
+        """
+        Return True if the metric method of test_name can evaluate many
+        metric datums at once with run_metric_method_list.
+        """
+        return self.get_registration(test_name)['batch']
+
     def get_metric_method(self, test_name=None):
         """
         Returns the metric method instance associated with the test name
         provided.
         """
-        metric_method = None
+        metric_method = self.metric_method_instances.get(test_name, None)
 
-        #New metric method classes should be added to this
-        #conditional with their appropriate test_name condition.  The
-        #TtestMethod is the current default.
-        if test_name == 'Talos tp5n':
+        if metric_method is None:
+            method_class = self.get_registration(test_name)['method_class']
             metric_method = self.metric_method_instances.setdefault(
-                test_name, TtestMethod(self.metric_collection)
-                )
-        else:
-            #Default metric method for all test suites
-            metric_method = self.metric_method_instances.setdefault(
-                test_name, TtestMethod(self.metric_collection)
+                test_name,
+                method_class(self.metric_collection, self.metric_index)
                 )
 
         metric_method.set_test_name(test_name)
@@ -1614,6 +3082,59 @@ class MetricMethodInterface(object):
         """
         raise NotImplementedError(self.MSG)
 
+    def run_metric_method_list(
+        self, child_data_list, parent_data_list, parent_metric_data_list
+        ):
+        """
+        Run the metric method for a list of metric datums at once,
+        element i of every list belongs to the same metric datum.  Only
+        called for methods registered with batch support.
+
+        Returns the list of run_metric_method results, None for a
+        metric datum the method could not evaluate.
+        """
+        raise NotImplementedError(self.MSG)
+
+    def run_metric_method_batch(self, child_summaries, parent_summaries):
+        """
+        Run the metric method for many metric datums in one pass and
+        return results.  Element i of every input and output array
+        belongs to the same metric datum.
+
+        child_summaries = {
+            n:[ n_replicates1, n_replicates2, ... ],
+            mean:[ mean1, mean2, ... ],
+            stddev:[ stddev1, stddev2, ... ]
+            }
+        parent_summaries = The parent or trend line summaries, same
+            structure as child_summaries.
+
+        Returns a dictionary of arrays, the keys match the keys returned
+        by run_metric_method plus trend_mean and trend_stddev, the trend
+        line to store when the child passes.
+        """
+        raise NotImplementedError(self.MSG)
+
+    def run_trend_evaluation(self, summaries, trend_summaries):
+        """
+        Test the metric datums of a single test run against their trend
+        lines and return results.  Element i of every input and output
+        array belongs to the same metric datum.
+
+        summaries = The test run summaries, same structure as the
+            child_summaries of run_metric_method_batch.
+        trend_summaries = The trend line summaries, same structure as
+            summaries.  numpy.nan marks a metric datum without a trend
+            line.
+
+        Returns a dictionary of arrays with the keys p, h0_rejected, fdr,
+        test_evaluation and tested, True where the metric datum could
+        be tested, plus trend_mean, trend_stddev and trend_n, the trend
+        line of the metric datum after the test run, and trend_updated,
+        True where the test run moved or started the trend line.
+        """
+        raise NotImplementedError(self.MSG)
+
     def run_metric_summary(self, data):
         """
         Run the metric summary method and return results.
@@ -1720,7 +3241,10 @@ class MetricMethodInterface(object):
 class MetricMethodBase(MetricMethodInterface):
     """Base class for all metric methods"""
 
-    def __init__(self, metric_collection):
+    #True if the class implements run_metric_method_list
+    SUPPORTS_BATCH = False
+
+    def __init__(self, metric_collection, metric_index=None):
 
         if not self.NAME:
 
@@ -1748,6 +3272,17 @@ class MetricMethodBase(MetricMethodInterface):
         ####
         self.metric_collection = metric_collection
 
+        ####
+        # metric ids by metric name, see
+        # MetricsMethodFactory.get_metric_index
+        ####
+        if metric_index is None:
+            metric_index = MetricsMethodFactory.get_metric_index(
+                metric_collection
+                )
+
+        self.metric_index = metric_index
+
         self.metric_id = None
 
         self.metric_values = {}
@@ -1765,16 +3300,11 @@ class MetricMethodBase(MetricMethodInterface):
         'metric_value' table in the perftest schema or None if there is
         no metric summary for the method.
         """
+        metric = self.metric_index.get(self.NAME, None)
 
-        for data in self.metric_collection:
-            if data['metric_name'] == self.NAME:
-
-                if not self.metric_id:
-                    self.metric_id = data['metric_id']
-
-                self.metric_values[
-                    data['metric_value_name']
-                    ] = data['metric_value_id']
+        if metric:
+            self.metric_id = metric['metric_id']
+            self.metric_values = dict(metric['metric_values'])
 
         if not self.metric_values:
             msg = ("self.metric_values not set for, self.NAME={0}, for "
@@ -1807,12 +3337,20 @@ class TtestMethod(MetricMethodBase):
     NAME = 'welch_ttest'
     SUMMARY_NAME = 'fdr'
 
+    SUPPORTS_BATCH = True
+
     #Alpha value for ttests
     ALPHA = 0.05
 
-    def __init__(self, metric_collection):
+    #Metric values get_data_for_summary_storage needs from the
+    #metrics data of a datum
+    SUMMARY_LOOKUP_KEYS = set(
+        ['trend_mean', 'trend_stddev', 'stddev', 'mean']
+        )
+
+    def __init__(self, metric_collection, metric_index=None):
 
-        super(TtestMethod, self).__init__(metric_collection)
+        super(TtestMethod, self).__init__(metric_collection, metric_index)
 
         self.result_key = set([
             'p', 'h0_rejected', self.SUMMARY_NAME, 'pushlog_id',
@@ -1828,52 +3366,93 @@ class TtestMethod(MetricMethodBase):
             start_index = 1
         return start_index
 
-    def run_metric_method(
-        self, child_data, parent_data, parent_metric_data={}
-        ):
+    def get_replicate_summaries(self, replicates_list):
+        """
+        Return the n, mean and stddev arrays for run_metric_method_batch
+        from a list of replicate lists.
+        """
+        #Some tests require filtering out the first replicate here
+        start_index = self.get_start_index()
 
-        trend_stddev = parent_metric_data.get('trend_stddev', None)
-        trend_mean = parent_metric_data.get('trend_mean', None)
+        summaries = { 'n':[], 'mean':[], 'stddev':[] }
 
-        #Some tests require filtering out the first replicate here
+        for replicates in replicates_list:
+            summaries['n'].append( len(replicates[start_index:]) )
+            summaries['mean'].append( mean(replicates[start_index:]) )
+            summaries['stddev'].append(
+                std(replicates[start_index:], ddof=1) )
+
+        return summaries
+
+    def get_parent_summaries(self, parent_data_list, parent_metric_data_list):
+        """
+        Return the parent summaries for run_metric_method_batch, the
+        trend line of a parent is used when it has one, its replicates
+        otherwise.
+        """
         start_index = self.get_start_index()
 
-        if (trend_mean != None) and \
-           (trend_mean > 0) and \
-           (trend_stddev != None):
+        summaries = { 'n':[], 'mean':[], 'stddev':[] }
 
-            #trend line data is available use it
-            n = len(child_data[start_index:])
-            s = std(child_data[start_index:], ddof=1)
-            m = mean(child_data[start_index:])
+        for parent_data, parent_metric_data in zip(
+            parent_data_list, parent_metric_data_list ):
 
-            parent_n = len(parent_data[start_index:])
-            trend_stddev = parent_metric_data['trend_stddev']
-            trend_mean = parent_metric_data['trend_mean']
+            trend_stddev = parent_metric_data.get('trend_stddev', None)
+            trend_mean = parent_metric_data.get('trend_mean', None)
 
-            p_value = welchs_ttest_internal(
-                n, s, m, parent_n, trend_stddev, trend_mean
-                )
+            if (trend_mean != None) and \
+               (trend_mean > 0) and \
+               (trend_stddev != None):
 
-            #Map results to output structure of welchs_ttest
-            result = {
-                "p": p_value,
-                "stddev1":s,
-                "stddev2":trend_stddev,
-                "mean1":m,
-                "mean2":trend_stddev,
-                "h0_rejected":p_value < self.ALPHA
-                }
+                #trend line data is available use it
+                summaries['n'].append( len(parent_data[start_index:]) )
+                summaries['mean'].append( trend_mean )
+                summaries['stddev'].append( trend_stddev )
 
-        else:
-            #No trend line data is available use the parent
-            #replicate data
+            else:
+                #No trend line data is available use the parent
+                #replicate data
+                replicates = parent_data[start_index:]
+                summaries['n'].append( len(replicates) )
+                summaries['mean'].append( mean(replicates) )
+                summaries['stddev'].append( std(replicates, ddof=1) )
+
+        return summaries
 
-            result = welchs_ttest(
-                child_data[start_index:],
-                parent_data[start_index:],
-                self.ALPHA
+    def run_metric_method_list(
+        self, child_data_list, parent_data_list, parent_metric_data_list
+        ):
+
+        if not child_data_list:
+            return []
+
+        results = self.run_metric_method_batch(
+            self.get_replicate_summaries(child_data_list),
+            self.get_parent_summaries(
+                parent_data_list, parent_metric_data_list
                 )
+            )
+
+        result_list = []
+        for index in range(len(child_data_list)):
+            result = self._get_metric_method_result(results, index)
+            #A divide by zero makes p numpy.nan, see run_metric_method
+            if isnan( result['p'] ):
+                result = None
+            result_list.append(result)
+
+        return result_list
+
+    def run_metric_method(
+        self, child_data, parent_data, parent_metric_data={}
+        ):
+
+        results = self.run_metric_method_batch(
+            self.get_replicate_summaries([ child_data ]),
+            self.get_parent_summaries([ parent_data ], [ parent_metric_data ])
+            )
+
+        result = self._get_metric_method_result(results, 0)
 
         #####
         #If a divide by zero event occured the subsequent p value
@@ -1892,22 +3471,151 @@ class TtestMethod(MetricMethodBase):
 
         return result
 
+    def _get_metric_method_result(self, results, index):
+
+        #Map results to output structure of welchs_ttest
+        return {
+            "p": results['p'][index],
+            "stddev1": results['stddev1'][index],
+            "stddev2": results['stddev2'][index],
+            "mean1": results['mean1'][index],
+            "mean2": results['mean2'][index],
+            "h0_rejected": bool( results['h0_rejected'][index] )
+            }
+
+    def run_metric_method_batch(self, child_summaries, parent_summaries):
+
+        n1 = numpy.asarray(child_summaries['n'], dtype=float)
+        s1 = numpy.asarray(child_summaries['stddev'], dtype=float)
+        m1 = numpy.asarray(child_summaries['mean'], dtype=float)
+
+        n2 = numpy.asarray(parent_summaries['n'], dtype=float)
+        s2 = numpy.asarray(parent_summaries['stddev'], dtype=float)
+        m2 = numpy.asarray(parent_summaries['mean'], dtype=float)
+
+        p = self.welchs_ttest_batch(n1, s1, m1, n2, s2, m2)
+
+        #The trend line a passing child moves its parent trend to
+        es_result = exp_smooth(n1, s1, m1, n1, s2, m2)
+
+        return {
+            "p": p,
+            "h0_rejected": p < self.ALPHA,
+            "stddev1": s1,
+            "stddev2": s2,
+            "mean1": m1,
+            "mean2": m2,
+            "trend_mean": es_result['mean'],
+            "trend_stddev": es_result['stddev']
+            }
+
+    def run_trend_evaluation(self, summaries, trend_summaries):
+
+        n1 = numpy.asarray(summaries['n'], dtype=float)
+        s1 = numpy.asarray(summaries['stddev'], dtype=float)
+        m1 = numpy.asarray(summaries['mean'], dtype=float)
+
+        n2 = numpy.asarray(trend_summaries['n'], dtype=float)
+        s2 = numpy.asarray(trend_summaries['stddev'], dtype=float)
+        m2 = numpy.asarray(trend_summaries['mean'], dtype=float)
+
+        p = self.welchs_ttest_batch(n1, s1, m1, n2, s2, m2)
+
+        tested = ~numpy.isnan(p)
+
+        #The summary method is applied to the p values of the test run
+        fdr = numpy.zeros(len(p), dtype=bool)
+        if tested.any():
+            fdr[tested] = self.fdr_rejector_batch( p[tested] )
+
+        passed = tested & ~fdr
+
+        #A passing test run moves the trend line, a failing one leaves
+        #it in place
+        es_result = exp_smooth(n1, s1, m1, n2, s2, m2)
+
+        trend_mean = numpy.where(passed, es_result['mean'], m2)
+        trend_stddev = numpy.where(passed, es_result['stddev'], s2)
+        trend_n = numpy.where(passed, es_result['n'], n2)
+
+        #Start the trend line of metric datums without one
+        start = numpy.isnan(m2) & ~numpy.isnan(s1)
+
+        trend_mean = numpy.where(start, m1, trend_mean)
+        trend_stddev = numpy.where(start, s1, trend_stddev)
+        trend_n = numpy.where(start, n1, trend_n)
+
+        return {
+            "p": p,
+            "h0_rejected": p < self.ALPHA,
+            "fdr": fdr,
+            "test_evaluation": passed,
+            "tested": tested,
+            "trend_mean": trend_mean,
+            "trend_stddev": trend_stddev,
+            "trend_n": trend_n,
+            "trend_updated": passed | start
+            }
+
+    @staticmethod
+    def welchs_ttest_batch(n1, s1, m1, n2, s2, m2):
+        """
+        Array version of dzmetrics.ttest.welchs_ttest_internal, returns
+        the one-sided p values of every element in a single pass.  Any
+        division by zero results in numpy.nan for that element.
+        """
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            v1 = numpy.power(s1, 2)
+            v2 = numpy.power(s2, 2)
+            vpooled = v1/n1 + v2/n2
+            spooled = numpy.sqrt(vpooled)
+            tt = (m1 - m2)/spooled
+            df_numerator = numpy.power(vpooled, 2)
+            df_denominator = numpy.power(v1/n1, 2)/(n1 - 1) + \
+                numpy.power(v2/n2, 2)/(n2 - 1)
+            df = df_numerator/df_denominator
+
+            return 1 - t.cdf(tt, df)
+
+    @staticmethod
+    def fdr_rejector_batch(p_values, q=0.05):
+        """
+        Array version of dzmetrics.fdr.rejector, returns the
+        Benjamini-Hochberg rejection mask of p_values as a boolean array.
+        Equal p values are ranked in input order, as in rejector.
+        """
+        p = numpy.asarray(p_values, dtype=float)
+
+        status = numpy.zeros(len(p), dtype=bool)
+
+        if not len(p):
+            return status
+
+        order = numpy.argsort(p, kind='mergesort')
+
+        cutoff = numpy.arange(1, len(p) + 1)*q/len(p)
+
+        #Every p value up to the largest one under its cutoff is rejected
+        below = numpy.flatnonzero(p[order] < cutoff)
+        if len(below):
+            status[ order[:below[-1] + 1] ] = True
+
+        return status
+
     def run_metric_summary(self, data):
 
         filtered_data = self.filter_by_metric_value_name(data)
-        rejector_data = rejector(filtered_data['values'])
 
-        filtered_data['values']
+        status = self.fdr_rejector_batch(filtered_data['values'])
 
-        results = []
-        for s, d in zip( rejector_data['status'], filtered_data['list'] ):
-
-            rd = copy.copy(d)
-            rd['metric_value_name'] = self.SUMMARY_NAME
-            rd['metric_value_id'] = self.metric_values[self.SUMMARY_NAME]
-            rd['value'] = s
+        metric_value_id = self.metric_values[self.SUMMARY_NAME]
 
-            results.append(rd)
+        results = []
+        for s, d in zip( status.tolist(), filtered_data['list'] ):
+            results.append(
+                dict(d, metric_value_name=self.SUMMARY_NAME,
+                     metric_value_id=metric_value_id, value=s)
+                )
 
         return results
 
@@ -1969,6 +3677,13 @@ class TtestMethod(MetricMethodBase):
 
         placeholders = []
 
+        #Retrieve required values, they are the same for every result
+        lookup = self._get_summary_data_lookup(metrics_data)
+
+        parent_lookup = {}
+        if parent_data:
+            parent_lookup = self._get_summary_data_lookup(parent_data)
+
         for d in result:
             #Convert booleans to 0 or 1 for database storage
             value = int(d['value'])
@@ -1987,10 +3702,8 @@ class TtestMethod(MetricMethodBase):
                 { d['metric_value_name']: d['value'] }
                 )
 
-            #Retrieve required values
-            lookup = self._get_summary_data_lookup(metrics_data)
             trend_mean = lookup.get('trend_mean', None)
-            trend_stddev = lookup.get('trend_mean', None)
+            trend_stddev = lookup.get('trend_stddev', None)
 
             #This variable represents whether the test passes or fails,
             #its value is ultimately determined by the results of
@@ -2026,12 +3739,8 @@ class TtestMethod(MetricMethodBase):
                     #First time the t-test has been run for this metric
                     #datum, initialize the trend line
                     if parent_data:
-                        p_lookup = self._get_summary_data_lookup(
-                            parent_data
-                            )
-
-                        p_stddev = p_lookup.get('stddev', None)
-                        p_mean = p_lookup.get('mean', None)
+                        p_stddev = parent_lookup.get('stddev', None)
+                        p_mean = parent_lookup.get('mean', None)
 
                         if (p_mean != None) and \
                             (p_stddev != None):
@@ -2047,9 +3756,6 @@ class TtestMethod(MetricMethodBase):
             else:
                #Summary fails, store the parent trend values
                if parent_data:
-                    parent_lookup = self._get_summary_data_lookup(
-                        parent_data
-                        )
                     trend_mean = parent_lookup.get('trend_mean', None)
                     trend_stddev = parent_lookup.get('trend_stddev', None)
 
@@ -2122,16 +3828,15 @@ class TtestMethod(MetricMethodBase):
     def _get_summary_data_lookup(self, data):
 
         lookup = {}
-        required_keys = set(
-            ['trend_mean', 'trend_stddev', 'stddev', 'mean']
-            )
-        for key in required_keys:
-            for d in data:
-                if key == d['metric_value_name']:
-                   lookup[key] = d['value']
-                   break
+        for d in data:
+            #The first value of each required key is used
+            if (d['metric_value_name'] in self.SUMMARY_LOOKUP_KEYS) and \
+               (d['metric_value_name'] not in lookup):
+                lookup[ d['metric_value_name'] ] = d['value']
         return lookup
 
+MetricsMethodFactory.register_metric_method(TtestMethod)
+
 class MetricMethodError(Exception):
     """
     Base class for all MetricMethod errors.  Takes an error message and
@@ -1,5 +1,6 @@
 import json
 
+import utils
 from base import DatazillaModelBase
 
 
@@ -156,8 +157,19 @@ class PerformanceTestRefDataModel(DatazillaModelBase):
         return data_iter
 
 
-    def get_object_error_metadata(self, startdate, enddate):
-        """ Get all the error records metadata in the objectstore in date range"""
+    def get_object_error_metadata(self, startdate, enddate, stream=False):
+        """
+        Get all the error records metadata in the objectstore in date range.
+
+        With ``stream`` the records are returned as a generator of row
+        batches, see SQLDataSource.execute_stream.
+        """
+        if stream:
+            return self.sources["objectstore"].execute_stream(
+                proc="objectstore.selects.get_error_metadata",
+                debug_show=self.DEBUG,
+                placeholders=[startdate, enddate],
+                )
 
         data_iter = self.sources["objectstore"].dhub.execute(
             proc="objectstore.selects.get_error_metadata",
@@ -192,11 +204,19 @@ class PerformanceTestRefDataModel(DatazillaModelBase):
             return_type='tuple',
             )
 
-        return blob
+        return utils.decompress_json_blobs(blob)
 
 
-    def get_object_json_blob_for_test_run(self, test_run_ids):
-        """Return a list of JSON blobs for this list of test_run_ids."""
+    def get_object_json_blob_for_test_run(self, test_run_ids, stream=False):
+        """
+        Return a list of JSON blobs for this list of test_run_ids.
+
+        With ``stream`` the blobs are returned as a generator of row
+        batches, see SQLDataSource.execute_stream.
+        """
+
+        if stream:
+            return self._stream_object_json_blob_for_test_run(test_run_ids)
 
         blobs = []
 
@@ -211,7 +231,26 @@ class PerformanceTestRefDataModel(DatazillaModelBase):
                 return_type='tuple',
                 )
 
-        return blobs
+        return utils.decompress_json_blobs(blobs)
+
+
+    def _stream_object_json_blob_for_test_run(self, test_run_ids):
+        """Yield the JSON blobs of test_run_ids in batches."""
+
+        if not test_run_ids:
+            return
+
+        r_string = ','.join( map( lambda tr_id: '%s', test_run_ids ) )
+
+        batches = self.sources["objectstore"].execute_stream(
+            proc="objectstore.selects.get_json_blob_for_test_run",
+            debug_show=self.DEBUG,
+            replace = [r_string],
+            placeholders = test_run_ids,
+            )
+
+        for blobs in batches:
+            yield utils.decompress_json_blobs(blobs)
 
 
     def get_parsed_object_error_data(self, startdate, enddate):
@@ -224,7 +263,7 @@ class PerformanceTestRefDataModel(DatazillaModelBase):
         versions = {}
         for d in data_iter:
             # one chunk
-            for data in d:
+            for data in utils.decompress_json_blobs(d):
                 # one item of one chunk
                 blob = data["json_blob"]
                 try:
@@ -6,6 +6,7 @@ datasource table.
 import datetime
 import os
 import subprocess
+import time
 import uuid
 
 from datasource.bases.BaseHub import BaseHub
@@ -14,6 +15,7 @@ from django.conf import settings
 from django.core.cache import cache
 from django.db import models, transaction
 import MySQLdb
+import MySQLdb.cursors
 
 
 
@@ -33,12 +35,46 @@ SQL_PATH = os.path.dirname(os.path.abspath(__file__))
 # The valid ``cron_batch`` values
 CRON_BATCH_NAMES = ["small", "medium", "large"]
 
+# Number of seconds an oauth consumer secret is cached in process
+OAUTH_SECRET_CACHE_TIMEOUT = 300
+
+# (project, oauth consumer key) -> (consumer secret, expiry timestamp)
+_oauth_secret_cache = {}
+
 
 class DatasetNotFoundError(ValueError):
     pass
 
 
 
+def get_oauth_consumer_secret(project, key):
+    """
+    Return the objectstore oauth consumer secret of ``project`` for ``key``.
+
+    Returns None if ``key`` is not the project's consumer key and raises
+    ``DatasetNotFoundError`` for an unknown project.  Secrets are cached in
+    process for ``OAUTH_SECRET_CACHE_TIMEOUT`` seconds, or until a
+    ``DataSource`` is saved in this process.
+
+    """
+    now = time.time()
+
+    cached = _oauth_secret_cache.get((project, key))
+    if cached and cached[1] > now:
+        return cached[0]
+
+    datasource = SQLDataSource(project, "objectstore").datasource
+    secret = datasource.get_oauth_consumer_secret(key)
+
+    # only cache matching keys, so a bad key can never shadow a good one
+    if secret is not None:
+        _oauth_secret_cache[(project, key)] = (
+            secret, now + OAUTH_SECRET_CACHE_TIMEOUT)
+
+    return secret
+
+
+
 class SQLDataSource(object):
     """
     Encapsulates SQL queries against a specific data source.
@@ -140,6 +176,62 @@ class SQLDataSource(object):
         self.dhub.disconnect()
 
 
+    def execute_stream(self, batch_size=None, **kwargs):
+        """
+        Execute a select and yield its rows in tuples of at most
+        ``batch_size`` rows.
+
+        Accepts the proc, placeholders and replace arguments of
+        ``dhub.execute``.  The rows are read with an unbuffered server side
+        cursor on a connection of its own, so only one batch is held in
+        memory and the datahub connection stays usable while the rows are
+        consumed.  The connection is closed once the rows are exhausted or
+        the generator is closed.
+
+        """
+        batch_size = batch_size or settings.DATAZILLA_STREAM_BATCH_SIZE
+
+        dhub = self.dhub
+        dhub.set_execute_rules(kwargs)
+        dhub.get_execute_data(dhub.data_source, kwargs)
+
+        host_type = kwargs['host_type']
+        conf = dhub.conf[host_type]
+
+        if kwargs.get('debug_show'):
+            dhub.show_debug(
+                kwargs['db'], conf['host'], host_type, kwargs.get('proc', ''),
+                kwargs['sql'], None
+                )
+
+        conn = MySQLdb.connect(
+            host=conf['host'],
+            user=conf['user'],
+            passwd=conf.get('passwd', ''),
+            charset="utf8",
+            cursorclass=MySQLdb.cursors.SSDictCursor,
+            db=kwargs['db'],
+            )
+
+        try:
+            cursor = conn.cursor()
+
+            if 'placeholders' in kwargs:
+                cursor.execute(kwargs['sql'], kwargs['placeholders'])
+            else:
+                cursor.execute(kwargs['sql'])
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+            cursor.close()
+        finally:
+            conn.close()
+
+
     def create_next_dataset(self, schema_file=None):
         """
         Create and return the next dataset for this project/contenttype.
@@ -294,13 +386,21 @@ class DataSource(models.Model):
 
 
     def save(self, *args, **kwargs):
-        """Clear the cached datasources when a new one is saved."""
+        """
+        Clear the cached datasources when a new one is saved.
+
+        The in-process oauth consumer secrets are dropped on every save,
+        since an existing datasource may have had its credentials changed.
+
+        """
         clear_cache = (self.pk is None)
 
         self.full_clean()
 
         super(DataSource, self).save(*args, **kwargs)
 
+        _oauth_secret_cache.clear()
+
         # Don't actually clear the cache until after the new DataSource is
         # saved, to avoid a race condition where it gets re-populated too soon.
         if clear_cache:
@@ -309,6 +409,7 @@ class DataSource(models.Model):
     @classmethod
     def reset_cache(cls):
         cache.delete(SOURCES_CACHE_KEY)
+        _oauth_secret_cache.clear()
         cls.objects.cached()
 
     @property
@@ -0,0 +1,11 @@
+/*****
+Schema modifications to support indexed revision lookups in the pushlog.
+revision holds the first 12 characters of the changeset node, matching the
+revision stored with perftest test runs.  The column is filled for existing
+changesets with the backfill_changeset_revisions management command.  To
+implement, change the project string to the target pushlog project name and
+execute the sql.
+******/
+ALTER TABLE `pushlog_hgmozilla_1`.`changesets`
+    ADD `revision` varchar(12) DEFAULT NULL AFTER `node`,
+    ADD KEY `idx_revision` (`revision`);
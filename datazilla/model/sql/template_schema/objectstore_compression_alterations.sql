@@ -0,0 +1,8 @@
+/*****
+Schema modifications to support compressed objectstore json blobs.  Existing
+rows keep compressed_flag = 'N' and are read as plain JSON until the
+compress_objectstore management command rewrites them.  To implement,
+change the project string to the target project name and execute the sql.
+******/
+ALTER TABLE `project_objectstore_1`.`objectstore`
+    ADD `compressed_flag` enum('N','Y') DEFAULT 'N' AFTER `json_blob`;
@@ -0,0 +1,15 @@
+/*****
+Schema modifications to support lease based claiming of objectstore rows.
+worker_id now holds the token of the claiming worker instead of its MySQL
+connection id.  Rows left in the loading state by the old protocol get an
+expired lease so they are reclaimed by the next worker.  To implement,
+change the project string to the target project name and execute the sql.
+******/
+ALTER TABLE `project_objectstore_1`.`objectstore`
+    MODIFY `worker_id` varchar(128),
+    ADD `lease_expiry` int(11) unsigned,
+    ADD KEY `lease_expiry_key` (`lease_expiry`);
+
+UPDATE `project_objectstore_1`.`objectstore`
+    SET `lease_expiry` = 0
+    WHERE `processed_flag` = 'loading';
@@ -0,0 +1,19 @@
+/*****
+Schema modifications to store the push walker checkpoints and the revisions
+that received test data after their push was walked.  To implement, change
+the project string to the target project name and execute the sql.
+******/
+CREATE TABLE `project_perftest_1`.`push_walker_checkpoint` (
+  `walker` varchar(25) COLLATE utf8_bin NOT NULL,
+  `branch` varchar(128) COLLATE utf8_bin NOT NULL,
+  `push_id` int(11) unsigned NOT NULL,
+  `date_updated` int(11) unsigned NOT NULL,
+  PRIMARY KEY (`walker`,`branch`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_bin;
+
+CREATE TABLE `project_perftest_1`.`push_walker_dirty` (
+  `walker` varchar(25) COLLATE utf8_bin NOT NULL,
+  `revision` varchar(16) COLLATE utf8_bin NOT NULL,
+  `date_added` int(11) unsigned NOT NULL,
+  PRIMARY KEY (`walker`,`revision`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_bin;
@@ -0,0 +1,72 @@
+/*****
+Schema modifications to store the daily and per push rollups of
+test_data_all_dimensions, and the indexes used to recompute them.  To
+implement, change the project string to the target project name and
+execute the sql.  Run the backfill_rollups command afterwards to compute
+the rollups of the existing data.
+******/
+ALTER TABLE `project_perftest_1`.`test_data_all_dimensions`
+  ADD KEY `pushlog_id_key` (`pushlog_id`),
+  ADD KEY `series_date_received_key` (`product_id`,`operating_system_id`,`test_id`,`page_id`,`date_received`);
+
+CREATE TABLE `project_perftest_1`.`test_data_daily_rollup` (
+  `product_id` int(11) NOT NULL,
+  `operating_system_id` int(11) NOT NULL,
+  `processor` varchar(25) COLLATE utf8_bin NOT NULL,
+  `build_type` varchar(25) COLLATE utf8_bin NOT NULL,
+  `test_id` int(11) NOT NULL,
+  `page_id` int(11) NOT NULL,
+  `day` int(11) unsigned NOT NULL,
+  `product` varchar(50) COLLATE utf8_bin NOT NULL,
+  `branch` varchar(128) COLLATE utf8_bin NOT NULL,
+  `branch_version` varchar(16) COLLATE utf8_bin DEFAULT NULL,
+  `operating_system_name` varchar(50) COLLATE utf8_bin NOT NULL,
+  `operating_system_version` varchar(50) COLLATE utf8_bin NOT NULL,
+  `test_name` varchar(128) COLLATE utf8_bin NOT NULL,
+  `page_url` varchar(255) COLLATE utf8_bin NOT NULL,
+  `run_count` int(11) NOT NULL,
+  `mean` double NOT NULL,
+  `min` double NOT NULL,
+  `max` double NOT NULL,
+  `std` double NOT NULL,
+  `median` double NOT NULL,
+  `date_updated` int(11) unsigned NOT NULL,
+  PRIMARY KEY (`product_id`,`operating_system_id`,`processor`,`build_type`,`test_id`,`page_id`,`day`),
+  KEY `day_key` (`day`),
+  KEY `branch_key` (`branch`),
+  KEY `operating_system_name_key` (`operating_system_name`),
+  KEY `test_name_key` (`test_name`),
+  KEY `page_url_key` (`page_url`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_bin;
+
+CREATE TABLE `project_perftest_1`.`test_data_push_rollup` (
+  `product_id` int(11) NOT NULL,
+  `operating_system_id` int(11) NOT NULL,
+  `processor` varchar(25) COLLATE utf8_bin NOT NULL,
+  `build_type` varchar(25) COLLATE utf8_bin NOT NULL,
+  `test_id` int(11) NOT NULL,
+  `page_id` int(11) NOT NULL,
+  `pushlog_id` int(11) NOT NULL,
+  `push_date` int(11) NOT NULL,
+  `revision` varchar(16) COLLATE utf8_bin DEFAULT NULL,
+  `product` varchar(50) COLLATE utf8_bin NOT NULL,
+  `branch` varchar(128) COLLATE utf8_bin NOT NULL,
+  `branch_version` varchar(16) COLLATE utf8_bin DEFAULT NULL,
+  `operating_system_name` varchar(50) COLLATE utf8_bin NOT NULL,
+  `operating_system_version` varchar(50) COLLATE utf8_bin NOT NULL,
+  `test_name` varchar(128) COLLATE utf8_bin NOT NULL,
+  `page_url` varchar(255) COLLATE utf8_bin NOT NULL,
+  `run_count` int(11) NOT NULL,
+  `mean` double NOT NULL,
+  `min` double NOT NULL,
+  `max` double NOT NULL,
+  `std` double NOT NULL,
+  `median` double NOT NULL,
+  `date_updated` int(11) unsigned NOT NULL,
+  PRIMARY KEY (`product_id`,`operating_system_id`,`processor`,`build_type`,`test_id`,`page_id`,`pushlog_id`),
+  KEY `push_date_key` (`push_date`),
+  KEY `branch_key` (`branch`),
+  KEY `operating_system_name_key` (`operating_system_name`),
+  KEY `test_name_key` (`test_name`),
+  KEY `page_url_key` (`page_url`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_bin;
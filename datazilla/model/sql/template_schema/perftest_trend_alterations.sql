@@ -0,0 +1,19 @@
+/*****
+Schema modifications to store the trend line of every metric datum used to
+fill the metric columns of test_data_all_dimensions at load time.  To
+implement, change the project string to the target project name and
+execute the sql.
+******/
+CREATE TABLE `project_perftest_1`.`test_data_trend` (
+  `product_id` int(11) NOT NULL,
+  `operating_system_id` int(11) NOT NULL,
+  `processor` varchar(25) COLLATE utf8_bin NOT NULL,
+  `build_type` varchar(25) COLLATE utf8_bin NOT NULL,
+  `test_id` int(11) NOT NULL,
+  `page_id` int(11) NOT NULL,
+  `test_run_id` int(11) NOT NULL,
+  `trend_mean` double NOT NULL,
+  `trend_std` double NOT NULL,
+  `trend_n` double NOT NULL,
+  PRIMARY KEY (`product_id`,`operating_system_id`,`processor`,`build_type`,`test_id`,`page_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_bin;
@@ -9,7 +9,10 @@ Model-layer utility functions.
 """
 import time
 import datetime
+import json
 import sys
+import types
+import zlib
 
 def is_number(s):
     try:
@@ -117,6 +120,62 @@ def build_replacement(col_data):
             ]
         )
 
+def compress_json_blob(json_blob):
+    """Return ``json_blob`` zlib compressed for objectstore storage."""
+    if isinstance(json_blob, unicode):
+        json_blob = json_blob.encode("utf-8")
+    return zlib.compress(json_blob)
+
+
+def decompress_json_blobs(rows):
+    """
+    Decompress the ``json_blob`` of objectstore rows stored compressed.
+
+    The ``compressed_flag`` column is removed from each row, so callers get
+    the same row layout whether or not a blob was compressed.
+
+    """
+    for row in rows:
+        if row.pop('compressed_flag', 'N') == 'Y':
+            row['json_blob'] = zlib.decompress(row['json_blob'])
+    return rows
+
+
+def iter_json(data):
+    """
+    Encode ``data`` as json one chunk at a time.
+
+    Generators are encoded as a list of the rows of every batch they yield,
+    see SQLDataSource.execute_stream, so a streamed result set is never
+    held in memory as a whole.  The chunks joined together are the same as
+    ``json.dumps(data)`` would return with the generators replaced by lists.
+
+    """
+    if isinstance(data, types.GeneratorType):
+        yield '['
+        separator = ''
+        for batch in data:
+            if batch:
+                yield separator + ', '.join(json.dumps(row) for row in batch)
+                separator = ', '
+        yield ']'
+
+    elif isinstance(data, dict):
+        yield '{'
+        separator = ''
+        for key, value in data.iteritems():
+            if not isinstance(key, basestring):
+                key = json.dumps(key)
+            yield '{0}{1}: '.format(separator, json.dumps(key))
+            for chunk in iter_json(value):
+                yield chunk
+            separator = ', '
+        yield '}'
+
+    else:
+        yield json.dumps(data)
+
+
 def println(val, debug):
     if debug:
         sys.stdout.write("{0}\n".format(str(val)))
@@ -16,6 +16,45 @@ DATAZILLA_DATABASE_PORT     = os.environ.get("DATAZILLA_DATABASE_PORT", "")
 
 DATAZILLA_MEMCACHED         = os.environ.get("DATAZILLA_MEMCACHED", "")
 
+# Maximum number of reference data ids (test, os, product, machine, build,
+# page, option, aux) each project keeps in process while loading test data
+DATAZILLA_REF_DATA_CACHE_SIZE = int(os.environ.get(
+    "DATAZILLA_REF_DATA_CACHE_SIZE", 10000))
+
+# Number of pushes whose test values are loaded with a single query while
+# walking back through a branch pushlog to find the parent of a metric datum
+DATAZILLA_PARENT_WINDOW_SIZE = int(os.environ.get(
+    "DATAZILLA_PARENT_WINDOW_SIZE", 20))
+
+# Seconds per time bucket used by the test_data_all_dimensions result
+# cache, the start and stop of a request are aligned to bucket boundaries
+# so requests made within the same bucket share a cache entry
+DATAZILLA_ALL_DIMENSIONS_CACHE_BUCKET = int(os.environ.get(
+    "DATAZILLA_ALL_DIMENSIONS_CACHE_BUCKET", 300))
+
+# Time ranges, in seconds, longer than this are served from the daily
+# rollups of test_data_all_dimensions by all_data with rollup=auto
+# (defaults to 30 days)
+DATAZILLA_ALL_DIMENSIONS_ROLLUP_RANGE = int(os.environ.get(
+    "DATAZILLA_ALL_DIMENSIONS_ROLLUP_RANGE", 2592000))
+
+# Number of rows read at a time by SQLDataSource.execute_stream, streamed
+# responses hold about one batch of rows in memory
+DATAZILLA_STREAM_BATCH_SIZE = int(os.environ.get(
+    "DATAZILLA_STREAM_BATCH_SIZE", 1000))
+
+# Largest decompressed size in bytes of a gzip body posted to
+# set_test_data_batch
+DATAZILLA_MAX_BATCH_BODY_SIZE = int(os.environ.get(
+    "DATAZILLA_MAX_BATCH_BODY_SIZE", 52428800))
+
+# Comma separated list of projects whose objectstore json blobs are stored
+# zlib compressed
+DATAZILLA_COMPRESSED_OBJECTSTORE_PROJECTS = [
+    p for p in os.environ.get(
+        "DATAZILLA_COMPRESSED_OBJECTSTORE_PROJECTS", "").split(",") if p
+    ]
+
 # Set base URL via the environment
 DATAZILLA_URL               = os.environ.get("DATAZILLA_URL", "/")
 
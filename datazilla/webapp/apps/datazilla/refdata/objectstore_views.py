@@ -2,6 +2,7 @@ import json
 import re
 from django.http import HttpResponse
 from datazilla.controller.admin.refdata import objectstore_refdata
+from datazilla.model import utils
 from .view_utils import get_range, REQUIRE_DAYS_AGO, API_CONTENT_TYPE
 
 
@@ -15,8 +16,10 @@ def get_error_list(request, project):
         project,
         date_range["start"],
         date_range["stop"],
+        stream=True,
         )
-    return HttpResponse(json.dumps(stats), content_type=API_CONTENT_TYPE)
+    return HttpResponse(
+        utils.iter_json(stats), content_type=API_CONTENT_TYPE)
 
 
 def get_error_count(request, project):
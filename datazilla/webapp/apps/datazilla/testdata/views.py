@@ -2,9 +2,11 @@ import json
 import time
 
 from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
 
 from datazilla.controller.admin import testdata
-from datazilla.model import utils
+from datazilla.model import utils, MetricsTestModel
 
 REQUIRE_DAYS_AGO = """Invalid Request: Require days_ago parameter.
                     This specifies the number of days ago to use as the start
@@ -26,8 +28,37 @@ REQUIRE_TEST_NAME = """Invalid Request: Require test_name parameter.
 REQUIRE_PAGE_NAME = """Invalid Request: Require page_name parameter.
                      This specifies the name of the test page."""
 
+INVALID_FORMAT = """Invalid Request: format must be rows or columnar."""
+
+INVALID_COLUMNS = """Invalid Request: Unknown column in columns parameter.
+                     The columns are the keys of column_key (ti, dr, r...)"""
+
+INVALID_TIME_RANGE = """Invalid Request: start and stop must be unix
+                     timestamps."""
+
+INVALID_ROLLUP = """Invalid Request: rollup must be auto, none, daily or
+                     push."""
+
+INVALID_MAX_POINTS = """Invalid Request: max_points must be an integer
+                     greater than 2."""
+
+INVALID_STREAM = """Invalid Request: stream is only supported with the rows
+                     format and without max_points."""
+
 API_CONTENT_TYPE = 'application/json; charset=utf-8'
 
+#Smallest max_points accepted, the first and last point of a series are
+#always kept
+MIN_POINTS = 3
+
+ALL_DATA_FORMATS = set(['rows', 'columnar'])
+
+ALL_DATA_COLUMNS = set(MetricsTestModel.ALL_DIMENSION_COLUMNS).union(
+    MetricsTestModel.ALL_DIMENSION_ROLLUP_COLUMN_KEY)
+
+ALL_DATA_ROLLUPS = set(
+    ['auto', 'none'] + MetricsTestModel.ALL_DIMENSION_ROLLUPS)
+
 DEFAULT_BRANCH_PROJECT_MAP = {
     'talos':{'branch':'Mozilla-Inbound', 'product':'Firefox' },
     'b2g':{'branch':'master', 'product':'B2G'},
@@ -50,8 +81,10 @@ def get_testdata(request, project, branch, revision):
     test_name = request.GET.get("test_name", None)
     page_name = request.GET.get("page_name", None)
 
+    #The test data of a revision can be large, stream it instead of
+    #building the whole response in memory
     return HttpResponse(
-        json.dumps(testdata.get_testdata(
+        utils.iter_json(testdata.get_testdata(
             project,
             branch,
             revision,
@@ -63,6 +96,7 @@ def get_testdata(request, project, branch, revision):
             build_type=build_type,
             test_name=test_name,
             page_name=page_name,
+            stream=True,
             )),
         content_type=API_CONTENT_TYPE,
         )
@@ -191,12 +225,21 @@ def get_metrics_pushlog(request, project, branch, revision):
 
     pushlog_project = request.GET.get("pushlog_project", None)
 
+    #Optional limit on the number of pushes returned, the trend line is
+    #downsampled server side
+    max_points = request.GET.get("max_points", None)
+
     if not test_name:
         return HttpResponse(REQUIRE_TEST_NAME, status=400)
 
     if not page_name:
         return HttpResponse(REQUIRE_PAGE_NAME, status=400)
 
+    if max_points:
+        if not max_points.isdigit() or int(max_points) < MIN_POINTS:
+            return HttpResponse(INVALID_MAX_POINTS, status=400)
+        max_points = int(max_points)
+
     return HttpResponse(
         json.dumps(testdata.get_metrics_pushlog(
             project,
@@ -212,7 +255,8 @@ def get_metrics_pushlog(request, project, branch, revision):
             page_name=page_name,
             pushes_before=pushes_before,
             pushes_after=pushes_after,
-            pushlog_project=pushlog_project
+            pushlog_project=pushlog_project,
+            max_points=max_points
             )),
         content_type=API_CONTENT_TYPE,
         )
@@ -275,6 +319,24 @@ def get_data_all_dimensions(request, project=""):
 
     end_time = request.GET.get('stop')
 
+    #The columnar format returns one list per column, see
+    #MetricsTestModel.get_columnar_data
+    data_format = request.GET.get('format', 'rows')
+
+    columns = request.GET.get('columns')
+
+    #Rollup rows have no test_run_id or date_received, clients opt in to
+    #them, see MetricsTestModel.get_data_all_dimensions
+    rollup = request.GET.get('rollup', 'none')
+
+    #Optional limit on the number of rows of every series, see
+    #MetricsTestModel.get_downsampled_data
+    max_points = request.GET.get('max_points')
+
+    #Stream the rows from a server side cursor instead of building the
+    #response in memory, see SQLDataSource.execute_stream
+    stream = request.GET.get('stream') in ('1', 'true')
+
     if not product:
         return HttpResponse(REQUIRE_PRODUCT_NAME, status=400)
 
@@ -285,13 +347,69 @@ def get_data_all_dimensions(request, project=""):
         #Require at least os
         return HttpResponse(REQUIRE_OS_OR_TEST_NAME, status=400)
 
+    if not is_time_range(start_time, end_time):
+        return HttpResponse(INVALID_TIME_RANGE, status=400)
+
+    if data_format not in ALL_DATA_FORMATS:
+        return HttpResponse(INVALID_FORMAT, status=400)
+
+    if rollup not in ALL_DATA_ROLLUPS:
+        return HttpResponse(INVALID_ROLLUP, status=400)
+
+    if columns:
+        columns = columns.split(',')
+        if not set(columns).issubset(ALL_DATA_COLUMNS):
+            return HttpResponse(INVALID_COLUMNS, status=400)
+
+    if max_points:
+        if not max_points.isdigit() or int(max_points) < MIN_POINTS:
+            return HttpResponse(INVALID_MAX_POINTS, status=400)
+        max_points = int(max_points)
+
+    if stream and (data_format != 'rows' or max_points):
+        return HttpResponse(INVALID_STREAM, status=400)
+
     data = testdata.get_test_data_all_dimensions(
         project, product, branch, os, os_version, test, page,
-        start_time, end_time)
+        start_time, end_time, data_format, columns,
+        None if rollup == 'none' else rollup, max_points, stream)
+
+    if stream:
+        return HttpResponse(
+            utils.iter_json(data), content_type=API_CONTENT_TYPE)
+
+    if data_format == 'columnar':
+        return get_compressed_response(
+            request, json.dumps(data, separators=(',', ':')))
 
     return HttpResponse(
         json.dumps(data), content_type=API_CONTENT_TYPE)
 
+def is_time_range(*timestamps):
+    """Return True if every timestamp supplied is an integer."""
+    for timestamp in timestamps:
+        if timestamp and not timestamp.isdigit():
+            return False
+    return True
+
+def get_compressed_response(request, content):
+    """
+    Return an API response with content, gzip compressed when the client
+    accepts it.
+    """
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+    if 'gzip' not in accept_encoding:
+        return HttpResponse(content, content_type=API_CONTENT_TYPE)
+
+    response = HttpResponse(
+        compress_string(content), content_type=API_CONTENT_TYPE)
+
+    response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    return response
+
 def get_platforms_and_tests(request, project=""):
 
     start_time = request.GET.get('start')
@@ -314,6 +432,9 @@ def get_platforms_and_tests(request, project=""):
         else:
             product = DEFAULT_BRANCH_PROJECT_MAP['default']['product']
 
+    if not is_time_range(start_time, end_time):
+        return HttpResponse(INVALID_TIME_RANGE, status=400)
+
     data = testdata.get_platforms_and_tests(
         project, product, branch, start_time, end_time)
 
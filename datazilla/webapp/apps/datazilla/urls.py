@@ -9,6 +9,9 @@ urlpatterns = patterns('',
                        #Loads JSON object into objectstore
                        (r'^load_test/?$', views.set_test_data),
 
+                       #Loads many JSON objects into objectstore
+                       (r'^load_test_batch/?$', views.set_test_data_batch),
+
                        #return reference data
                        (r'^refdata/', include(
                             "datazilla.webapp.apps.datazilla.refdata.urls"
@@ -1,4 +1,6 @@
+import base64
 import datetime
+import hashlib
 import json
 import urllib
 import zlib
@@ -17,6 +19,7 @@ from datazilla.model import PerformanceTestModel
 from datazilla.model import utils
 from datazilla.model import DatasetNotFoundError
 from datazilla.model import DataSource
+from datazilla.model.sql.models import get_oauth_consumer_secret
 
 APP_JS = 'application/json'
 
@@ -37,8 +40,6 @@ def oauth_required(func):
         if project in ['talos', 'views']:
             return func(request, *args, **kwargs)
 
-        dm = PerformanceTestModel(project)
-
         #Get the consumer key
         key = request.REQUEST.get('oauth_consumer_key', None)
 
@@ -49,7 +50,7 @@ def oauth_required(func):
 
         try:
             #Get the consumer secret stored with this key
-            ds_consumer_secret = dm.get_oauth_consumer_secret(key)
+            ds_consumer_secret = get_oauth_consumer_secret(project, key)
         except DatasetNotFoundError:
             result = {"status": "Unknown project '%s'" % project}
             return HttpResponse(
@@ -79,6 +80,17 @@ def oauth_required(func):
             return HttpResponse(
                 json.dumps(result), content_type=APP_JS, status=status)
 
+        #The signature only covers the request parameters, a body that is
+        #not form encoded is covered by the oauth_body_hash parameter
+        if not _is_form_post(request) and request.body:
+            body_hash = base64.b64encode(hashlib.sha1(request.body).digest())
+
+            if request.GET.get('oauth_body_hash') != body_hash:
+                status = 403
+                result = {"status": "Oauth body hash verification error."}
+                return HttpResponse(
+                    json.dumps(result), content_type=APP_JS, status=status)
+
         return func(request, *args, **kwargs)
 
     return _wrap_oauth
@@ -150,6 +162,139 @@ def set_test_data(request, project=""):
 
     return HttpResponse(json.dumps(result), mimetype=APP_JS, status=status)
 
+@oauth_required
+def set_test_data_batch(request, project=""):
+    """
+    Post many JSON blobs of data for the specified project at once.
+
+    The blobs are sent either as a JSON array or as newline delimited JSON,
+    in the urlencoded ``data`` field of a form post like ``set_test_data``,
+    or as the raw request body, optionally with ``Content-Encoding: gzip``.
+    A raw body must be signed with the ``oauth_body_hash`` parameter, see
+    ``oauth_required``.  Each blob is checked on its own and all of them
+    are stored in the objectstore with a single multi-row insert.  The
+    response holds the status of every blob, in the order they were
+    posted.
+
+    """
+    # default to bad request if the body is malformed or not present
+    status = 400
+
+    try:
+        json_blobs = _get_batch_json_blobs(request)
+    except ValueError as e:
+        result = {"status": "Malformed request", "message": str(e)}
+        return HttpResponse(json.dumps(result), mimetype=APP_JS, status=status)
+
+    if not json_blobs:
+        result = {"status": "No POST data found"}
+        return HttpResponse(json.dumps(result), mimetype=APP_JS, status=status)
+
+    blobs = []
+    items = []
+
+    try:
+        dm = PerformanceTestModel(project)
+
+        for json_data in json_blobs:
+
+            error = None
+            deserialized_json = {}
+
+            try:
+                deserialized_json = json.loads(json_data)
+                if not isinstance(deserialized_json, dict):
+                    raise ValueError("Expected a JSON object")
+            except ValueError as e:
+                error = "Malformed JSON: {0}".format(e.message)
+                deserialized_json = {}
+                items.append({"status": "Malformed JSON", "message": error})
+            else:
+                try:
+                    json_data = dm.pre_process_data(
+                        json_data, deserialized_json)
+                except Exception as e:
+                    error = u"Invalid JSON: {0}: {1}".format(
+                        e.__class__.__name__, unicode(e))
+                    items.append({"status": "Invalid JSON", "message": error})
+                else:
+                    items.append({
+                        "status": "well-formed JSON stored",
+                        "size": len(json_data),
+                        })
+
+            blobs.append((json_data, error))
+
+        ids = dm.store_test_data_batch(blobs)
+
+        dm.disconnect()
+    except Exception as e:
+        status = 500
+        result = {"status": "Unknown error", "message": str(e)}
+    else:
+        status = 200
+
+        for item, id in zip(items, ids):
+            location = "/{0}/refdata/objectstore/json_blob/{1}".format(
+                project, str(id)
+                )
+            item['url'] = request.build_absolute_uri(location)
+
+        error_count = len([b for b in blobs if b[1]])
+
+        result = {
+            "status": "{0} of {1} JSON blobs well-formed".format(
+                len(blobs) - error_count, len(blobs)),
+            "stored": len(blobs),
+            "errors": error_count,
+            "items": items,
+            }
+
+    return HttpResponse(json.dumps(result), mimetype=APP_JS, status=status)
+
+def _get_batch_json_blobs(request):
+    """
+    Return the list of JSON blobs posted to ``set_test_data_batch``.
+
+    Raises ``ValueError`` if the body can't be decompressed, decompresses
+    to more than ``settings.DATAZILLA_MAX_BATCH_BODY_SIZE`` bytes or is a
+    malformed JSON array.
+
+    """
+    if _is_form_post(request):
+        body = urllib.unquote(request.POST.get('data', ''))
+    else:
+        body = request.body
+
+        if request.META.get('HTTP_CONTENT_ENCODING', '') == 'gzip':
+            max_size = settings.DATAZILLA_MAX_BATCH_BODY_SIZE
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                body = decompressor.decompress(body, max_size)
+            except zlib.error as e:
+                raise ValueError("Malformed gzip body: {0}".format(e))
+
+            if decompressor.unconsumed_tail:
+                raise ValueError(
+                    "Gzip body larger than {0} bytes".format(max_size))
+
+    body = body.strip()
+
+    if body.startswith('['):
+        try:
+            return [ json.dumps(blob) for blob in json.loads(body) ]
+        except ValueError as e:
+            raise ValueError("Malformed JSON array: {0}".format(e))
+
+    return [ line for line in body.splitlines() if line.strip() ]
+
+def _is_form_post(request):
+    """Return True if the request body holds form encoded parameters."""
+    content_type = request.META.get('CONTENT_TYPE', '')
+
+    return content_type.startswith(('application/x-www-form-urlencoded',
+                                    'multipart/form-data'))
+
 def homepage(request, project=""):
 
     #####
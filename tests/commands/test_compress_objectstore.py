@@ -0,0 +1,46 @@
+"""
+Tests for management command to compress objectstore json blobs.
+
+"""
+import pytest
+
+from django.core.management import call_command
+
+from ..sample_data import perftest_json
+
+
+def call_compress_objectstore(*args, **kwargs):
+    call_command("compress_objectstore", *args, **kwargs)
+
+
+def test_no_args(capsys):
+    """Shows need for a project name."""
+    with pytest.raises(SystemExit):
+        call_compress_objectstore()
+
+    exp = (
+        "",
+        "Error: You must provide either a project or cron_batch value.\n",
+        )
+
+    assert capsys.readouterr() == exp
+
+
+def test_compress(ptm):
+    """Compresses every uncompressed blob in chunks."""
+    blobs = [
+        perftest_json(testrun={"date": "1330454755"}),
+        perftest_json(testrun={"date": "1330454756"}),
+        perftest_json(testrun={"date": "1330454757"}),
+        ]
+
+    for blob in blobs:
+        ptm.store_test_data(blob)
+
+    call_compress_objectstore(project=ptm.project, chunk_size=2)
+
+    rows = ptm.sources["objectstore"].dhub.execute(
+        proc="objectstore_test.selects.all")
+
+    assert set([r["compressed_flag"] for r in rows]) == set(["Y"])
+    assert set([r["json_blob"] for r in ptm.claim_objects(3)]) == set(blobs)
@@ -135,3 +135,44 @@ def test_no_load(monkeypatch, plm, ptm):
     )
 
     assert set(calls) == set([1])
+
+
+def test_daemon_no_project(capsys):
+    """Daemon mode needs a single project."""
+    with pytest.raises(SystemExit):
+        call_process_objects(cron_batches=["small"], daemon=True)
+
+    exp = (
+        "",
+        "Error: You must supply a project name with --daemon: "
+        "--project project\n",
+        )
+
+    assert capsys.readouterr() == exp
+
+
+def test_daemon(monkeypatch, ptm, plm):
+    """Daemon loads the backlog, then shuts down when asked to."""
+    from datazilla.controller.admin.management.commands.process_objects \
+        import Command
+
+    ptm.store_test_data(json.dumps(perftest_data()))
+
+    sleeps = []
+    def mock_sleep(self, seconds):
+        sleeps.append(seconds)
+        # simulate a SIGTERM arriving while idle
+        self.shutdown = True
+    monkeypatch.setattr(Command, "sleep", mock_sleep)
+
+    call_process_objects(
+        project=ptm.project,
+        pushlog_project=plm.project,
+        daemon=True,
+        )
+
+    complete_count = ptm.sources["objectstore"].dhub.execute(
+        proc="objectstore_test.counts.complete")[0]["complete_count"]
+
+    assert complete_count == 1
+    assert sleeps == [Command.MIN_SLEEP]
@@ -2,11 +2,16 @@
 Tests for management command to create perftest database.
 
 """
+import time
+
 import pytest
 
 from django.core.management import call_command
 
 from datazilla.model import MetricsMethodFactory
+from datazilla.controller.admin.push_walker import (
+    get_branch_walks, get_metric_partitions, set_branch_walks_complete
+    )
 
 from ..model.test_metrics_test_model import setup_pushlog_walk_tests
 from ..sample_metric_data import get_metric_collection_data
@@ -37,7 +42,8 @@ def test_run_metrics_and_summary(capsys, mtm, ptm, plm, monkeypatch):
     ############
     _test_metric_evaluations(setup_data, mtm, 12)
 
-def test_duplicate_run(capsys, mtm, ptm, plm, monkeypatch):
+def test_run_metrics_workers(capsys, mtm, ptm, plm, monkeypatch):
+    """Metrics computed with --workers match a serial run."""
 
     setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
 
@@ -45,9 +51,46 @@ def test_duplicate_run(capsys, mtm, ptm, plm, monkeypatch):
         project=ptm.project,
         pushlog_project=plm.project,
         numdays=10,
+        workers=2,
         cron_batch='small'
         )
 
+    _test_thresholds(setup_data, mtm, ptm)
+
+    _test_metric_evaluations(setup_data, mtm, 12)
+
+def test_get_metric_partitions(mtm, ptm, plm, monkeypatch):
+    """Partitions only hold the revisions with data on the walk branch."""
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
+    walks = get_branch_walks(plm, mtm, 'metrics', 10, None)
+
+    partitions = get_metric_partitions(mtm, walks)
+
+    #All of the sample data shares one test configuration
+    assert len(partitions) == 1
+    assert partitions[0]['branch'] == setup_data['branch']
+
+    data_revisions = set(setup_data['sample_revisions'])
+    data_revisions.discard(setup_data['skip_revision'])
+
+    assert partitions[0]['data_revisions'] == data_revisions
+
+    #Test runs of a product on another branch are not walked
+    for walk in walks:
+        walk['branch_names'] = set(['mozilla-aurora'])
+
+    assert get_metric_partitions(mtm, walks) == []
+
+def test_checkpoint_run(capsys, mtm, ptm, plm, monkeypatch):
+    """
+    Later runs without new pushes or data only retry the metric datums
+    left without metrics.
+    """
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
     call_run_metrics(
         project=ptm.project,
         pushlog_project=plm.project,
@@ -55,14 +98,154 @@ def test_duplicate_run(capsys, mtm, ptm, plm, monkeypatch):
         cron_batch='small'
         )
 
-    #Confirm the thresholds set match what is expected
-    _test_thresholds(
-        setup_data,
-        mtm,
-        ptm,
-        setup_data['sample_revisions'][0]
+    #The first revision has no parent yet, it stays dirty
+    first_revision = setup_data['sample_revisions'][0]
+
+    assert first_revision in mtm.get_push_walker_dirty_revisions('metrics')
+
+    for i in range(2):
+        call_run_metrics(
+            project=ptm.project,
+            pushlog_project=plm.project,
+            numdays=10,
+            cron_batch='small'
+            )
+
+    #The first revision was walked again and now has a threshold to
+    #compare to, its push is older so the thresholds are unchanged
+    _test_thresholds(setup_data, mtm, ptm)
+
+    _test_metric_evaluations(setup_data, mtm, 15)
+
+    for walker in mtm.PUSH_WALKERS:
+        assert not mtm.get_push_walker_dirty_revisions(walker)
+
+    assert mtm.get_push_walker_checkpoints('metrics')
+    assert mtm.get_push_walker_checkpoints('summary')
+
+def test_dirty_revision_run(capsys, mtm, ptm, plm, monkeypatch):
+    """Revisions with late data are walked again after the checkpoint."""
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
+    call_run_metrics(
+        project=ptm.project,
+        pushlog_project=plm.project,
+        numdays=10,
+        cron_batch='small'
+        )
+
+    first_revision = setup_data['sample_revisions'][0]
+
+    test_data = mtm.get_test_values_by_revision(first_revision)
+    mtm.set_push_walker_dirty_revisions(
+        set(map(lambda k: test_data[k]['ref_data']['test_run_id'], test_data))
+        )
+
+    assert first_revision in mtm.get_push_walker_dirty_revisions('metrics')
+
+    call_run_metrics(
+        project=ptm.project,
+        pushlog_project=plm.project,
+        numdays=10,
+        cron_batch='small'
+        )
+
+    #The dirty revision now has a threshold to compare to
+    _test_metric_evaluations(setup_data, mtm, 15)
+
+    for walker in mtm.PUSH_WALKERS:
+        assert not mtm.get_push_walker_dirty_revisions(walker)
+
+def test_dirty_revision_marking(mtm, ptm, plm, monkeypatch):
+    """
+    Only the revisions of walked branches are marked dirty, rows older
+    than the walk window are removed.
+    """
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
+    first_revision = setup_data['sample_revisions'][0]
+
+    test_data = mtm.get_test_values_by_revision(first_revision)
+    test_run_ids = set(
+        map(lambda k: test_data[k]['ref_data']['test_run_id'], test_data)
         )
 
+    mtm.set_push_walker_dirty_revisions(
+        test_run_ids, [ setup_data['branch'] ]
+        )
+
+    for walker in mtm.PUSH_WALKERS:
+        assert not mtm.get_push_walker_dirty_revisions(walker)
+
+    mtm.set_push_walker_dirty_revisions(test_run_ids, ['Try'])
+
+    for walker in mtm.PUSH_WALKERS:
+        assert first_revision in mtm.get_push_walker_dirty_revisions(walker)
+
+    now = int(time.time())
+
+    #Rows added in the window are kept
+    set_branch_walks_complete(mtm, 'metrics', [], now, None, now - 60)
+
+    assert first_revision in mtm.get_push_walker_dirty_revisions('metrics')
+
+    set_branch_walks_complete(mtm, 'metrics', [], now, None, now + 60)
+
+    assert not mtm.get_push_walker_dirty_revisions('metrics')
+    assert first_revision in mtm.get_push_walker_dirty_revisions('summary')
+
+def test_dirty_revision_retry_expires(mtm, ptm, plm, monkeypatch):
+    """Revisions a walk retries keep the date they were first marked."""
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
+    first_revision = setup_data['sample_revisions'][0]
+
+    now = int(time.time())
+
+    mtm.add_push_walker_dirty_revisions('metrics', [first_revision])
+
+    #An hour later the walk still can not compute the revision metrics
+    monkeypatch.setattr(time, 'time', lambda: now + 3600)
+
+    walks = [ {
+        'branch':setup_data['branch'],
+        'push_id':setup_data['branch_pushlog'][-1]['push_id'],
+        'dirty':set([first_revision])
+        } ]
+
+    set_branch_walks_complete(
+        mtm, 'metrics', walks, now + 3600,
+        { 'metrics':set([first_revision]) }, now + 60
+        )
+
+    assert not mtm.get_push_walker_dirty_revisions('metrics')
+
+def test_duplicate_run(capsys, mtm, ptm, plm, monkeypatch):
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
+    call_run_metrics(
+        project=ptm.project,
+        pushlog_project=plm.project,
+        numdays=10,
+        cron_batch='small'
+        )
+
+    call_run_metrics(
+        project=ptm.project,
+        pushlog_project=plm.project,
+        numdays=10,
+        rewalk=True,
+        cron_batch='small'
+        )
+
+    #The first revision passes against the threshold but its push is
+    #older so the thresholds still point to the last revision
+    _test_thresholds(setup_data, mtm, ptm)
+
     ############
     #The total number of tests passing should be 15,
     #three pages per revision and 5 revisions.  The first
@@ -76,3 +76,69 @@ def test_successful_store(plm, capsys, monkeypatch):
         )
 
     assert capsys.readouterr() == exp
+
+
+def test_incremental_store(plm, capsys, monkeypatch):
+    """Incremental mode syncs the pushlogs without numdays or hours."""
+
+    def mock_sync_pushlogs(nothing, repo_host, numdays, hours, enddate,
+                           branch, workers):
+        assert (numdays, hours, workers) == (None, None, 2)
+        return {
+            "branches": 1,
+            "pushlogs_stored": 1,
+            "changesets_stored": 2,
+            "pushlogs_skipped": 0,
+            "changesets_skipped": 0,
+            }
+    monkeypatch.setattr(PushLogModel, "sync_pushlogs", mock_sync_pushlogs)
+
+    call_update_pushlog(repo_host="foo_host", incremental=True, workers="2",
+                        project=plm.project)
+
+    exp = (
+        ("Branches: 1\nPushlogs stored: 1, skipped: 0\n" +
+         "Changesets stored: 2, skipped: 0\n"),
+        "",
+        )
+
+    assert capsys.readouterr() == exp
+
+
+def test_already_running(plm, capsys, tmpdir, monkeypatch):
+    """A run that is still going is never killed or overlapped."""
+    import os
+
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("update_pushlog.pid").write(str(os.getpid()))
+
+    def mock_store_pushlogs(*args):
+        raise AssertionError("pushlogs stored by an overlapping run")
+    monkeypatch.setattr(PushLogModel, "store_pushlogs", mock_store_pushlogs)
+
+    call_update_pushlog(repo_host="foo_host", numdays="1", project=plm.project)
+
+    exp = (
+        "update_pushlog is already running as pid {0}, exiting\n".format(
+            os.getpid()),
+        "",
+        )
+
+    assert capsys.readouterr() == exp
+    assert tmpdir.join("update_pushlog.pid").check()
+
+
+def test_backfill_changeset_revisions(plm, capsys, monkeypatch):
+    """Revisions are backfilled in chunks until a partial chunk."""
+    counts = [2, 2, 1]
+
+    def mock_set_changeset_revisions(self, chunk_size):
+        return counts.pop(0)
+    monkeypatch.setattr(
+        PushLogModel, "set_changeset_revisions", mock_set_changeset_revisions)
+
+    call_command(
+        "backfill_changeset_revisions", chunk_size="2", project=plm.project)
+
+    assert counts == []
+    assert capsys.readouterr() == ("Changeset revisions stored: 5\n", "")
@@ -140,8 +140,14 @@ def truncate(ptm, skip_list=None):
     Truncate all tables in all databases in given DatazillaModelBase.
 
     skip_list is a list of table names to skip truncation.
+
+    Also discards the in-process reference data id cache, since the ids
+    it holds no longer exist once the tables are truncated.
     """
+    from datazilla.model.base import RefDataCache
+
     ptm.disconnect()
+    RefDataCache.reset()
 
     skip_list = set(skip_list or [])
     from django.conf import settings
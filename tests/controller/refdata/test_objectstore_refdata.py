@@ -91,6 +91,26 @@ def test_get_error_list(ptm):
     assert result == exp
 
 
+def test_get_error_list_stream(ptm):
+    """Test the get_error_list method streams the same rows in batches."""
+
+    store_and_process_2_good_2_error_blobs(ptm)
+    date_range = get_day_range(1)
+    result = objectstore_refdata.get_error_list(
+        ptm.project,
+        date_range["start"],
+        date_range["stop"],
+        )
+    batches = objectstore_refdata.get_error_list(
+        ptm.project,
+        date_range["start"],
+        date_range["stop"],
+        stream=True,
+        )
+
+    assert [row for batch in batches for row in batch] == list(result)
+
+
 def test_get_json_blob(ptm):
     """Test get_json_blob method"""
 
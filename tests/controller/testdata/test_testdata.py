@@ -175,3 +175,46 @@ def test_get_metrics_pushlog(mtm, ptm, plm, monkeypatch ):
     assert match_count == 2
 
 
+
+def test_get_downsampled_pushlog():
+
+    pushlog = []
+    for index in range(20):
+        metrics_data = []
+        if index % 2:
+            metrics_data.append({ 'pages':{
+                'one.html':{ 'mean':index }, 'two.html':{ 'mean':index + 2 }
+                } })
+        pushlog.append({
+            'revisions':[ { 'revision':'rev{0}'.format(index) } ],
+            'metrics_data':metrics_data
+            })
+
+    #The push of the revision is kept even without metrics data
+    result = testdata.get_downsampled_pushlog(pushlog, 'rev4', 5)
+
+    assert len(result) == 5
+    assert pushlog[4] in result
+    assert pushlog[1] in result
+    assert pushlog[19] in result
+    assert result == sorted(result, key=pushlog.index)
+
+    #Short pushlogs are returned as is
+    assert testdata.get_downsampled_pushlog(pushlog, 'rev4', 20) == pushlog
+
+def test_get_downsampled_pushlog_metrics_data():
+    """Every metrics data entry of a push counts towards its mean."""
+
+    pushlog = []
+    for index in range(20):
+        metrics_data = [ { 'pages':{ 'one.html':{ 'mean':10 } } } ]
+        if index == 10:
+            metrics_data.append({ 'pages':{ 'two.html':{ 'mean':1000 } } })
+        pushlog.append({
+            'revisions':[ { 'revision':'rev{0}'.format(index) } ],
+            'metrics_data':metrics_data
+            })
+
+    result = testdata.get_downsampled_pushlog(pushlog, 'unknown', 3)
+
+    assert result == [ pushlog[0], pushlog[10], pushlog[19] ]
@@ -122,3 +122,45 @@ def test_create_next_dataset(ptm, DataSource):
 
     assert act == exp
 
+
+
+def test_oauth_consumer_secret_cached(DataSource):
+    """A looked up oauth consumer secret is served from the process cache."""
+    from datazilla.model.sql.models import get_oauth_consumer_secret
+
+    create_datasource(
+        DataSource,
+        project="oauthcached",
+        contenttype="objectstore",
+        oauth_consumer_key="key",
+        oauth_consumer_secret="secret",
+        )
+    DataSource.objects.cached()
+
+    assert get_oauth_consumer_secret("oauthcached", "key") == "secret"
+
+    with assert_num_queries(0):
+        assert get_oauth_consumer_secret("oauthcached", "key") == "secret"
+
+    assert get_oauth_consumer_secret("oauthcached", "wrong") is None
+
+
+def test_oauth_consumer_secret_cache_invalidated(DataSource):
+    """Saving a datasource drops the cached oauth consumer secrets."""
+    from datazilla.model.sql.models import get_oauth_consumer_secret
+
+    ds = create_datasource(
+        DataSource,
+        project="oauthinvalidated",
+        contenttype="objectstore",
+        oauth_consumer_key="key",
+        oauth_consumer_secret="secret",
+        )
+
+    assert get_oauth_consumer_secret("oauthinvalidated", "key") == "secret"
+
+    ds.oauth_consumer_secret = "newsecret"
+    ds.save()
+    DataSource.reset_cache()
+
+    assert get_oauth_consumer_secret("oauthinvalidated", "key") == "newsecret"
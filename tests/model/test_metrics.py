@@ -4,7 +4,9 @@ import os
 from datazilla.model.base import TestData
 
 from ..sample_data import perftest_data
-from ..sample_metric_data import get_metric_collection_data
+from ..sample_metric_data import (
+    get_metric_collection_data, get_sample_p_values,
+    get_metric_sample_data_summary )
 
 from datazilla.model import (
     MetricsMethodFactory, MetricMethodBase, TtestMethod, MetricMethodError
@@ -37,6 +39,64 @@ def test_metrics_factory():
     assert m_one.__class__.__name__ == tm.__class__.__name__
     assert m_two.__class__.__name__ == tm.__class__.__name__
 
+def test_metric_method_registry(monkeypatch):
+
+    class SuiteMethod(TtestMethod):
+        pass
+
+    monkeypatch.setattr(
+        MetricsMethodFactory, 'registrations',
+        list(MetricsMethodFactory.registrations)
+        )
+
+    MetricsMethodFactory.register_metric_method(
+        SuiteMethod, 'Talos tp5*', 'talos*', batch=False
+        )
+
+    metric_collection_data = get_metric_collection_data()
+    collection = metric_collection_data['initialization_data']
+
+    mmf = MetricsMethodFactory(collection, 'talos')
+
+    assert isinstance(mmf.get_metric_method('Talos tp5n'), SuiteMethod)
+    assert not mmf.supports_batch('Talos tp5n')
+
+    #The default registration is used for every other test
+    m = mmf.get_metric_method('Talos ts')
+    assert m.__class__ is TtestMethod
+    assert mmf.supports_batch('Talos ts')
+
+    #Metric ids are resolved once and shared by the metric methods
+    assert m.metric_index is mmf.metric_index
+    assert m.get_metric_id() == TtestMethod(collection).get_metric_id()
+
+    other_mmf = MetricsMethodFactory(collection, 'b2g')
+    assert other_mmf.get_metric_method('Talos tp5n').__class__ is TtestMethod
+
+def test_ttest_run_metric_method_list():
+
+    metric_collection_data = get_metric_collection_data()
+
+    tm = TtestMethod(metric_collection_data['initialization_data'])
+
+    children = [ [1, 2, 3, 4], [10, 12, 11, 15, 9], [6, 6, 6, 6] ]
+    parents = [ [2, 3, 4, 5], [10, 11, 10, 11, 10], [6, 6, 6, 6] ]
+    parent_metric_data = [
+        {}, { 'trend_mean':10.5, 'trend_stddev':1.5 }, {}
+        ]
+
+    results = tm.run_metric_method_list(
+        children, parents, parent_metric_data
+        )
+
+    for i in range(2):
+        assert results[i] == tm.run_metric_method(
+            children[i], parents[i], parent_metric_data[i]
+            )
+
+    #A metric datum the ttest cannot evaluate does not affect the others
+    assert results[2] is None
+
 def test_ttest_nan():
 
     metric_collection_data = get_metric_collection_data()
@@ -54,3 +114,180 @@ def test_ttest_nan():
     else:
         raise Exception('Failed to raise MetricMethodError')
 
+
+def test_ttest_batch_matches_welchs_ttest():
+
+    from numpy import isnan
+    from dzmetrics.ttest import welchs_ttest
+
+    metric_collection_data = get_metric_collection_data()
+
+    tm = TtestMethod(metric_collection_data['initialization_data'])
+
+    children = [ [1, 2, 3, 4], [10, 12, 11, 15, 9], [6, 6, 6, 6], [5, 7] ]
+    parents = [ [2, 3, 4, 5], [10, 11, 10, 11, 10], [6, 6, 6, 6], [8, 9, 7] ]
+
+    results = tm.run_metric_method_batch(
+        tm.get_replicate_summaries(children),
+        tm.get_replicate_summaries(parents)
+        )
+
+    for i, (child, parent) in enumerate( zip(children, parents) ):
+        expected = welchs_ttest(child, parent, tm.ALPHA)
+
+        if isnan( expected['p'] ):
+            #A nan in one metric datum does not affect the others
+            assert isnan( results['p'][i] )
+            continue
+
+        assert abs( results['p'][i] - expected['p'] ) < 1e-12
+        assert results['h0_rejected'][i] == expected['h0_rejected']
+
+        for key in ['mean1', 'mean2', 'stddev1', 'stddev2']:
+            assert results[key][i] == expected[key]
+
+def test_ttest_batch_trend():
+
+    from dzmetrics.ttest import welchs_ttest_internal
+    from dzmetrics.data_smoothing import exp_smooth
+
+    metric_collection_data = get_metric_collection_data()
+
+    tm = TtestMethod(metric_collection_data['initialization_data'])
+
+    child = [10, 12, 11, 15, 9]
+    parent_metric_data = { 'trend_mean':10.5, 'trend_stddev':1.5 }
+
+    result = tm.run_metric_method(child, child, parent_metric_data)
+
+    summaries = tm.get_replicate_summaries([ child ])
+    n = summaries['n'][0]
+    m = summaries['mean'][0]
+    s = summaries['stddev'][0]
+
+    expected_p = welchs_ttest_internal(n, s, m, n, 1.5, 10.5)
+    assert abs( result['p'] - expected_p ) < 1e-12
+    assert result['mean2'] == 10.5
+    assert result['stddev2'] == 1.5
+
+    results = tm.run_metric_method_batch(
+        summaries, { 'n':[n], 'mean':[10.5], 'stddev':[1.5] }
+        )
+    expected_trend = exp_smooth(n, s, m, n, 1.5, 10.5)
+
+    assert abs( results['trend_mean'][0] - expected_trend['mean'] ) < 1e-12
+    assert abs( results['trend_stddev'][0] - expected_trend['stddev'] ) < 1e-12
+
+def test_ttest_trend_evaluation():
+
+    from numpy import nan
+    from dzmetrics.ttest import welchs_ttest_internal
+    from dzmetrics.data_smoothing import exp_smooth
+    from dzmetrics.fdr import rejector
+
+    metric_collection_data = get_metric_collection_data()
+
+    tm = TtestMethod(metric_collection_data['initialization_data'])
+
+    #A passing metric datum, a regression and one without a trend line
+    summaries = {
+        'n':[5, 5, 5], 'mean':[10.0, 50.0, 20.0], 'stddev':[1.0, 1.0, 2.0]
+        }
+    trend_summaries = {
+        'n':[5, 5, nan], 'mean':[10.2, 10.0, nan], 'stddev':[1.2, 1.0, nan]
+        }
+
+    results = tm.run_trend_evaluation(summaries, trend_summaries)
+
+    assert list( results['tested'] ) == [True, True, False]
+
+    expected_p = [
+        welchs_ttest_internal(5, 1.0, 10.0, 5, 1.2, 10.2),
+        welchs_ttest_internal(5, 1.0, 50.0, 5, 1.0, 10.0)
+        ]
+    for i, p in enumerate(expected_p):
+        assert abs( results['p'][i] - p ) < 1e-12
+
+    expected_fdr = rejector(expected_p)['status']
+    assert list( results['fdr'][0:2] ) == expected_fdr
+    assert list( results['test_evaluation'] ) == [True, False, False]
+
+    #The passing datum moves its trend line
+    expected_trend = exp_smooth(5, 1.0, 10.0, 5, 1.2, 10.2)
+    assert abs( results['trend_mean'][0] - expected_trend['mean'] ) < 1e-12
+    assert abs(
+        results['trend_stddev'][0] - expected_trend['stddev'] ) < 1e-12
+
+    #The regression leaves its trend line in place
+    assert results['trend_mean'][1] == 10.0
+    assert results['trend_stddev'][1] == 1.0
+
+    #The datum without a trend line starts one
+    assert results['trend_mean'][2] == 20.0
+    assert results['trend_stddev'][2] == 2.0
+    assert results['trend_n'][2] == 5
+
+    assert list( results['trend_updated'] ) == [True, False, True]
+
+def test_fdr_rejector_batch_matches_rejector():
+
+    from dzmetrics.fdr import rejector
+
+    #Includes equal p values
+    p_values = get_sample_p_values()['p_values']
+
+    for values in [ p_values, p_values[::-1], [0.9], [0.001], [] ]:
+        status = TtestMethod.fdr_rejector_batch(values)
+        assert status.tolist() == rejector(values)['status']
+
+def test_run_metric_summary():
+
+    metric_collection_data = get_metric_collection_data()
+
+    tm = TtestMethod(metric_collection_data['initialization_data'])
+
+    sample = get_sample_p_values()
+
+    results = tm.run_metric_summary(sample['db_struct'])
+
+    assert map(lambda d: d['value'], results) == \
+        get_metric_sample_data_summary()['status']
+
+    for d in results:
+        assert d['metric_value_name'] == tm.SUMMARY_NAME
+        assert d['metric_value_id'] == tm.metric_values[tm.SUMMARY_NAME]
+
+    #The input rows are not modified
+    for d in sample['db_struct']:
+        assert d['metric_value_name'] == 'p'
+
+def test_summary_storage_trend_stddev():
+
+    from dzmetrics.data_smoothing import exp_smooth
+
+    metric_collection_data = get_metric_collection_data()
+
+    tm = TtestMethod(metric_collection_data['initialization_data'])
+
+    ref_data = { 'test_run_id':2, 'page_id':1, 'n_replicates':5 }
+
+    metrics_data = [
+        {'metric_value_name':'mean', 'value':10.1},
+        {'metric_value_name':'stddev', 'value':1.9},
+        {'metric_value_name':'trend_mean', 'value':10.0},
+        {'metric_value_name':'trend_stddev', 'value':2.0}
+        ]
+
+    result = [ {'metric_value_name':tm.SUMMARY_NAME, 'value':False} ]
+
+    placeholders = tm.get_data_for_summary_storage(
+        ref_data, result, metrics_data, 1
+        )
+
+    expected_trend = exp_smooth(5, 1.9, 10.1, 5, 2.0, 10.0)
+
+    #fdr, trend_mean, trend_stddev and test_evaluation
+    assert len(placeholders) == 4
+    assert abs( placeholders[1][4] - expected_trend['mean'] ) < 1e-12
+    assert abs( placeholders[2][4] - expected_trend['stddev'] ) < 1e-12
+    assert placeholders[3][4] == 1
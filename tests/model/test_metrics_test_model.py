@@ -16,7 +16,8 @@ from ..sample_metric_data import (
     get_metric_sample_data_summary, get_metric_sample_data,
     get_sample_ref_data, get_sample_ttest_data, get_metric_values )
 
-from datazilla.controller.admin.metrics.perftest_metrics import compute_test_run_metrics
+from datazilla.controller.admin.metrics.perftest_metrics import (
+    compute_test_run_metrics, get_test_run_partitions )
 
 
 def test_metric_keys(mtm):
@@ -173,6 +174,123 @@ def test_get_threshold_data(ptm, mtm):
     for k in mtm.METRIC_KEYS:
         assert threshold_data[mkey]['ref_data'][k] == ref_data[k]
 
+def test_get_threshold_data_bulk(mtm, ptm, monkeypatch):
+
+    sample_data = TestData( perftest_data(
+        results={
+            'one.com':[10, 20, 30, 40],
+            'two.com':[1, 2, 3, 4],
+            'three.com':[5, 6, 7, 8]
+            }
+        ) )
+
+    test_name = sample_data['testrun']['suite']
+    revision = sample_data['test_build']['revision']
+
+    ptm.load_test_data(sample_data)
+
+    model_data = mtm.get_test_values_by_revision(revision)
+
+    metric_id = mtm.mf.get_metric_method(test_name).get_metric_id()
+
+    #Set thresholds for all but one of the metric datums
+    keys = sorted(model_data.keys())
+    for key in keys[1:]:
+        mtm.insert_or_update_metric_threshold(
+            revision, model_data[key]['ref_data'], metric_id
+            )
+
+    expected = {}
+    for key in keys:
+        expected.update( mtm.get_threshold_data(model_data[key]['ref_data']) )
+
+    assert sorted(expected.keys()) == keys[1:]
+
+    #The number of queries does not depend on the number of keys
+    dhub = mtm.sources["perftest"].dhub
+    execute = dhub.execute
+    calls = []
+
+    def counting_execute(**kwargs):
+        calls.append(kwargs['proc'])
+        return execute(**kwargs)
+    monkeypatch.setattr(dhub, 'execute', counting_execute)
+
+    threshold_data = mtm.get_threshold_data_bulk(
+        map( lambda k:model_data[k]['ref_data'], keys )
+        )
+
+    assert len(calls) == 3
+    assert threshold_data == expected
+
+def test_threshold_session(mtm, ptm, monkeypatch):
+
+    parent_revision = 'a461b5f53b20'
+    parent_sample_data = TestData(
+        perftest_data(test_build={ 'revision': parent_revision })
+        )
+
+    child_sample_data = TestData(perftest_data())
+    child_revision = child_sample_data['test_build']['revision']
+
+    ptm.load_test_data(parent_sample_data)
+    ptm.load_test_data(child_sample_data)
+
+    parent_data = mtm.get_test_values_by_revision(parent_revision)
+    child_data = mtm.get_test_values_by_revision(child_revision)
+
+    key = sorted(child_data.keys())[0]
+
+    parent_ref_data = dict(parent_data[key]['ref_data'], push_date=1)
+    child_ref_data = dict(child_data[key]['ref_data'], push_date=2)
+
+    #The sample data ttest passes so the results are stored as
+    #threshold data
+    sample_ttest_data = get_sample_ttest_data()
+
+    mtm.begin_threshold_session()
+
+    assert mtm.get_threshold_data(child_ref_data) == {}
+
+    mtm.store_metric_results(
+        child_revision, child_ref_data, sample_ttest_data,
+        parent_ref_data['test_run_id'], child_data[key]['values']
+        )
+
+    dhub = mtm.sources["perftest"].dhub
+    execute = dhub.execute
+    calls = []
+
+    def counting_execute(**kwargs):
+        calls.append(kwargs['proc'])
+        return execute(**kwargs)
+    monkeypatch.setattr(dhub, 'execute', counting_execute)
+
+    #Thresholds are served from memory during the session
+    threshold_data = mtm.get_threshold_data(parent_ref_data)
+
+    assert threshold_data[key]['ref_data']['test_run_id'] == \
+        child_ref_data['test_run_id']
+    assert threshold_data[key]['values'] == child_data[key]['values']
+
+    #An earlier push does not move the threshold backwards
+    mtm.store_metric_results(
+        parent_revision, parent_ref_data, sample_ttest_data,
+        child_ref_data['test_run_id'], parent_data[key]['values']
+        )
+
+    assert 'perftest.selects.get_metric_threshold_test_runs' not in calls
+    assert 'perftest.inserts.set_metric_threshold' not in calls
+
+    mtm.commit_threshold_session()
+
+    assert calls.count('perftest.inserts.set_metric_thresholds') == 1
+
+    threshold_data = mtm.get_threshold_data(parent_ref_data)
+
+    assert threshold_data[key]['ref_data']['revision'] == child_revision
+    assert threshold_data[key]['values'] == child_data[key]['values']
+
 def test_run_metric_method(mtm, ptm):
 
     #Get sample data
@@ -487,6 +605,48 @@ def test_get_parent_test_data_case_two(mtm, ptm, plm, monkeypatch):
     assert parent_data['ref_data'] == \
         reference_data[test_two_key]['ref_data']
 
+def test_get_parent_test_data_window(mtm, ptm, plm, monkeypatch):
+
+    #######
+    # The parents of every metric datum of a child are found with a
+    # single prefetch of the pushes before it, and match the parents
+    # found one push at a time.
+    #######
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
+    #The push before the child has no data
+    child_index = setup_data['skip_index'] + 1
+    child_revision = setup_data['sample_revisions'][child_index]
+
+    child_data = mtm.get_test_values_by_revision(child_revision)
+
+    def get_parents(window_size):
+        mtm.skip_revisions = set()
+        mtm.parent_window_size = window_size
+        mtm.reset_parent_window()
+
+        parents = {}
+        for key in child_data:
+            parent_data, results = mtm.get_parent_test_data(
+                setup_data['branch_pushlog'], child_index, key,
+                child_data[key]['ref_data'], None
+                )
+            parents[key] = parent_data
+
+        return parents, mtm.get_parent_window_stats()
+
+    single_parents, single_stats = get_parents(1)
+    window_parents, window_stats = get_parents(len(setup_data['branch_pushlog']))
+
+    assert window_parents == single_parents
+
+    assert single_stats['queries'] == 2
+
+    assert window_stats['queries'] == 1
+    assert window_stats['misses'] == 1
+    assert window_stats['hits'] == len(child_data) - 1
+
 def test_get_parent_test_data_case_three(mtm, ptm, plm, monkeypatch):
 
     #########
@@ -563,6 +723,59 @@ def test_get_parent_test_data_case_four(mtm, ptm, plm, monkeypatch):
     assert parent_data['ref_data'] == \
         reference_data[test_four_key]['ref_data']
 
+def test_get_metric_summary_keys_by_revisions(mtm, ptm, plm, monkeypatch):
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
+    summary_keys = mtm.get_metric_summary_keys_by_revisions(
+        setup_data['sample_revisions']
+        )
+
+    #All of the sample data shares one test configuration, one row is
+    #returned for every revision with test data
+    assert len(summary_keys) == len(setup_data['sample_revisions']) - 1
+
+    revision = setup_data['sample_revisions'][0]
+    test_data = mtm.get_test_values_by_revision(revision)
+
+    for data in summary_keys:
+        assert data['branch'] == setup_data['branch']
+        assert data['revision'] != setup_data['skip_revision']
+        for key in test_data:
+            assert mtm.get_metrics_summary_key(data) == \
+                mtm.get_metrics_summary_key(test_data[key]['ref_data'])
+
+    #The skip revision has no test data
+    assert mtm.get_metric_summary_keys_by_revisions(
+        [ setup_data['skip_revision'] ]
+        ) == []
+
+def test_get_test_run_partitions(mtm, ptm, plm, monkeypatch):
+
+    setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch)
+
+    test_run_ids = []
+    for revision in setup_data['sample_revisions']:
+        test_data = mtm.get_test_values_by_revision(revision)
+        for key in test_data:
+            test_run_id = test_data[key]['ref_data']['test_run_id']
+            if test_run_id not in test_run_ids:
+                test_run_ids.append(test_run_id)
+
+    #A test run id without test data
+    missing_test_run_id = max(test_run_ids) + 1000
+
+    partitions = get_test_run_partitions(
+        mtm, test_run_ids + [missing_test_run_id], False, 3
+        )
+
+    #The sample test runs share a branch and metric summary key, the
+    #partition keeps test run id order
+    assert len(partitions) == 2
+    assert partitions[0]['test_run_ids'] == test_run_ids
+    assert partitions[1]['test_run_ids'] == [ missing_test_run_id ]
+    assert partitions[0]['replicate_min'] == 3
+
 def test_get_metrics_data_from_test_run_ids(mtm, ptm, plm, monkeypatch):
 
     setup_data = setup_pushlog_walk_tests(mtm, ptm, plm, monkeypatch, True)
@@ -744,6 +957,345 @@ def test_load_test_data_all_dimensions(mtm, ptm, plm, monkeypatch):
     ####
     assert len(test_data_all_dimensions) == 6
 
+
+def test_get_columnar_data(mtm):
+
+    rows = [
+        { 'ti':1, 'p':'Firefox', 'b':'Mozilla-Inbound', 'm':10.5 },
+        { 'ti':2, 'p':'Firefox', 'b':'Mozilla-Central', 'm':11.0 },
+        { 'ti':3, 'p':'Fennec', 'b':'Mozilla-Inbound', 'm':9.25 }
+        ]
+
+    data = mtm.get_columnar_data(rows, ['ti', 'p', 'b', 'm'])
+
+    assert data['length'] == 3
+
+    assert data['columns']['ti'] == [1, 2, 3]
+    assert data['columns']['m'] == [10.5, 11.0, 9.25]
+
+    #String columns are dictionary encoded in order of appearance
+    assert data['dictionaries']['p'] == ['Firefox', 'Fennec']
+    assert data['columns']['p'] == [0, 0, 1]
+
+    assert data['dictionaries']['b'] == ['Mozilla-Inbound', 'Mozilla-Central']
+    assert data['columns']['b'] == [0, 1, 0]
+
+    assert set(data['dictionaries'].keys()) == set(['p', 'b'])
+
+    for column in data['columns']:
+        decoded = data['columns'][column]
+        if column in data['dictionaries']:
+            decoded = map(lambda i: data['dictionaries'][column][i], decoded)
+        assert decoded == map(lambda row: row[column], rows)
+
+def test_get_lttb_indexes(mtm):
+
+    import numpy
+
+    x = numpy.arange(100, dtype=float)
+    y = numpy.zeros(100)
+
+    #A single spike survives the downsampling
+    y[37] = 50
+
+    indexes = mtm.get_lttb_indexes(x, y, 10)
+
+    assert len(indexes) == 10
+    assert indexes[0] == 0
+    assert indexes[-1] == 99
+    assert 37 in indexes
+    assert list(indexes) == sorted(indexes)
+
+    assert list(mtm.get_lttb_indexes(x[:5], y[:5], 10)) == range(5)
+
+def test_get_downsampled_data(mtm):
+
+    rows = []
+    for index in range(30):
+        for page in ['one.html', 'two.html']:
+            row = dict(
+                (c, 'value') for c in mtm.ALL_DIMENSION_SERIES_COLUMNS
+                )
+            row.update({ 'pu':page, 'ti':index, 'dr':1000 - index,
+                         'pd':None, 'm':index % 7 })
+            rows.append(row)
+
+    data = mtm.get_downsampled_data(rows, 10)
+
+    #Every series is downsampled and the rows keep their order
+    assert len(data) == 20
+    assert len([ r for r in data if r['pu'] == 'one.html' ]) == 10
+    assert data == [ r for r in rows if r in data ]
+
+    #Series within the budget are returned as is
+    assert mtm.get_downsampled_data(rows, 30) == rows
+
+def test_get_computed_means_from_test_runs(mtm, ptm):
+
+    for suite_name in ['tp5o', 'default']:
+        sample_data = TestData( perftest_data(
+            testrun={ 'suite':suite_name }
+            ))
+        ptm.store_test_data( json.dumps( sample_data ) )
+
+    test_run_ids = ptm.process_objects(2)
+
+    test_runs = ptm.get_loaded_test_runs()
+
+    assert set(test_runs.keys()) == set(test_run_ids)
+
+    replicate_filters = {
+        mtm.project: {
+            "tp5o": {
+                "get_computed_means":mtm.exclude_first_replicate_from_mean,
+                "start_index":1,
+                "ids":[]
+                },
+            },
+
+        "default":{
+            "test":{
+                "get_computed_means":mtm.get_mean_from_all_replicates,
+                "start_index":0,
+                "ids":[]
+            }
+        }
+    }
+
+    in_memory = mtm.get_computed_means_from_test_runs(
+        test_runs.values(), replicate_filters
+        )
+
+    for test_run_id in test_run_ids:
+        if test_runs[test_run_id]['test_name'] == 'tp5o':
+            replicate_filters[mtm.project]['tp5o']['ids'].append(test_run_id)
+        else:
+            replicate_filters['default']['test']['ids'].append(test_run_id)
+
+    from_db = mtm.get_computed_means(replicate_filters)
+
+    #Three pages per test run
+    assert len(in_memory) == len(from_db) == 6
+
+    lookup = dict(
+        ( (d['test_run_id'], d['page_id']), d ) for d in from_db
+        )
+
+    for d in in_memory:
+
+        db_row = lookup[ (d['test_run_id'], d['page_id']) ]
+
+        for key in ['mean', 'std', 'stddev']:
+            assert abs( float(d[key]) - float(db_row[key]) ) < 1e-9
+
+        for key in ['n_replicates', 'revision', 'test_id', 'date',
+                    'product_id', 'operating_system_id', 'machine_name',
+                    'operating_system_name', 'operating_system_version',
+                    'product_name', 'product_branch', 'product_version',
+                    'processor', 'build_type', 'test_name', 'page_name']:
+            assert d[key] == db_row[key]
+
+        #tp5o excludes the first replicate
+        if d['test_name'] == 'tp5o':
+            assert d['n_replicates'] == 2
+        else:
+            assert d['n_replicates'] == 3
+
+def test_evaluate_all_dimensions(mtm, ptm):
+
+    for date in ['1330454755', '1330454855']:
+        sample_data = TestData( perftest_data(
+            testrun={ 'date':date, 'suite':'default' }
+            ))
+        ptm.store_test_data( json.dumps( sample_data ) )
+
+    #The first test run starts the trend lines
+    first_test_run_ids = ptm.process_objects(1)
+    mtm.load_test_data_all_dimensions(first_test_run_ids)
+
+    test_data = mtm.get_test_values_by_test_run_id(first_test_run_ids[0])
+    ref_data_list = map(lambda k:test_data[k]['ref_data'], test_data)
+
+    trends = mtm.get_test_data_trends(ref_data_list)
+
+    assert set(trends.keys()) == set(test_data.keys())
+    for key in trends:
+        assert trends[key]['test_run_id'] == first_test_run_ids[0]
+        assert trends[key]['trend_n'] == 3
+
+    #The second test run has the same replicates, it passes and
+    #moves the trend lines
+    second_test_run_ids = ptm.process_objects(1)
+    mtm.load_test_data_all_dimensions(second_test_run_ids)
+
+    second_trends = mtm.get_test_data_trends(ref_data_list)
+
+    for key in second_trends:
+        assert second_trends[key]['test_run_id'] == second_test_run_ids[0]
+        assert abs( second_trends[key]['trend_mean'] -
+            trends[key]['trend_mean'] ) < 1e-9
+
+def test_set_push_data_all_dimensions(mtm, ptm):
+    """Push data for every (revision, branch) is applied in one statement."""
+    for index in range(3):
+        ptm.store_test_data( json.dumps( TestData( perftest_data() ) ) )
+
+    test_run_ids = ptm.process_objects(3)
+
+    revisions_without_pushdata = mtm.load_test_data_all_dimensions(
+        test_run_ids)
+
+    assert revisions_without_pushdata
+
+    revision_nodes = {}
+    for pushlog_id, (revision, branch) in enumerate(
+        revisions_without_pushdata.items(), 1):
+
+        revision_nodes[ (revision, branch) ] = {
+            'pushlog_id':pushlog_id,
+            'date':1000 + pushlog_id,
+            'name':branch,
+            'alt_name':None
+            }
+
+    # unresolved revisions are skipped
+    revision_nodes[ ('unknown', 'Firefox') ] = {}
+
+    mtm.set_push_data_all_dimensions(revision_nodes)
+
+    data = mtm.get_data_all_dimensions(
+        "", "", "", "", "", "", "", "")['data']
+
+    assert data
+    for row in data:
+        node = revision_nodes[ (row['r'], row['b']) ]
+        assert row['pi'] == node['pushlog_id']
+        assert row['pd'] == node['date']
+
+def test_set_test_data_rollups(mtm, ptm, monkeypatch):
+    """Daily and push rollups aggregate the means of the test runs."""
+    #Two test runs on the first day, one on the next
+    dates = [1330454755, 1330458355, 1330541155]
+    for date in dates:
+        ptm.store_test_data( json.dumps( TestData( perftest_data(
+            testrun={ 'date':str(date) }
+            ) ) ) )
+
+    test_run_ids = ptm.process_objects(3)
+    revisions_without_pushdata = mtm.load_test_data_all_dimensions(
+        test_run_ids)
+
+    revision_nodes = {}
+    for pushlog_id, (revision, branch) in enumerate(
+        revisions_without_pushdata.items(), 1):
+
+        revision_nodes[ (revision, branch) ] = {
+            'pushlog_id':pushlog_id, 'date':dates[0], 'name':branch
+            }
+
+    mtm.set_push_data_all_dimensions(revision_nodes)
+    mtm.set_test_data_rollups(test_run_ids)
+
+    rows = mtm.get_data_all_dimensions(
+        "", "", "", "", "", "", dates[0], dates[-1], None)['data']
+
+    daily = mtm.get_data_all_dimensions(
+        "", "", "", "", "", "", dates[0], dates[-1], 'daily')
+
+    assert daily['rollup'] == 'daily'
+    assert daily['data']
+
+    for rollup in daily['data']:
+        means = [ r['m'] for r in rows
+                  if r['tn'] == rollup['tn'] and r['pu'] == rollup['pu'] and
+                  rollup['d'] <= r['dr'] < rollup['d'] + 86400 ]
+
+        assert rollup['n'] == len(means)
+        assert abs( rollup['m'] - sum(means)/len(means) ) < 1e-9
+        assert rollup['mi'] == min(means)
+        assert rollup['ma'] == max(means)
+
+    assert set([ r['d'] for r in daily['data'] ]) == \
+        set([ d - (d % 86400) for d in dates ])
+
+    push = mtm.get_data_all_dimensions(
+        "", "", "", "", "", "", dates[0], dates[-1], 'push')['data']
+
+    assert push
+    assert sum([ r['n'] for r in push ]) == len(rows)
+
+    #Long time ranges are served from the daily rollups with auto, the
+    #test runs are returned unless a rollup is asked for
+    from django.conf import settings
+    monkeypatch.setattr(settings, 'DATAZILLA_ALL_DIMENSIONS_ROLLUP_RANGE', 3600)
+
+    data = mtm.get_data_all_dimensions(
+        "", "", "", "", "", "", dates[0], dates[-1])
+
+    assert 'rollup' not in data
+    assert data['data'] == rows
+
+    data = mtm.get_data_all_dimensions(
+        "", "", "", "", "", "", dates[0], dates[-1], 'auto')
+
+    assert data['rollup'] == 'daily'
+    assert data['data'] == daily['data']
+
+    #Repairing recomputes the same rollups
+    mtm.repair_test_data_rollups(dates[0], dates[-1] + 86400)
+
+    assert mtm.get_data_all_dimensions(
+        "", "", "", "", "", "", dates[0], dates[-1], 'daily'
+        )['data'] == daily['data']
+
+def test_get_all_dimensions_time_bucket(mtm, monkeypatch):
+
+    from django.conf import settings
+    monkeypatch.setattr(settings, 'DATAZILLA_ALL_DIMENSIONS_CACHE_BUCKET', 300)
+
+    assert mtm.get_all_dimensions_time_bucket('1330454755', 1330455055) == \
+        (1330454700, 1330455300)
+
+    #Boundaries are kept, missing times stay None
+    assert mtm.get_all_dimensions_time_bucket(1330454700, None) == \
+        (1330454700, None)
+    assert mtm.get_all_dimensions_time_bucket("", "") == (None, None)
+
+def test_all_dimension_data_cache(mtm, ptm):
+    """Cached results are invalidated when test data is loaded."""
+    fingerprint = ['Firefox', 'Mozilla-Inbound', None, None, 'tp5o', '']
+
+    cache_key = mtm.get_all_dimensions_cache_key('data', fingerprint)
+
+    assert mtm.get_cached_all_dimension_data(cache_key) is None
+
+    mtm.cache_all_dimension_data(cache_key, {'data':[1, 2]})
+
+    #Empty strings and None are the same filter
+    assert mtm.get_cached_all_dimension_data(
+        mtm.get_all_dimensions_cache_key(
+            'data', ['Firefox', 'Mozilla-Inbound ', '', '', 'tp5o', None])
+        ) == {'data':[1, 2]}
+
+    assert mtm.get_cached_all_dimension_data(
+        mtm.get_all_dimensions_cache_key('platforms_and_tests', fingerprint)
+        ) is None
+
+    generation = mtm.get_all_dimensions_generation()
+
+    ptm.store_test_data( json.dumps( TestData( perftest_data() ) ) )
+    mtm.load_test_data_all_dimensions(ptm.process_objects(1))
+
+    assert mtm.get_all_dimensions_generation() > generation
+    assert mtm.get_cached_all_dimension_data(
+        mtm.get_all_dimensions_cache_key('data', fingerprint)) is None
+
+    #Data read before a generation bump is cached under the old generation
+    mtm.cache_all_dimension_data(cache_key, {'data':[1]})
+
+    assert mtm.get_cached_all_dimension_data(
+        mtm.get_all_dimensions_cache_key('data', fingerprint)) is None
+
 def setup_pushlog_walk_tests(
     mtm, ptm, plm, monkeypatch, load_objects=False
     ):
@@ -57,6 +57,160 @@ def test_claim_objects(ptm):
     assert loading_rows == 3
 
 
+def test_store_test_data_compressed(ptm, monkeypatch):
+    """Blobs of opted-in projects are stored compressed, read back plain."""
+    from django.conf import settings
+    monkeypatch.setattr(
+        settings, "DATAZILLA_COMPRESSED_OBJECTSTORE_PROJECTS", [ptm.project])
+
+    blob = perftest_json()
+    row_id = ptm.store_test_data(blob)
+
+    row_data = ptm.sources["objectstore"].dhub.execute(
+        proc="objectstore_test.selects.row", placeholders=[row_id])[0]
+
+    rows = ptm.claim_objects(1)
+
+    assert row_data["compressed_flag"] == "Y"
+    assert row_data["json_blob"] != blob
+    assert rows[0]["json_blob"] == blob
+    assert "compressed_flag" not in rows[0]
+
+
+def test_compress_objectstore_blobs(ptm):
+    """Existing blobs are compressed in chunks and still read back plain."""
+    blobs = [
+        perftest_json(testrun={"date": "1330454755"}),
+        perftest_json(testrun={"date": "1330454756"}),
+        perftest_json(testrun={"date": "1330454757"}),
+        ]
+
+    row_ids = [ ptm.store_test_data(blob) for blob in blobs ]
+
+    assert ptm.compress_objectstore_blobs(0, 2) == (2, row_ids[1])
+    assert ptm.compress_objectstore_blobs(row_ids[1], 2) == (1, row_ids[2])
+    assert ptm.compress_objectstore_blobs(row_ids[2], 2) == (0, row_ids[2])
+
+    flags = set([
+        r["compressed_flag"] for r in ptm.sources["objectstore"].dhub.execute(
+            proc="objectstore_test.selects.all")
+        ])
+
+    rows = ptm.claim_objects(3)
+
+    assert flags == set(["Y"])
+    assert set([r["json_blob"] for r in rows]) == set(blobs)
+
+
+def test_claim_objects_expired_lease(ptm):
+    """Rows whose lease has expired are reclaimed by another worker."""
+    ptm.store_test_data(perftest_json())
+
+    # claim with a lease that has already run out
+    rows1 = ptm.claim_objects(1, lease_duration=-1)
+
+    from datazilla.model import PerformanceTestModel
+    dm2 = PerformanceTestModel(ptm.project)
+
+    rows2 = dm2.claim_objects(1)
+
+    assert [r["id"] for r in rows1] == [r["id"] for r in rows2]
+
+    # the first worker lost its claim, so it can no longer complete the row
+    ptm.mark_object_complete(rows1[0]["id"], 7)
+
+    row_data = ptm.sources["objectstore"].dhub.execute(
+        proc="objectstore_test.selects.row", placeholders=[rows1[0]["id"]])[0]
+
+    assert row_data["processed_flag"] == "loading"
+    assert row_data["worker_id"] == dm2.worker_token
+
+
+def test_renew_claimed_objects(ptm):
+    """Renewing a lease keeps the rows from being reclaimed."""
+    ptm.store_test_data(perftest_json())
+
+    rows1 = ptm.claim_objects(1, lease_duration=-1)
+
+    assert ptm.renew_claimed_objects() == set([rows1[0]["id"]])
+
+    from datazilla.model import PerformanceTestModel
+    dm2 = PerformanceTestModel(ptm.project)
+
+    assert len(dm2.claim_objects(1)) == 0
+
+
+def test_load_test_data_batch_lost_lease(ptm):
+    """Rows reclaimed by another worker are not loaded twice."""
+    ptm.store_test_data(perftest_json())
+
+    rows1 = ptm.claim_objects(1, lease_duration=-1)
+
+    from datazilla.model import PerformanceTestModel
+    dm2 = PerformanceTestModel(ptm.project)
+
+    dm2.claim_objects(1)
+
+    test_run_ids = ptm.load_test_data_batch(rows1)
+
+    test_run_rows = ptm.sources["perftest"].dhub.execute(
+        proc="perftest_test.selects.test_runs")
+
+    assert test_run_ids == []
+    assert ptm.lost_lease_count == 1
+    assert len(test_run_rows) == 0
+
+
+def test_claim_objects_active_lease(ptm):
+    """Rows with an active lease are not handed to another worker."""
+    ptm.store_test_data(perftest_json())
+
+    rows1 = ptm.claim_objects(1)
+
+    from datazilla.model import PerformanceTestModel
+    dm2 = PerformanceTestModel(ptm.project)
+
+    rows2 = dm2.claim_objects(1)
+
+    assert len(rows1) == 1
+    assert len(rows2) == 0
+
+
+def test_get_objectstore_backlog(ptm):
+    """Counts the unclaimed, error-free blobs in the objectstore."""
+    ptm.store_test_data(perftest_json(testrun={"date": "1330454755"}))
+    ptm.store_test_data(perftest_json(testrun={"date": "1330454756"}))
+    ptm.store_test_data(perftest_json(), error="bad blob")
+
+    assert ptm.get_objectstore_backlog() == 2
+
+    ptm.claim_objects(1)
+
+    assert ptm.get_objectstore_backlog() == 1
+
+    # blobs whose lease expired are waiting to be reclaimed
+    ptm.claim_objects(1, lease_duration=-1)
+
+    assert ptm.get_objectstore_backlog() == 1
+
+
+def test_release_claimed_objects(ptm):
+    """Claimed blobs are returned to the objectstore unprocessed."""
+    ptm.store_test_data(perftest_json(testrun={"date": "1330454755"}))
+    ptm.store_test_data(perftest_json(testrun={"date": "1330454756"}))
+
+    ptm.claim_objects(2)
+
+    released = ptm.release_claimed_objects()
+
+    loading_count = ptm.sources["objectstore"].dhub.execute(
+        proc="objectstore_test.counts.loading")[0]["loading_count"]
+
+    assert released == 2
+    assert loading_count == 0
+    assert ptm.get_objectstore_backlog() == 2
+
+
 def test_mark_object_complete(ptm):
     """Marks claimed row complete and records run id."""
     ptm.store_test_data(perftest_json())
@@ -86,6 +240,40 @@ def test_get_or_create_test_id(ptm):
     assert second_id == first_id == inserted_id
 
 
+def test_get_or_create_test_id_cached(ptm):
+    """Second lookup of the same test is served from the ref data cache."""
+    data = TestData({'testrun': {'suite': 'talos'}})
+
+    first_id = ptm._get_or_create_test_id(data)
+    second_id = ptm._get_or_create_test_id(data)
+
+    stats = ptm.get_ref_data_cache_stats()
+
+    assert first_id == second_id
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["size"] == 1
+
+
+def test_ref_data_cache_eviction():
+    """The least recently used id is evicted once the cache is full."""
+    from datazilla.model.base import RefDataCache
+
+    ref_data_cache = RefDataCache(2)
+    ref_data_cache.set(('option', 'a'), 1)
+    ref_data_cache.set(('option', 'b'), 2)
+
+    # touch 'a' so that 'b' is the least recently used entry
+    assert ref_data_cache.get(('option', 'a')) == 1
+
+    ref_data_cache.set(('option', 'c'), 3)
+
+    assert ref_data_cache.get(('option', 'b')) is None
+    assert ref_data_cache.get(('option', 'a')) == 1
+    assert ref_data_cache.get(('option', 'c')) == 3
+    assert ref_data_cache.get_stats()["size"] == 2
+
+
 def test_adapt_production_data(ptm):
 
     data = json.loads( perftest_json( test_machine={'os':'mac', 'osversion':'OS X 10.8.2'} ) )
@@ -614,7 +802,7 @@ def test_process_objects_unknown_error(ptm, monkeypatch):
     # force an unexpected error to occur
     def raise_error(*args, **kwargs):
         raise ValueError("Something blew up!")
-    monkeypatch.setattr(ptm, "load_test_data", raise_error)
+    monkeypatch.setattr(ptm, "_prepare_test_data", raise_error)
 
     ptm.process_objects(1)
 
@@ -628,6 +816,90 @@ def test_process_objects_unknown_error(ptm, monkeypatch):
     assert row_data['processed_flag'] == 'ready'
 
 
+def test_load_test_data_batch(ptm):
+    """Loads a batch of blobs, marking the bad ones as errors."""
+    blobs = [
+        perftest_json(testrun={"date": "1330454755"}),
+        perftest_json(testrun={"date": "not a date"}),
+        perftest_json(testrun={"date": "1330454757"}),
+        ]
+
+    for blob in blobs:
+        ptm.store_test_data(blob)
+
+    rows = ptm.claim_objects(3)
+    test_run_ids = ptm.load_test_data_batch(rows)
+
+    test_run_rows = ptm.sources["perftest"].dhub.execute(
+        proc="perftest_test.selects.test_runs")
+
+    complete_count = ptm.sources["objectstore"].dhub.execute(
+        proc="objectstore_test.counts.complete")[0]["complete_count"]
+
+    data = TestData(perftest_data())
+    for test_run_id in test_run_ids:
+        value_rows = ptm.sources["perftest"].dhub.execute(
+            proc="perftest_test.selects.test_values",
+            placeholders=[test_run_id],
+            )
+        distinct_pages = set([r['page_id'] for r in value_rows])
+        assert len(distinct_pages) == len(data["results"])
+
+    assert len(test_run_ids) == 2
+    assert set([r['id'] for r in test_run_rows]) == set(test_run_ids)
+    assert set([r['date_run'] for r in test_run_rows]) == set(
+        [1330454755, 1330454757])
+    assert complete_count == 2
+
+
+def test_load_test_data_batch_insert_error(ptm, monkeypatch):
+    """Falls back to loading blobs one at a time if a batch insert fails."""
+    blobs = [
+        perftest_json(testrun={"date": "1330454755"}),
+        perftest_json(testrun={"date": "1330454756"}),
+        ]
+
+    for blob in blobs:
+        ptm.store_test_data(blob)
+
+    def raise_error(*args, **kwargs):
+        raise ValueError("Something blew up!")
+    monkeypatch.setattr(ptm, "_insert_prepared_test_data", raise_error)
+
+    test_run_ids = ptm.process_objects(2)
+
+    complete_count = ptm.sources["objectstore"].dhub.execute(
+        proc="objectstore_test.counts.complete")[0]["complete_count"]
+
+    assert len(test_run_ids) == 2
+    assert complete_count == 2
+
+
+def test_load_test_data_batch_project_specific_error(ptm, monkeypatch):
+    """A blob failing its project specific load is marked as an error."""
+    blobs = [
+        perftest_json(testrun={"date": "1330454755"}),
+        perftest_json(testrun={"date": "1330454756"}),
+        ]
+
+    for blob in blobs:
+        ptm.store_test_data(blob)
+
+    def raise_error(data, test_run_id, machine_id):
+        if data['testrun']['date'] == "1330454756":
+            raise ValueError("Something blew up!")
+    monkeypatch.setattr(ptm, "_adapt_project_specific_data", raise_error)
+
+    test_run_ids = ptm.process_objects(2)
+
+    complete_count = ptm.sources["objectstore"].dhub.execute(
+        proc="objectstore_test.counts.complete")[0]["complete_count"]
+
+    assert len(test_run_ids) == 1
+    assert complete_count == 1
+    assert not ptm.claim_objects(2)
+
+
 def test_get_test_reference_data(ptm):
 
     data = TestData(perftest_data())
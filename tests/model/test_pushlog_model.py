@@ -3,7 +3,9 @@ import datetime
 import copy
 import urllib
 
-from ..sample_pushlog import get_pushlog_json_set, get_pushlog_json_readable
+from ..sample_pushlog import (
+    get_pushlog_json_set, get_pushlog_json_readable, get_pushlog_dict_set,
+    start_json_pushes_server)
 
 
 def get_branch_id(plm):
@@ -262,3 +264,131 @@ def test_get_branch_pushlog(plm, monkeypatch):
     #sample data nodes should match branch nodes retrieved
     assert data_nodes == branch_nodes
 
+
+
+def test_revision_char_count(plm):
+    """The pushlog revision prefix matches the perftest revisions."""
+    from datazilla.model import MetricsTestModel
+
+    assert plm.REVISION_CHAR_COUNT == MetricsTestModel.REVISION_CHAR_COUNT
+
+
+def test_insert_changesets_store_revision(plm):
+    """Stored changesets carry the revision prefix of their node."""
+    branch_id = get_branch_id(plm)
+    data = json.loads(get_pushlog_json_set())
+    plm._insert_branch_pushlogs(branch_id, data)
+
+    for cs in plm.get_all_changesets():
+        assert cs["revision"] == cs["node"][0:plm.REVISION_CHAR_COUNT]
+
+    # nothing is left for the backfill
+    assert plm.set_changeset_revisions() == 0
+
+
+def test_get_node_from_revision(plm):
+    """Nodes are found by their revision prefix or their full node."""
+    branch_id = get_branch_id(plm)
+    data = json.loads(get_pushlog_json_set())
+    plm._insert_branch_pushlogs(branch_id, data)
+
+    full_node = data["23046"]["changesets"][0]["node"]
+    revision = full_node[0:plm.REVISION_CHAR_COUNT]
+
+    node = plm.get_node_from_revision(revision, "Firefox")
+    assert node["node"] == full_node
+    assert node["push_id"] == 23046
+
+    assert plm.get_node_from_revision(full_node, "Firefox") == node
+
+    # a matching prefix with a different tail is not the same node
+    assert plm.get_node_from_revision(revision + "x", "Firefox") == {}
+
+    assert plm.get_node_from_revision(revision, "Cortexiphan") == {}
+
+
+def test_get_nodes_from_revisions(plm):
+    """Many (revision, branch) pairs are resolved together."""
+    branch_id = get_branch_id(plm)
+    data = json.loads(get_pushlog_json_set())
+    plm._insert_branch_pushlogs(branch_id, data)
+
+    nodes = [cs["node"] for pl in data.values() for cs in pl["changesets"]]
+    revision_branches = [
+        (node[0:plm.REVISION_CHAR_COUNT], "Firefox") for node in nodes
+        ]
+
+    # pairs that can't be resolved are left out of the result
+    missing = [
+        (nodes[0][0:plm.REVISION_CHAR_COUNT], "Cortexiphan"),
+        ("0123456789ab", "Firefox"),
+        ]
+
+    result = plm.get_nodes_from_revisions(revision_branches + missing)
+
+    assert sorted(result.keys()) == sorted(revision_branches)
+    for revision, branch in revision_branches:
+        assert result[ (revision, branch) ] == plm.get_node_from_revision(
+            revision, branch)
+
+    # branches match regardless of case, like the sql lookup
+    revision = nodes[0][0:plm.REVISION_CHAR_COUNT]
+    result = plm.get_nodes_from_revisions([ (revision, "firefox") ])
+
+    assert result[ (revision, "firefox") ] == plm.get_node_from_revision(
+        revision, "firefox")
+
+
+def test_sync_pushlogs_incremental(plm):
+    """
+    Test sync_pushlogs against a local json-pushes server.
+
+    The first sync starts the branch from the hours window, the second
+    only asks for the pushes after the last one stored.
+
+    """
+    requests = []
+    server = start_json_pushes_server(get_pushlog_dict_set(), requests)
+    repo_host = "http://127.0.0.1:{0}".format(server.server_port)
+
+    try:
+        result = plm.sync_pushlogs(repo_host, hours=24, branch="Firefox")
+
+        assert result == {
+            "branches": 1,
+            "pushlogs_stored": 3,
+            "changesets_stored": 7,
+            "pushlogs_skipped": 0,
+            "changesets_skipped": 0,
+            }
+        assert "maxhours=24" in requests[0]
+
+        last_push_id = max([int(k) for k in get_pushlog_dict_set()])
+        assert plm.get_last_push_ids() == {
+            get_branch_id(plm): last_push_id }
+
+        plm.reset_counts()
+        result = plm.sync_pushlogs(repo_host, branch="Firefox")
+
+        assert result["branches"] == 1
+        assert result["pushlogs_stored"] == 0
+        assert result["pushlogs_skipped"] == 0
+        assert "startID={0}".format(last_push_id) in requests[1]
+
+    finally:
+        server.shutdown()
+
+
+def test_sync_pushlogs_new_branch_needs_window(plm):
+    """Branches without stored pushes are skipped without a window."""
+    requests = []
+    server = start_json_pushes_server(get_pushlog_dict_set(), requests)
+    repo_host = "http://127.0.0.1:{0}".format(server.server_port)
+
+    try:
+        result = plm.sync_pushlogs(repo_host, branch="Firefox")
+    finally:
+        server.shutdown()
+
+    assert result["branches"] == 0
+    assert requests == []
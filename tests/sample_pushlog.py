@@ -4,6 +4,11 @@ Functions for sample pushlog data.
 """
 
 import json
+import threading
+import urlparse
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
 
 def get_pushlog_json_readable(json_data):
     """Return a handle to a readable object pointint to ``json_data``."""
@@ -118,3 +123,43 @@ def get_pushlog_dict_set():
         }
 
     }
+
+
+def start_json_pushes_server(pushlog_dict, requests):
+    """
+    Start a local stand-in for the json-pushes web service.
+
+    Serves the pushes of ``pushlog_dict`` newer than the startID parameter
+    to every branch over HTTP/1.1 and appends each requested path to
+    ``requests``.  Returns the server, call ``shutdown`` when done.
+
+    """
+    class JsonPushesHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            requests.append(self.path)
+
+            params = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+            start_id = int(params.get("startID", [0])[0])
+
+            body = json.dumps(dict(
+                [(k, v) for k, v in pushlog_dict.items() if int(k) > start_id]
+                ))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), JsonPushesHandler)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    return server
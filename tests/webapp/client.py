@@ -24,8 +24,8 @@ class TestClient(TestApp):
         return DjangoWsgiFix(WSGIHandler())
 
 
-    def oauth_post(self, ptm, data=None, **kwargs):
+    def oauth_post(self, ptm, data=None, endpoint="load_test", **kwargs):
         """Post data to url using OAuth creds from given PerfTestModel."""
-        path = "/%s/api/load_test" % ptm.project
+        path = "/%s/api/%s" % (ptm.project, endpoint)
         signed_data = oauth_signed(ptm, path, data)
         return self.post(path, signed_data, **kwargs)
@@ -1,4 +1,10 @@
+import base64
+import gzip
+import hashlib
 import json
+import urllib
+
+from StringIO import StringIO
 
 from mock import patch
 
@@ -95,3 +101,146 @@ class TestSetTestData(object):
         response = client.oauth_post(ptm, {}, status=404)
 
         assert response.json["status"] == "Unknown project 'doesnotexist'"
+
+
+
+class TestSetTestDataBatch(object):
+    """Tests for set_test_data_batch view."""
+
+    def _patch(self, dotted_path, *args, **kwargs):
+        """Prepend given path with the containing module path and patch it."""
+        full_path = "datazilla.webapp.apps.datazilla.views." + dotted_path
+        return patch(full_path, *args, **kwargs)
+
+
+    def _get_blobs(self, ptm):
+        return [
+            json.loads(r["json_blob"])
+            for r in ptm.sources["objectstore"].dhub.execute(
+                proc="objectstore_test.selects.all")
+            ]
+
+
+    def test_json_array(self, client, ptm):
+        """Stores every object of a posted JSON array."""
+        data = urllib.quote(json.dumps([{"test": "foo"}, {"test": "bar"}]))
+        response = client.oauth_post(ptm, data, endpoint="load_test_batch")
+
+        assert self._get_blobs(ptm) == [{"test": "foo"}, {"test": "bar"}]
+        assert response.json["stored"] == 2
+        assert response.json["errors"] == 0
+        assert [i["status"] for i in response.json["items"]] == [
+            u"well-formed JSON stored", u"well-formed JSON stored"]
+
+
+    def test_ndjson_item_errors(self, client, ptm):
+        """Malformed lines are stored as errors without failing the rest."""
+        data = urllib.quote('{"test": "foo"}\n{[[[\n42\n')
+        response = client.oauth_post(ptm, data, endpoint="load_test_batch")
+
+        rows = ptm.sources["objectstore"].dhub.execute(
+            proc="objectstore_test.selects.all")
+
+        assert [r["error_flag"] for r in rows] == ["N", "Y", "Y"]
+        assert response.json["stored"] == 3
+        assert response.json["errors"] == 2
+        assert [i["status"] for i in response.json["items"]] == [
+            u"well-formed JSON stored", u"Malformed JSON", u"Malformed JSON"]
+
+
+    def _post_gzip_body(self, client, ptm, body, body_hash=None, **kwargs):
+        """Post a gzip compressed raw body signed with its body hash."""
+        buf = StringIO()
+        gz = gzip.GzipFile(fileobj=buf, mode="wb")
+        gz.write(body)
+        gz.close()
+
+        if body_hash is None:
+            body_hash = base64.b64encode(
+                hashlib.sha1(buf.getvalue()).digest())
+
+        key = ptm.sources["objectstore"].datasource.oauth_consumer_key
+        path = "/{0}/api/load_test_batch?{1}".format(
+            ptm.project,
+            urllib.urlencode({
+                "oauth_consumer_key": key,
+                "oauth_body_hash": body_hash,
+                }))
+
+        with self._patch("oauth.Server.verify_request"):
+            return client.post(
+                path,
+                buf.getvalue(),
+                headers={"Content-Encoding": "gzip"},
+                content_type="application/x-ndjson",
+                **kwargs
+                )
+
+
+    def test_gzip_body(self, client, ptm):
+        """Accepts a gzip compressed newline delimited body."""
+        response = self._post_gzip_body(
+            client, ptm, '{"test": "foo"}\n{"test": "bar"}\n')
+
+        assert self._get_blobs(ptm) == [{"test": "foo"}, {"test": "bar"}]
+        assert response.json["stored"] == 2
+
+
+    def test_gzip_body_too_large(self, client, ptm):
+        """A gzip body decompressing past the size limit is rejected."""
+        with self._patch("settings.DATAZILLA_MAX_BATCH_BODY_SIZE", 20):
+            response = self._post_gzip_body(
+                client, ptm, '{"test": "foo"}\n{"test": "bar"}\n',
+                status=400)
+
+        assert response.json["status"] == u"Malformed request"
+        assert self._get_blobs(ptm) == []
+
+
+    def test_body_hash_mismatch(self, client, ptm):
+        """A raw body not matching the signed body hash is rejected."""
+        response = self._post_gzip_body(
+            client, ptm, '{"test": "foo"}\n', body_hash="bad", status=403)
+
+        assert response.json["status"] == u"Oauth body hash verification error."
+        assert self._get_blobs(ptm) == []
+
+
+    def test_pre_process_item_error(self, client, ptm):
+        """Blobs failing pre-processing are stored as errors on their own."""
+        def _raise(json_data, deserialized_json):
+            if 'testrun' not in deserialized_json:
+                raise KeyError('testrun')
+            return json_data
+
+        data = urllib.quote('{"testrun": "foo"}\n{"test": "foo"}\n')
+
+        with self._patch(
+            "PerformanceTestModel.pre_process_data") as mock_pre_process:
+            mock_pre_process.side_effect = _raise
+            response = client.oauth_post(
+                ptm, data, endpoint="load_test_batch")
+
+        rows = ptm.sources["objectstore"].dhub.execute(
+            proc="objectstore_test.selects.all")
+
+        assert [r["error_flag"] for r in rows] == ["N", "Y"]
+        assert response.json["errors"] == 1
+        assert [i["status"] for i in response.json["items"]] == [
+            u"well-formed JSON stored", u"Invalid JSON"]
+
+
+    def test_malformed_array(self, client, ptm):
+        data = urllib.quote("[{[[[")
+        response = client.oauth_post(
+            ptm, data, endpoint="load_test_batch", status=400)
+
+        assert response.json["status"] == u"Malformed request"
+        assert self._get_blobs(ptm) == []
+
+
+    def test_no_data(self, client, ptm):
+        response = client.oauth_post(
+            ptm, None, endpoint="load_test_batch", status=400)
+
+        assert response.json["status"] == u"No POST data found"
@@ -1,4 +1,5 @@
 import json
+import zlib
 
 from datazilla.controller.admin.refdata import perftest_refdata
 from tests.sample_data import create_date_based_data, perftest_data
@@ -78,6 +79,83 @@ def test_get_test_data_parameters(client, ptm):
             assert success_response.json[0] == sample_data
             assert fail_response.json == []
 
+def test_get_all_data_columnar(client, mtm, ptm):
+    """
+    Test the columnar all_data format matches the default row format.
+    """
+    sample_data = TestData(perftest_data())
+
+    ptm.store_test_data( json.dumps( sample_data ) )
+    test_run_ids = ptm.process_objects(1)
+
+    mtm.load_test_data_all_dimensions(test_run_ids)
+
+    uri = "/{0}/testdata/all_data?product={1}&branch={2}&os={3}".format(
+        ptm.project,
+        sample_data['test_build']['name'],
+        sample_data['test_build']['branch'],
+        sample_data['test_machine']['os']
+        )
+
+    rows = client.get(uri).json['data']
+
+    assert rows
+
+    response = client.get(
+        uri + "&format=columnar&columns=ti,p,tn,m",
+        headers={ 'Accept-Encoding':'gzip' }
+        )
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+    data = json.loads( zlib.decompress(response.body, 16 + zlib.MAX_WBITS) )
+
+    assert data['format'] == 'columnar'
+    assert data['data']['length'] == len(rows)
+    assert sorted(data['data']['columns'].keys()) == ['m', 'p', 'ti', 'tn']
+
+    for column in data['data']['columns']:
+        values = data['data']['columns'][column]
+        if column in data['data']['dictionaries']:
+            dictionary = data['data']['dictionaries'][column]
+            values = map(lambda i: dictionary[i], values)
+
+        assert values == map(lambda row: row[column], rows)
+
+    #Unknown columns are rejected
+    response = client.get(uri + "&format=columnar&columns=ti,x", status=400)
+
+    assert response.status_int == 400
+
+def test_get_all_data_stream(client, mtm, ptm):
+    """
+    Test the streamed all_data response matches the buffered response.
+    """
+    sample_data = TestData(perftest_data())
+
+    ptm.store_test_data( json.dumps( sample_data ) )
+    test_run_ids = ptm.process_objects(1)
+
+    mtm.load_test_data_all_dimensions(test_run_ids)
+
+    uri = "/{0}/testdata/all_data?product={1}&branch={2}&os={3}".format(
+        ptm.project,
+        sample_data['test_build']['name'],
+        sample_data['test_build']['branch'],
+        sample_data['test_machine']['os']
+        )
+
+    data = client.get(uri).json
+
+    assert data['data']
+
+    assert client.get(uri + "&stream=1").json == data
+
+    #Streaming is only supported for the row format
+    response = client.get(uri + "&stream=1&format=columnar", status=400)
+
+    assert response.status_int == 400
+
 def test_get_metrics_data(client, mtm, ptm, plm, monkeypatch):
     """
     Test metrics data retrieval through the web service.
@@ -334,6 +412,21 @@ def test_get_metrics_pushlog(client, mtm, ptm, plm, monkeypatch):
 
     assert match_count == 2
 
+def test_get_metrics_pushlog_max_points(client, ptm):
+    """An invalid max_points is rejected like the all_data service."""
+
+    uri = (
+        "/{0}/testdata/metrics/Firefox/abcdef123456/pushlog?"
+        "branch_version=23.0a1&test_name=Talos%20tp5r&page_name=one.com"
+        ).format(ptm.project)
+
+    for max_points in ['2', 'ten', '-5']:
+        response = client.get(
+            uri + "&max_points={0}".format(max_points), status=400
+            )
+
+        assert response.status_int == 400
+
 
 def _get_uri_parameters(sample_data):
     """